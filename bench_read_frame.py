@@ -0,0 +1,92 @@
+"""
+Микробенчмарк: pd.read_sql против src.dashboard.frames.read_frame.
+
+Создает временную базу SQLite с таблицей в форме типичного результата
+запроса дашборда (дата, продукт, сумма, число заказов, число оплат) и
+измеряет время получения DataFrame на 1k, 100k и 1M строк.
+
+Запуск: python bench_read_frame.py
+"""
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from src.dashboard.frames import read_frame
+
+SIZES = [1_000, 100_000, 1_000_000]
+REPEATS = 5
+
+metadata = MetaData()
+results = Table(
+    'results', metadata,
+    Column('date', String),
+    Column('product', String),
+    Column('total_sales', Float),
+    Column('total_orders', Integer),
+    Column('paid_orders', Integer),
+)
+
+
+def _populate(engine, size):
+    random.seed(0)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        batch = []
+        for i in range(size):
+            batch.append({
+                'date': f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+                'product': f"Продукт {i % 500}",
+                'total_sales': random.uniform(0, 10000),
+                'total_orders': random.randint(1, 100),
+                'paid_orders': random.randint(0, 100),
+            })
+            if len(batch) == 50_000:
+                connection.execute(results.insert(), batch)
+                batch = []
+        if batch:
+            connection.execute(results.insert(), batch)
+
+
+def _best_time(func):
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        Session = sessionmaker(bind=engine)
+        statement = select(
+            results.c.date, results.c.product, results.c.total_sales,
+            results.c.total_orders, results.c.paid_orders,
+        )
+
+        print(f"{'строк':>10} {'read_sql, мс':>14} {'read_frame, мс':>16} {'ускорение':>10}")
+        for size in SIZES:
+            _populate(engine, size)
+
+            def run_read_sql():
+                with Session() as db:
+                    pd.read_sql(statement, db.bind)
+
+            def run_read_frame():
+                with Session() as db:
+                    read_frame(db, statement)
+
+            baseline = _best_time(run_read_sql)
+            fast = _best_time(run_read_frame)
+            print(f"{size:>10} {baseline * 1000:>14.1f} {fast * 1000:>16.1f} {baseline / fast:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Add table metadata
+
+Revision ID: 3c1f7a9d2b64
+Revises: 94fe32a0b979
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f7a9d2b64'
+down_revision: Union[str, None] = '94fe32a0b979'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Таблицы, для которых сводка заполняется сразу по существующим данным
+TRACKED_TABLES = ['orders', 'contacts']
+
+
+def upgrade() -> None:
+    op.create_table('table_metadata',
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('min_date', sa.DateTime(), nullable=True),
+    sa.Column('max_date', sa.DateTime(), nullable=True),
+    sa.Column('last_import_at', sa.DateTime(), nullable=True),
+    sa.Column('generation', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+    # Заполняем сводку по уже загруженным данным
+    existing_tables = sa.inspect(op.get_bind()).get_table_names()
+    for table in TRACKED_TABLES:
+        if table in existing_tables:
+            op.execute(
+                f"INSERT INTO table_metadata (table_name, row_count, min_date, max_date, generation) "
+                f"SELECT '{table}', count(*), min(creation_date), max(creation_date), 0 FROM {table}"
+            )
+
+
+def downgrade() -> None:
+    op.drop_table('table_metadata')
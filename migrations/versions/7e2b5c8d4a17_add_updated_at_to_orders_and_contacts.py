@@ -0,0 +1,41 @@
+"""Add updated_at to orders and contacts
+
+Revision ID: 7e2b5c8d4a17
+Revises: 3c1f7a9d2b64
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e2b5c8d4a17'
+down_revision: Union[str, None] = '3c1f7a9d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Таблицы с отслеживанием изменений (создаются init_db, поэтому могут отсутствовать)
+TRACKED_TABLES = ['orders', 'contacts']
+
+
+def upgrade() -> None:
+    # Существующие строки остаются с updated_at = NULL: они входят только
+    # в полную выгрузку, а первая инкрементальная начинается с ее отметки
+    existing_tables = sa.inspect(op.get_bind()).get_table_names()
+    for table in TRACKED_TABLES:
+        if table in existing_tables:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+                batch_op.create_index(batch_op.f(f'ix_{table}_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    existing_tables = sa.inspect(op.get_bind()).get_table_names()
+    for table in TRACKED_TABLES:
+        if table in existing_tables:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.drop_index(batch_op.f(f'ix_{table}_updated_at'))
+                batch_op.drop_column('updated_at')
@@ -0,0 +1,37 @@
+"""Add category rules
+
+Revision ID: b5d9e1f3a6c2
+Revises: 7e2b5c8d4a17
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d9e1f3a6c2'
+down_revision: Union[str, None] = '7e2b5c8d4a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('category_rules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('pattern', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['product_categories.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_category_rules_category_id'), 'category_rules', ['category_id'], unique=False)
+    op.create_index(op.f('ix_category_rules_id'), 'category_rules', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_category_rules_id'), table_name='category_rules')
+    op.drop_index(op.f('ix_category_rules_category_id'), table_name='category_rules')
+    op.drop_table('category_rules')
@@ -0,0 +1,54 @@
+"""Add category hierarchy
+
+Revision ID: d2a8c4f6e913
+Revises: b5d9e1f3a6c2
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a8c4f6e913'
+down_revision: Union[str, None] = 'b5d9e1f3a6c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('product_categories') as batch_op:
+        batch_op.add_column(sa.Column('parent_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('level', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_foreign_key('fk_product_categories_parent_id', 'product_categories', ['parent_id'], ['id'])
+        batch_op.create_index(batch_op.f('ix_product_categories_parent_id'), ['parent_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_product_categories_level'), ['level'], unique=False)
+
+    op.create_table('category_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['product_categories.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['product_categories.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_category_closure_descendant_id', 'category_closure', ['descendant_id', 'ancestor_id'], unique=False)
+
+    # Существующие категории плоские: каждая — корень своего дерева
+    op.execute(
+        "INSERT INTO category_closure (ancestor_id, descendant_id, depth) "
+        "SELECT id, id, 0 FROM product_categories"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_category_closure_descendant_id', table_name='category_closure')
+    op.drop_table('category_closure')
+    with op.batch_alter_table('product_categories') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_categories_level'))
+        batch_op.drop_index(batch_op.f('ix_product_categories_parent_id'))
+        batch_op.drop_constraint('fk_product_categories_parent_id', type_='foreignkey')
+        batch_op.drop_column('level')
+        batch_op.drop_column('parent_id')
@@ -1,9 +1,13 @@
 """
 Основная бизнес-логика для модуля аналитики.
 """
+from datetime import datetime
+
 import pandas as pd
 import numpy as np
+from sqlalchemy import Float, String
 from .models import SessionLocal, Order
+from .metadata import on_table_imported
 
 # Словарь для сопоставления имен столбцов из Excel с полями модели Order
 COLUMN_MAPPING = {
@@ -37,6 +41,36 @@ COLUMN_MAPPING = {
     "Дата заказа в ГК": "gc_order_date",
 }
 
+def to_column_types(model, data):
+    """
+    Приводит значения строки Excel к типам столбцов модели.
+
+    pandas читает числовые ячейки как float (например, 1001.0), а в
+    строковом столбце база хранит их текстом ('1001.0'). Без приведения
+    повторно импортированная строка всегда считалась бы измененной.
+
+    Args:
+        model: Модель SQLAlchemy.
+        data (dict): Значения строки по именам столбцов.
+
+    Returns:
+        dict: Значения только для столбцов модели.
+    """
+    result = {}
+    for column in model.__table__.columns:
+        if column.name not in data:
+            continue
+        value = data[column.name]
+        if value is not None:
+            if isinstance(column.type, String):  # Text — подкласс String
+                value = value if isinstance(value, str) else str(value)
+            elif isinstance(column.type, Float):
+                value = float(value)
+            elif isinstance(value, pd.Timestamp):
+                value = value.to_pydatetime()
+        result[column.name] = value
+    return result
+
 def import_orders_from_excel(file_path: str):
     """
     Импортирует или обновляет заказы в базе данных из Excel-файла.
@@ -85,30 +119,31 @@ def import_orders_from_excel(file_path: str):
     db = SessionLocal()
     updated_count = 0
     created_count = 0
+    # Одна отметка на весь импорт: строки, измененные им, попадут в одну выгрузку изменений
+    imported_at = datetime.utcnow()
 
     try:
         for _, row in df.iterrows():
-            order_id = row.get('id')
-            if not order_id:
+            if not row.get('id'):
                 continue
 
+            # Убираем ключи, которых нет в модели, и приводим значения к типам столбцов
+            filtered_data = to_column_types(Order, row.to_dict())
+
             # Ищем существующий заказ
-            existing_order = db.query(Order).filter(Order.id == order_id).first()
-            
-            order_data = row.to_dict()
-            
-            # Убираем ключи, которых нет в модели, чтобы избежать ошибок
-            valid_keys = [c.name for c in Order.__table__.columns]
-            filtered_data = {k: v for k, v in order_data.items() if k in valid_keys}
+            existing_order = db.query(Order).filter(Order.id == filtered_data['id']).first()
 
             if existing_order:
                 # Обновляем существующий заказ
                 for key, value in filtered_data.items():
                     setattr(existing_order, key, value)
+                # Отметку получают только строки, значения которых действительно изменились
+                if db.is_modified(existing_order):
+                    existing_order.updated_at = imported_at
                 updated_count += 1
             else:
                 # Создаем новый заказ
-                new_order = Order(**filtered_data)
+                new_order = Order(**filtered_data, updated_at=imported_at)
                 db.add(new_order)
                 created_count += 1
         
@@ -120,6 +155,9 @@ def import_orders_from_excel(file_path: str):
     finally:
         db.close()
 
+    # Зеркало, сводка по таблице и новое поколение данных
+    on_table_imported('orders')
+
     return {
         "status": "success",
         "created": created_count,
@@ -0,0 +1,77 @@
+"""
+Поколение данных аналитики.
+
+Поколение — счетчик, который увеличивается после каждого изменения данных
+(импорт заказов или контактов, изменение каталога продуктов). Кэши дашборда
+используют его как часть ключа: после импорта старые записи просто перестают
+находиться, и отдельная инвалидация не нужна.
+
+Счетчик хранится в файле (ANALYTICS_GENERATION_FILE), поэтому его видят все
+воркеры gunicorn. Внутри процесса можно подписаться на изменение поколения
+(например, чтобы заново прогреть кэш).
+"""
+import os
+import threading
+from datetime import datetime, timezone
+
+# Файл со счетчиком поколения данных
+GENERATION_FILE = os.getenv("ANALYTICS_GENERATION_FILE", "./data_generation")
+
+_lock = threading.Lock()
+_listeners = []
+
+
+def get_generation():
+    """
+    Возвращает текущее поколение данных (0, если данные еще не менялись).
+    """
+    try:
+        with open(GENERATION_FILE) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def get_generation_time():
+    """
+    Возвращает время последнего изменения данных (UTC) или None,
+    если данные еще не менялись.
+    """
+    try:
+        return datetime.fromtimestamp(os.path.getmtime(GENERATION_FILE), tz=timezone.utc)
+    except OSError:
+        return None
+
+
+def bump_generation():
+    """
+    Увеличивает поколение данных и оповещает подписчиков.
+
+    Returns:
+        int: Новое поколение.
+    """
+    with _lock:
+        generation = get_generation() + 1
+        directory = os.path.dirname(os.path.abspath(GENERATION_FILE))
+        os.makedirs(directory, exist_ok=True)
+        # Атомарная подмена файла: другие воркеры не увидят пустой счетчик
+        tmp_path = f"{GENERATION_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(generation))
+        os.replace(tmp_path, GENERATION_FILE)
+
+    for listener in list(_listeners):
+        try:
+            listener(generation)
+        except Exception as e:
+            print(f"Ошибка обработчика изменения данных: {e}")
+    return generation
+
+
+def on_generation_changed(listener):
+    """
+    Подписывает функцию listener(generation) на изменение поколения данных
+    в текущем процессе.
+    """
+    _listeners.append(listener)
+    return listener
@@ -0,0 +1,133 @@
+"""
+Метаданные таблиц данных (таблица table_metadata).
+
+Импорт заказов и контактов после сохранения данных пересчитывает сводку по
+таблице: число строк, минимальную и максимальную дату создания, время
+импорта и поколение данных. Главная страница и дашборд читают одну строку
+сводки вместо max()/count() по всей таблице на каждый запрос.
+
+Действия после импорта таблицы собраны в on_table_imported.
+"""
+from datetime import datetime
+
+from sqlalchemy import func
+
+from .generation import bump_generation, get_generation
+from .mirror import refresh_mirror
+from .models import SessionLocal, Order, TableMetadata
+
+
+def _tracked_tables():
+    """
+    Таблицы, для которых ведется сводка: имя таблицы -> столбец даты создания.
+    """
+    # Импорт здесь: модели контактов импортируют модели аналитики
+    from src.contacts.models import Contact
+    return {
+        'orders': Order.creation_date,
+        'contacts': Contact.creation_date,
+    }
+
+
+def _summarize(table_name, db):
+    # Число строк и диапазон дат создания по всей таблице
+    date_column = _tracked_tables()[table_name]
+    return db.query(
+        func.count(), func.min(date_column), func.max(date_column)
+    ).select_from(date_column.table).one()
+
+
+def refresh_table_metadata(table_name, db=None, generation=None, imported=True):
+    """
+    Пересчитывает сводку по таблице и сохраняет ее.
+
+    Args:
+        table_name (str): Имя таблицы ('orders' или 'contacts').
+        db: Сессия SQLAlchemy (если не передана, создается новая).
+        generation (int): Поколение данных, к которому относится сводка
+            (по умолчанию текущее).
+        imported (bool): Отметить время импорта (False — только пересчет,
+            например при первом заполнении сводки).
+
+    Returns:
+        TableMetadata: Обновленная сводка.
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        row_count, min_date, max_date = _summarize(table_name, db)
+
+        metadata = db.get(TableMetadata, table_name) or TableMetadata(table_name=table_name)
+        metadata.row_count = row_count
+        metadata.min_date = min_date
+        metadata.max_date = max_date
+        metadata.generation = get_generation() if generation is None else generation
+        if imported:
+            metadata.last_import_at = datetime.utcnow()
+        db.merge(metadata)
+        db.commit()
+        return db.get(TableMetadata, table_name)
+    finally:
+        if own_session:
+            db.close()
+
+
+def get_table_metadata(table_name, db=None):
+    """
+    Возвращает сводку по таблице. Если сводки еще нет (база создана до
+    появления table_metadata и с тех пор не было импорта), она вычисляется
+    по таблице, но не сохраняется: table_metadata входит в выгрузку, и запись
+    при чтении изменила бы данные без смены поколения. Сводку сохраняет
+    следующий импорт.
+
+    Returns:
+        dict: row_count, min_date, max_date, last_import_at, generation.
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        metadata = db.get(TableMetadata, table_name)
+        if metadata is None:
+            row_count, min_date, max_date = _summarize(table_name, db)
+            return {
+                'row_count': row_count,
+                'min_date': min_date,
+                'max_date': max_date,
+                'last_import_at': None,
+                'generation': get_generation(),
+            }
+        return {
+            'row_count': metadata.row_count,
+            'min_date': metadata.min_date,
+            'max_date': metadata.max_date,
+            'last_import_at': metadata.last_import_at,
+            'generation': metadata.generation,
+        }
+    finally:
+        if own_session:
+            db.close()
+
+
+def on_table_imported(table_name):
+    """
+    Действия после импорта таблицы: обновляет аналитическое зеркало и сводку
+    по таблице, затем увеличивает поколение данных. Ошибки зеркала и сводки
+    не отменяют уже выполненный импорт.
+    """
+    try:
+        refresh_mirror()
+    except Exception as e:
+        print(f"Ошибка обновления аналитического зеркала: {e}")
+
+    # Сводка пересчитывается до смены поколения: table_metadata тоже
+    # выгружается, и архив выгрузки, закэшированный под новым поколением,
+    # не должен содержать прежнюю сводку
+    try:
+        refresh_table_metadata(table_name, generation=get_generation() + 1)
+    except Exception as e:
+        print(f"Ошибка обновления метаданных таблицы: {e}")
+
+    # Новое поколение данных: кэши дашборда пересчитываются и прогреваются заново
+    bump_generation()
@@ -0,0 +1,143 @@
+"""
+Аналитическое зеркало базы данных (Parquet + DuckDB).
+
+SQLite хранит данные построчно, а запросы дашборда в основном сканируют и
+агрегируют большие объемы. Зеркало выгружает таблицы в локальные Parquet-файлы
+и выполняет запросы встроенным DuckDB: колоночное многопоточное сканирование
+без отдельного серверного процесса.
+
+Включается переменной окружения ANALYTICS_BACKEND=duckdb. Каталог с файлами
+задается переменной ANALYTICS_MIRROR_DIR (по умолчанию "./mirror").
+"""
+import os
+import threading
+
+import pandas as pd
+from sqlalchemy.dialects import sqlite
+
+from .models import engine
+
+# --- Настройки зеркала ---
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "sqlite")
+MIRROR_DIR = os.getenv("ANALYTICS_MIRROR_DIR", "./mirror")
+
+# Таблицы, которые выгружаются в зеркало
+MIRROR_TABLES = [
+    'orders',
+    'products',
+    'product_category_association',
+    'product_categories',
+    'category_closure',
+    'contacts',
+]
+
+_lock = threading.Lock()
+_connection = None
+
+
+def is_mirror_enabled():
+    """
+    Возвращает True, если запросы дашборда должны выполняться через DuckDB.
+    """
+    return ANALYTICS_BACKEND == 'duckdb'
+
+
+def _table_path(table):
+    return os.path.join(MIRROR_DIR, f"{table}.parquet")
+
+
+def refresh_mirror(tables=None):
+    """
+    Выгружает таблицы SQLite в Parquet-файлы зеркала.
+
+    Args:
+        tables (list, optional): Список таблиц для обновления.
+            По умолчанию обновляются все таблицы из MIRROR_TABLES.
+    """
+    if not is_mirror_enabled():
+        return {"status": "skipped"}
+
+    tables = tables or MIRROR_TABLES
+    os.makedirs(MIRROR_DIR, exist_ok=True)
+    with engine.connect() as connection:
+        for table in tables:
+            df = pd.read_sql_table(table, connection)
+            # Пишем во временный файл и атомарно подменяем, чтобы параллельные
+            # запросы из других воркеров никогда не видели недописанный файл.
+            path = _table_path(table)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+
+    return {"status": "success", "tables": list(tables)}
+
+
+def _get_connection():
+    """
+    Возвращает общее подключение DuckDB с представлениями поверх Parquet-файлов.
+    Представления читают файлы при каждом запросе, поэтому после обновления
+    зеркала переподключаться не нужно.
+    """
+    global _connection
+    with _lock:
+        if _connection is None:
+            import duckdb
+
+            if not all(os.path.exists(_table_path(t)) for t in MIRROR_TABLES):
+                refresh_mirror()
+
+            connection = duckdb.connect(database=':memory:')
+            for table in MIRROR_TABLES:
+                path = os.path.abspath(_table_path(table)).replace("'", "''")
+                connection.execute(
+                    f"CREATE OR REPLACE VIEW {table} AS SELECT * FROM read_parquet('{path}')"
+                )
+            _connection = connection
+        # Отдельный курсор на каждый запрос: подключение DuckDB нельзя
+        # использовать из нескольких потоков одновременно.
+        return _connection.cursor()
+
+
+def reset_connection():
+    """
+    Забывает текущее подключение DuckDB (например, в дочернем процессе
+    после fork). Новое подключение создается при следующем запросе.
+    """
+    global _connection, _lock
+    _connection = None
+    _lock = threading.Lock()
+
+
+def compile_statement(statement):
+    """
+    Компилирует SQLAlchemy-запрос в SQL-строку с подставленными значениями.
+    Используется диалект SQLite: функции date() и strftime() DuckDB понимает
+    в том же виде.
+    """
+    return str(statement.compile(
+        dialect=sqlite.dialect(),
+        compile_kwargs={"literal_binds": True},
+    ))
+
+
+def read_frame(statement):
+    """
+    Выполняет запрос в DuckDB и возвращает результат в виде DataFrame.
+    """
+    cursor = _get_connection()
+    try:
+        result = cursor.execute(compile_statement(statement))
+        date_columns = [d[0] for d in result.description if str(d[1]) == 'DATE']
+        hugeint_columns = [d[0] for d in result.description if str(d[1]) == 'HUGEINT']
+        df = result.df()
+    finally:
+        cursor.close()
+
+    # SQLite возвращает date() строкой 'YYYY-MM-DD', приводим DuckDB к тому же виду
+    for col in date_columns:
+        df[col] = df[col].dt.strftime('%Y-%m-%d')
+    # SUM по целым DuckDB возвращает как HUGEINT, который pandas превращает в float
+    for col in hugeint_columns:
+        if df[col].notna().all():
+            df[col] = df[col].astype('int64')
+    return df
@@ -65,12 +65,39 @@ class Order(Base):
     utm_source = Column(String)
     utm_term = Column(String)
     gc_order_date = Column(DateTime)
+    # Время (UTC) импорта, который создал или изменил заказ; по нему
+    # строится инкрементальная выгрузка
+    updated_at = Column(DateTime, index=True)
 
     def __repr__(self):
         return f"<Order(id={self.id}, number='{self.number}')>"
 
+# --- Метаданные таблиц ---
+class TableMetadata(Base):
+    """
+    Сводка по таблице данных, которую обновляет импорт: число строк,
+    минимальная и максимальная дата создания записи, время последнего
+    импорта и поколение данных. Используется вместо max()/count() по
+    всей таблице на главной странице и в дашборде.
+    """
+    __tablename__ = "table_metadata"
+
+    table_name = Column(String, primary_key=True)
+    row_count = Column(Integer, nullable=False, default=0)
+    min_date = Column(DateTime)
+    max_date = Column(DateTime)
+    last_import_at = Column(DateTime)
+    generation = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<TableMetadata(table_name='{self.table_name}', row_count={self.row_count})>"
+
 def init_db():
     """
-    Создает все таблицы в базе данных.
+    Создает все таблицы в базе данных. Для базы с категориями, но без
+    таблицы замыкания дерева категорий, заполняет ее.
     """
     Base.metadata.create_all(bind=engine)
+    # Импорт здесь: модели группировки продуктов импортируют этот модуль
+    from src.product_grouping.core import repair_category_closure
+    repair_category_closure()
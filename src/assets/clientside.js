@@ -1 +1,106 @@
 // Этот файл может быть использован для добавления кастомного JavaScript на стороне клиента.
+
+// Clientside callbacks дашборда (namespace 'clientside').
+// Здесь выполняются производные расчеты по данным, которые уже есть в браузере,
+// чтобы изменение, например, числа сотрудников не требовало запроса к серверу.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    clientside: {
+        // Расчет общего дохода и блока "Бирюзовый фонд" по итоговой строке сводной таблицы
+        turquoise_fund: function(summaryData, categoryId, employeeCount, maxDateStr, categoryOptions) {
+            var defaultTitle = "Бирюзовый фонд";
+            var hidden = {'display': 'none'};
+            if (!summaryData || summaryData.length === 0) {
+                return ["Общий доход: 0.00 руб.", hidden, defaultTitle, "", "", ""];
+            }
+
+            // 1. Расчет общего дохода (итоговая строка обычно последняя)
+            var totalIncome = 0;
+            var lastRow = summaryData[summaryData.length - 1];
+            if (lastRow.product === 'Итого') {
+                totalIncome = lastRow.total_income || 0;
+            }
+            var totalIncomeText = "Общий доход: " + formatMoney(totalIncome) + " руб.";
+
+            // 2. Блок показывается только для категорий "АстроФест"
+            var categoryName = "";
+            if (categoryId && categoryOptions) {
+                for (var i = 0; i < categoryOptions.length; i++) {
+                    if (categoryOptions[i].value === categoryId) {
+                        categoryName = categoryOptions[i].label;
+                        break;
+                    }
+                }
+            }
+            if (categoryName.indexOf("АстроФест") === -1) {
+                return [totalIncomeText, hidden, defaultTitle, "", "", ""];
+            }
+
+            // Заголовок с датой последнего заказа по московскому времени
+            var title = defaultTitle;
+            if (maxDateStr) {
+                var maxDate = new Date(maxDateStr + 'Z');
+                title += " на " + maxDate.toLocaleString('ru-RU', {
+                    timeZone: 'Europe/Moscow',
+                    day: '2-digit', month: '2-digit', year: 'numeric',
+                    hour: '2-digit', minute: '2-digit'
+                }).replace(',', '');
+            }
+
+            // Расчеты для фонда
+            var fundIncome = totalIncome * 0.20;
+            var fundAfterTax = fundIncome * 0.94;  // Вычет 6%
+            var employeeIncome = 0;
+            if (employeeCount && employeeCount > 0) {
+                employeeIncome = fundAfterTax / employeeCount;
+            }
+
+            var style = {'display': 'block', 'marginTop': '30px', 'padding': '15px', 'border': '2px solid #40E0D0', 'borderRadius': '5px'};
+            return [
+                totalIncomeText, style, title,
+                formatMoney(fundIncome) + " руб.",
+                formatMoney(fundAfterTax) + " руб.",
+                formatMoney(employeeIncome) + " руб."
+            ];
+        },
+
+        // Проценты от прихода фестиваля для таблицы доходов по продуктам
+        festival_percentages: function(rows, festivalIncome) {
+            if (!rows) {
+                return [];
+            }
+            return rows.map(function(row) {
+                var result = Object.assign({}, row);
+                if (festivalIncome && festivalIncome > 0) {
+                    result.cumulative_percentage = formatPercent(row.cumulative_sales / festivalIncome * 100);
+                    result.daily_percentage = formatPercent(row.daily_sales / festivalIncome * 100);
+                } else {
+                    result.cumulative_percentage = 'N/A';
+                    result.daily_percentage = 'N/A';
+                }
+                return result;
+            });
+        },
+
+        // Id сессии вкладки браузера: создается один раз и хранится в sessionStorage.
+        // По нему сервер прерывает устаревшие запросы этой вкладки (см. cancellation.py)
+        session_id: function(_, current) {
+            if (current) {
+                return window.dash_clientside.no_update;
+            }
+            return Date.now().toString(36) + Math.random().toString(36).slice(2);
+        }
+    }
+});
+
+// Формат суммы "1 234 567.89"
+function formatMoney(value) {
+    var parts = Number(value).toFixed(2).split('.');
+    parts[0] = parts[0].replace(/\B(?=(\d{3})+(?!\d))/g, ' ');
+    return parts.join('.');
+}
+
+// Формат процента "12.5%", как round(x, 2) в Python
+function formatPercent(value) {
+    var rounded = Math.round(value * 100) / 100;
+    return (Number.isInteger(rounded) ? rounded.toFixed(1) : String(rounded)) + '%';
+}
@@ -1,10 +1,14 @@
 """
 Основная бизнес-логика для модуля контактов.
 """
+from datetime import datetime
+
 import pandas as pd
 import numpy as np
 from src.analytics.models import SessionLocal  # Используем ту же сессию
 from .models import Contact
+from src.analytics.metadata import on_table_imported
+from src.analytics.core import to_column_types
 
 # Словарь для сопоставления имен столбцов из Excel с полями модели Contact
 COLUMN_MAPPING = {
@@ -72,26 +76,27 @@ def import_contacts_from_excel(file_path: str):
     db = SessionLocal()
     updated_count = 0
     created_count = 0
+    # Одна отметка на весь импорт: строки, измененные им, попадут в одну выгрузку изменений
+    imported_at = datetime.utcnow()
 
     try:
         for _, row in df.iterrows():
-            contact_id = row.get('id')
-            if not contact_id:
+            if not row.get('id'):
                 continue
 
-            existing_contact = db.query(Contact).filter(Contact.id == contact_id).first()
-            contact_data = row.to_dict()
-
-            # Убираем ключи, которых нет в модели, чтобы избежать ошибок
-            valid_keys = [c.name for c in Contact.__table__.columns]
-            filtered_data = {k: v for k, v in contact_data.items() if k in valid_keys}
+            # Убираем ключи, которых нет в модели, и приводим значения к типам столбцов
+            filtered_data = to_column_types(Contact, row.to_dict())
+            existing_contact = db.query(Contact).filter(Contact.id == filtered_data['id']).first()
 
             if existing_contact:
                 for key, value in filtered_data.items():
                     setattr(existing_contact, key, value)
+                # Отметку получают только строки, значения которых действительно изменились
+                if db.is_modified(existing_contact):
+                    existing_contact.updated_at = imported_at
                 updated_count += 1
             else:
-                new_contact = Contact(**filtered_data)
+                new_contact = Contact(**filtered_data, updated_at=imported_at)
                 db.add(new_contact)
                 created_count += 1
         
@@ -102,6 +107,9 @@ def import_contacts_from_excel(file_path: str):
     finally:
         db.close()
 
+    # Зеркало, сводка по таблице и новое поколение данных
+    on_table_imported('contacts')
+
     return {
         "status": "success",
         "created": created_count,
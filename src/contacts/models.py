@@ -47,5 +47,9 @@ class Contact(Base):
     last_utm_source = Column(String)
     tg_id = Column(String, index=True)
 
+    # --- Отслеживание изменений ---
+    # Время (UTC) импорта, который создал или изменил контакт
+    updated_at = Column(DateTime, index=True)
+
     def __repr__(self):
         return f"<Contact(id={self.id}, full_name='{self.full_name}')>"
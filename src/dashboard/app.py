@@ -4,6 +4,8 @@
 from dash import Dash
 from .layout import layout
 from . import callbacks
+from .background import create_background_manager
+from .warmup import init_warmup
 
 def create_dash_app(flask_app):
     """
@@ -12,10 +14,15 @@ def create_dash_app(flask_app):
     dash_app = Dash(
         server=flask_app,
         url_base_pathname='/dashboard/',
-        suppress_callback_exceptions=True
+        suppress_callback_exceptions=True,
+        # Тяжелые вкладки выполняются в фоновых процессах, не занимая веб-воркер
+        background_callback_manager=create_background_manager()
     )
     
     dash_app.layout = layout
     callbacks.register_callbacks(dash_app)
+
+    # Прогрев кэша представлений по умолчанию (в фоне, при старте и после импорта)
+    init_warmup()
     
     return dash_app
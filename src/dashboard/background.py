@@ -0,0 +1,92 @@
+"""
+Фоновое выполнение тяжелых callback'ов дашборда.
+
+Запросы вкладок "Помесячные продажи", "Анализ дохода по категориям" и
+"Аналитика по партнерам" могут выполняться долго и занимать синхронный
+воркер gunicorn. Dash умеет выполнять такие callback'и в отдельном процессе
+(background callbacks): веб-воркер сразу освобождается, а браузер опрашивает
+результат. Новый запрос от того же клиента отменяет предыдущий, переключение
+вкладки отменяет незавершенный расчет.
+
+Используется локальный менеджер на diskcache (каталог DASHBOARD_CACHE_DIR).
+Если пакет diskcache не установлен, callback'и выполняются как обычно.
+"""
+import os
+import sys
+
+from dash import Input, Output, html
+
+# Каталог для очереди и результатов фоновых задач
+DASHBOARD_CACHE_DIR = os.getenv("DASHBOARD_CACHE_DIR", "./cache")
+
+# Время хранения результата фоновой задачи, секунд
+BACKGROUND_RESULT_EXPIRE = int(os.getenv("DASHBOARD_BACKGROUND_EXPIRE", "600"))
+
+_VISIBLE = {'display': 'block', 'color': '#007BFF', 'fontStyle': 'italic', 'margin': '10px 0'}
+_HIDDEN = {'display': 'none'}
+
+
+def _reset_connections_after_fork():
+    """
+    Сбрасывает унаследованные подключения в дочернем процессе фоновой задачи:
+    соединения SQLite и DuckDB нельзя использовать после fork.
+    """
+    # Модуль моделей может быть импортирован и как 'src.analytics.models',
+    # и как 'analytics.models' (src в PYTHONPATH), у каждого свой engine
+    for name in ('src.analytics.models', 'analytics.models'):
+        module = sys.modules.get(name)
+        if module is not None:
+            module.engine.dispose(close=False)
+    for name in ('src.analytics.mirror', 'analytics.mirror'):
+        module = sys.modules.get(name)
+        if module is not None:
+            module.reset_connection()
+
+
+def create_background_manager():
+    """
+    Создает менеджер фоновых callback'ов или возвращает None,
+    если необходимые пакеты не установлены.
+    """
+    try:
+        import diskcache
+        from dash import DiskcacheManager
+    except ImportError:
+        print("Пакет diskcache не установлен, тяжелые callback'и выполняются синхронно.")
+        return None
+
+    os.register_at_fork(after_in_child=_reset_connections_after_fork)
+    cache = diskcache.Cache(os.path.join(DASHBOARD_CACHE_DIR, 'background'))
+    return DiskcacheManager(cache, expire=BACKGROUND_RESULT_EXPIRE)
+
+
+def running_indicator(component_id, text="Загрузка данных..."):
+    """
+    Возвращает скрытый индикатор выполнения, который показывается,
+    пока работает фоновый callback.
+    """
+    return html.Div(text, id=component_id, style=_HIDDEN)
+
+
+def background_options(app, indicator_id, running=()):
+    """
+    Возвращает параметры app.callback для фонового выполнения.
+
+    Args:
+        app: Dash-приложение.
+        indicator_id (str): id индикатора выполнения (см. running_indicator).
+        running (list): Дополнительные элементы running в формате Dash
+            (Output, значение во время работы, значение после).
+
+    Returns:
+        dict: Параметры callback'а; пустой словарь, если менеджер не настроен.
+    """
+    if getattr(app, '_background_manager', None) is None:
+        return {}
+    return dict(
+        background=True,
+        running=[(Output(indicator_id, 'style'), _VISIBLE, _HIDDEN), *running],
+        cancel=[Input('tabs-main', 'value')],
+        # Интервал опроса результата браузером, мс
+        interval=500,
+    )
@@ -0,0 +1,242 @@
+"""
+Кэш результатов запросов и фигур дашборда.
+
+Ключ записи включает имя функции, ее аргументы и поколение данных
+(src.analytics.generation): после импорта или изменения каталога старые
+записи перестают использоваться автоматически.
+
+Кэш хранится на диске (diskcache, каталог DASHBOARD_CACHE_DIR/queries) и
+общий для всех воркеров gunicorn: результат, посчитанный прогревом в одном
+процессе, используется всеми. Если diskcache не установлен, используется
+кэш в памяти процесса.
+
+Одновременные промахи по одному ключу объединяются (см. singleflight.py):
+одинаковый запрос выполняется один раз, остальные вызовы ждут результат.
+Фигуры, построенные по уже полученным данным, кэшируются по отпечатку
+содержимого DataFrame и параметрам графика (cached_frame_figure): при
+возврате к тем же данным не нужно ни строить фигуру, ни сериализовать ее.
+
+Если вычисление прервано как устаревшее (см. cancellation.py), ожидавшие
+вызовы не получают ошибку, а выполняют запрос заново.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from src.analytics.generation import get_generation
+from .background import DASHBOARD_CACHE_DIR
+from .cancellation import QueryCancelled
+from .singleflight import SingleFlight
+
+# Максимальный размер дискового кэша, байт
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", str(512 * 1024 * 1024)))
+
+# Максимальное число записей кэша в памяти (если diskcache не установлен)
+MEMORY_CACHE_ENTRIES = 256
+
+# Версия формата записей кэша: увеличивается, когда меняется формат
+# результата кэшируемых функций (старые записи на диске перестают находиться)
+CACHE_FORMAT_VERSION = 2
+
+# Счетчики объединения запросов (общие для всех воркеров)
+SINGLEFLIGHT_COUNTERS = ('computed', 'coalesced_in_process', 'coalesced_across_processes')
+
+_MISSING = object()
+
+
+class _MemoryCache:
+    """
+    Простой LRU-кэш в памяти процесса с интерфейсом get/set как у diskcache.
+    Значения хранятся сериализованными, чтобы вызывающий код мог изменять
+    полученные DataFrame, не портя кэш.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            payload = self._data[key]
+        return pickle.loads(payload)
+
+    def set(self, key, value, expire=None):
+        # expire принимается для совместимости с diskcache и не используется
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = payload
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return True
+
+    def incr(self, key, delta=1, default=0):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, default) + delta
+            return self._counters[key]
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_flight = None
+
+
+def get_cache():
+    """
+    Возвращает общий кэш дашборда (создается при первом обращении).
+    """
+    global _cache, _flight
+    with _cache_lock:
+        if _cache is None:
+            try:
+                import diskcache
+                _cache = diskcache.Cache(
+                    os.path.join(DASHBOARD_CACHE_DIR, 'queries'),
+                    size_limit=DASHBOARD_CACHE_SIZE,
+                )
+            except ImportError:
+                _cache = _MemoryCache(MEMORY_CACHE_ENTRIES)
+            _flight = SingleFlight(
+                os.path.join(DASHBOARD_CACHE_DIR, 'locks'), incr=_incr_counter, retry_on=(QueryCancelled,)
+            )
+        return _cache
+
+
+def _counter_key(name):
+    return f"singleflight:{name}"
+
+
+def _incr_counter(name):
+    try:
+        get_cache().incr(_counter_key(name))
+    except Exception as e:
+        print(f"Ошибка обновления счетчика кэша дашборда: {e}")
+
+
+def get_singleflight_stats():
+    """
+    Возвращает счетчики объединения запросов: сколько запросов выполнено
+    и сколько вызовов получили результат чужого вычисления.
+    """
+    cache = get_cache()
+    if isinstance(cache, _MemoryCache):
+        return {name: cache.counter(_counter_key(name)) for name in SINGLEFLIGHT_COUNTERS}
+    return {name: cache.get(_counter_key(name), 0) for name in SINGLEFLIGHT_COUNTERS}
+
+
+def make_key(namespace, *parts, versioned=True):
+    """
+    Строит ключ кэша из пространства имен, поколения данных и параметров.
+    Ключ без поколения (versioned=False) подходит для значений, которые
+    зависят только от переданных параметров (например, от отпечатка данных).
+    """
+    generation = get_generation() if versioned else None
+    raw = json.dumps([CACHE_FORMAT_VERSION, namespace, generation, parts], sort_keys=True, default=str, ensure_ascii=False)
+    return f"{namespace}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+def get_or_compute(key, compute):
+    """
+    Возвращает значение из кэша или вычисляет и сохраняет его.
+    """
+    cache = get_cache()
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    def compute_and_store():
+        value = compute()
+        try:
+            cache.set(key, value)
+        except Exception as e:
+            print(f"Ошибка записи в кэш дашборда: {e}")
+        return value
+
+    # Одновременные промахи по одному ключу ждут одного вычисления
+    return _flight.do(key, compute_and_store, lambda: cache.get(key, _MISSING), missing=_MISSING)
+
+
+def cached_query(func):
+    """
+    Декоратор для функций запросов дашборда: результат кэшируется по
+    аргументам вызова (с учетом значений по умолчанию) и поколению данных.
+    """
+    signature = inspect.signature(func)
+    namespace = f"query.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = make_key(namespace, bound.arguments)
+        return get_or_compute(key, lambda: func(*args, **kwargs))
+
+    return wrapper
+
+
+def _figure_json(build):
+    """Строит фигуру функцией build() и сериализует ее в JSON."""
+    figure = build()
+    if hasattr(figure, 'to_json'):
+        return figure.to_json()
+    return json.dumps(figure)
+
+
+def cached_figure(name, params, build):
+    """
+    Возвращает фигуру из кэша или строит ее функцией build().
+    Фигура хранится сериализованной в JSON и возвращается словарем.
+
+    Args:
+        name (str): Имя графика (например, id компонента).
+        params: Параметры, от которых зависит фигура.
+        build: Функция без аргументов, возвращающая go.Figure или dict.
+    """
+    return json.loads(get_or_compute(make_key(f"figure.{name}", params), lambda: _figure_json(build)))
+
+
+def frame_fingerprint(df):
+    """
+    Возвращает отпечаток содержимого DataFrame: столбцы, типы, индекс и значения.
+    """
+    digest = hashlib.sha1()
+    digest.update(json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))]).encode('utf-8'))
+    try:
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    except TypeError:
+        # Нехэшируемые значения (списки, словари) — отпечаток по JSON
+        digest.update(df.to_json(orient='split', date_format='iso').encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cached_frame_figure(name, df, options, build):
+    """
+    Возвращает фигуру, построенную по данным df, из кэша или строит ее
+    функцией build(). Ключ — отпечаток df и параметры графика, поэтому
+    одинаковые данные после повторного запроса (например, при возврате
+    к прежнему фильтру) не требуют построения и сериализации фигуры.
+
+    Args:
+        name (str): Имя графика (например, id компонента).
+        df (pd.DataFrame): Данные, по которым строится фигура.
+        options: Параметры графика, кроме данных (JSON-сериализуемые).
+        build: Функция без аргументов, возвращающая go.Figure или dict.
+    """
+    key = make_key(f"frame_figure.{name}", frame_fingerprint(df), options, versioned=False)
+    return json.loads(get_or_compute(key, lambda: _figure_json(build)))
@@ -2,81 +2,117 @@
 Callbacks для Dash-приложения.
 Здесь определяется интерактивная логика дашборда.
 """
-import pytz
 from datetime import datetime, timedelta
-from dash import html, dcc
+from dash import html, dcc, ctx, no_update
 from dash.dependencies import Input, Output, State, ClientsideFunction
 from dash.exceptions import PreventUpdate
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from src.analytics.metadata import get_table_metadata
 from .queries import (
-    get_sales_by_day, get_unique_products, get_sales_by_product, 
-    get_product_summary, get_paid_products_summary, get_categories,
+    get_sales_by_day, get_sales_by_product, 
+    get_product_summary, get_categories,
     get_category_revenue_by_period, get_monthly_sales, get_monthly_sales_by_product,
-    get_monthly_sales_by_category
+    get_monthly_sales_by_category, get_paid_products_summary_page, get_category_revenue_page,
+    get_monthly_sales_by_product_page, get_partner_analytics_page, get_partner_analytics
 )
-from analytics.models import SessionLocal
-from partner_analytics import queries as partner_queries
+from .tables import page_count
+from .downsampling import bucket_by_period, downsample_line, parse_zoom
+from .background import background_options
+from .layout import TAB_BUILDERS
+from .patching import is_patch, patch_figure, table_columns_update
+from .cache import cached_figure, cached_frame_figure
+from .cancellation import cancellable
+from .product_index import product_options
 
 def register_callbacks(app):
     """
     Регистрирует все callbacks для Dash-приложения.
     """
-    # Callback для обновления графика на первой вкладке (Общая динамика)
+    # Callback для обновления графика на первой вкладке (Общая динамика).
+    # На длинных периодах ряд прореживается; при увеличении масштаба данные
+    # пересчитываются для видимого окна в полном разрешении.
     @app.callback(
-        Output('sales-by-day-chart', 'figure'),
+        [Output('sales-by-day-chart', 'figure'),
+         Output('sales-by-day-chart-shape', 'data')],
         [Input('start-date-picker-general', 'date'),
          Input('end-date-picker-general', 'date'),
-         Input('category-dropdown-general', 'value')]
+         Input('category-dropdown-general', 'value'),
+         Input('sales-by-day-chart', 'relayoutData')],
+        [State('sales-by-day-chart-shape', 'data'),
+         State('session-id', 'data')]
     )
-    def update_general_sales_chart(start_date, end_date, category_id):
+    @cancellable
+    def update_general_sales_chart(start_date, end_date, category_id, relayout_data, figure_shape):
         if not start_date or not end_date:
             raise PreventUpdate
+
+        if ctx.triggered_id == 'sales-by-day-chart':
+            zoom = parse_zoom(relayout_data)
+            if zoom is None:
+                raise PreventUpdate
+            if zoom != 'reset':
+                # Окно увеличения не выходит за пределы выбранного периода
+                start_date = max(start_date, zoom[0])
+                end_date = min(end_date, zoom[1])
         
         # Корректируем конечную дату, чтобы включить весь день
         end_date_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
         end_date_corrected = end_date_dt.strftime('%Y-%m-%d')
 
-        df = get_sales_by_day(start_date, end_date_corrected, category_id)
-        if df.empty:
-            return _create_empty_figure("Нет данных за выбранный период")
-            
-        fig = px.line(
-            df, x='date', y='total_sales', title='Динамика дохода по дням',
-            labels={'date': 'Дата', 'total_sales': 'Сумма дохода'}
+        fig = cached_figure(
+            'sales-by-day-chart', (start_date, end_date_corrected, category_id),
+            lambda: build_general_sales_figure(get_sales_by_day(start_date, end_date_corrected, category_id))
         )
-        fig.update_layout(margin=dict(l=40, r=40, t=40, b=40))
-        return fig
+        return patch_figure(fig, figure_shape)
+
+    # Clientside callback, создающий id сессии вкладки браузера при загрузке
+    # дашборда (нужен для отмены устаревших запросов, см. cancellation.py)
+    app.clientside_callback(
+        ClientsideFunction(
+            namespace='clientside',
+            function_name='session_id'
+        ),
+        Output('session-id', 'data'),
+        [Input('tabs-main', 'id')],
+        [State('session-id', 'data')]
+    )
 
-    # Callback для загрузки списка категорий во все дропдауны
+    # Callback для отрисовки активной вкладки. Содержимое остальных вкладок
+    # отсутствует в браузере, поэтому их callback'и не срабатывают. Список
+    # категорий запрашивается один раз и дальше берется из хранилища.
     @app.callback(
-        [Output('category-dropdown-general', 'options'),
-         Output('category-dropdown-product', 'options'),
-         Output('category-dropdown-period', 'options'),
-         Output('exclude-category-dropdown', 'options'),
-         Output('include-category-dropdown', 'options'),
-         Output('monthly-sales-category-dropdown', 'options'),
-         Output('monthly-sales-exclude-category-dropdown', 'options')],
-        [Input('tabs-main', 'value')] # Триггер при загрузке любой вкладки
+        [Output('tab-content', 'children'),
+         Output('categories-store', 'data')],
+        [Input('tabs-main', 'value')],
+        [State('categories-store', 'data')]
     )
-    def update_category_dropdowns(tab):
-        categories = get_categories()
-        return [categories, categories, categories, categories, categories, categories, categories]
+    def render_tab(tab, categories):
+        builder = TAB_BUILDERS.get(tab)
+        if builder is None:
+            raise PreventUpdate
+
+        if categories is None:
+            categories = get_categories()
+            return builder(categories), categories
+        return builder(categories), no_update
 
-    # Callback для обновления списка продуктов в зависимости от выбранной категории
+    # Callback для обновления списка продуктов в зависимости от выбранной категории.
+    # Поиск по мере ввода: список получает только лучшие совпадения (см. product_index.py)
     @app.callback(
         Output('product-dropdown', 'options'),
-        [Input('category-dropdown-product', 'value')]
+        [Input('category-dropdown-product', 'value'),
+         Input('product-dropdown', 'search_value')],
+        [State('product-dropdown', 'value')]
     )
-    def update_product_dropdown(category_id):
-        products = get_unique_products(category_id)
-        return [{'label': i, 'value': i} for i in products]
+    def update_product_dropdown(category_id, search_value, selected):
+        return product_options(search_value, category_id, selected)
 
     # Callback для обновления графика и таблицы на второй вкладке (Отчет по продуктам)
     @app.callback(
         [Output('sales-by-product-chart', 'figure'),
-         Output('product-sales-table', 'data'),
+         Output('sales-by-product-chart-shape', 'data'),
+         Output('product-sales-rows', 'data'),
          Output('product-sales-table', 'columns'),
          Output('product-summary-table', 'data'),
          Output('product-summary-table', 'columns'),
@@ -86,9 +122,11 @@ def register_callbacks(app):
          Input('start-date-picker-product', 'date'),
          Input('end-date-picker-product', 'date'),
          Input('category-dropdown-product', 'value')],
-        [State('festival-income-input', 'value')]
+        [State('sales-by-product-chart-shape', 'data'),
+         State('session-id', 'data')]
     )
-    def update_product_sales_chart(product_names, start_date, end_date, category_id, festival_income):
+    @cancellable
+    def update_product_sales_chart(product_names, start_date, end_date, category_id, figure_shape):
         if product_names is None:
             product_names = []
             
@@ -106,30 +144,23 @@ def register_callbacks(app):
         empty_max_date = None
 
         if not product_names and not category_id:
-            return empty_figure, empty_data, empty_columns, empty_data, empty_columns, empty_conversion_text, empty_max_date
+            return *patch_figure(empty_figure, figure_shape), empty_data, empty_columns, empty_data, empty_columns, empty_conversion_text, empty_max_date
 
         # Данные для графика и первой таблицы
-        df, max_creation_date = get_sales_by_product(product_names, start_date, end_date_corrected, category_id)
+        df = get_sales_by_product(product_names, start_date, end_date_corrected, category_id)
         
         # Данные для сводной таблицы
         summary_df = get_product_summary(product_names, start_date, end_date_corrected, category_id)
 
         if df.empty:
-            return _create_empty_figure("Нет данных по выбранным продуктам за этот период"), empty_data, empty_columns, empty_data, empty_columns, empty_conversion_text, empty_max_date
+            return *patch_figure(_create_empty_figure("Нет данных по выбранным продуктам за этот период"), figure_shape), empty_data, empty_columns, empty_data, empty_columns, empty_conversion_text, empty_max_date
 
         # Округляем числовые значения до 2 знаков после запятой
         df['daily_sales'] = df['daily_sales'].round(2)
         df['cumulative_sales'] = df['cumulative_sales'].round(2)
 
-        # Расчет процентов от дохода фестиваля
-        if festival_income and festival_income > 0:
-            df['cumulative_percentage'] = ((df['cumulative_sales'] / festival_income) * 100).round(2).astype(str) + '%'
-            df['daily_percentage'] = ((df['daily_sales'] / festival_income) * 100).round(2).astype(str) + '%'
-        else:
-            df['cumulative_percentage'] = 'N/A'
-            df['daily_percentage'] = 'N/A'
-
-        # Подготовка данных для таблицы
+        # Подготовка данных для таблицы. Проценты от прихода фестиваля
+        # добавляются в браузере (см. callback festival_percentages)
         table_columns = [
             {"name": "Дата", "id": "date"},
             {"name": "Оплаты", "id": "paid_orders"},
@@ -140,52 +171,14 @@ def register_callbacks(app):
         ]
         table_data = df.to_dict('records')
 
-        # Создаем фигуру с двумя осями Y
-        fig = go.Figure()
-
-        # Добавляем столбчатую диаграмму для дневного дохода (основная ось Y)
-        fig.add_trace(go.Bar(
-            x=df['date'],
-            y=df['daily_sales'],
-            name='Дневной доход',
-            marker_color='blue'
-        ))
-
-        # Добавляем линейный график для накопительного дохода (вторичная ось Y)
-        fig.add_trace(go.Scatter(
-            x=df['date'],
-            y=df['cumulative_sales'],
-            name='Накопительный доход',
-            yaxis='y2',
-            mode='lines+markers',
-            line=dict(color='red')
-        ))
-
-        # Настраиваем layout
-        title_text = "Динамика дохода по выбранным продуктам"
-        if len(product_names) == 1:
-            title_text = f'Динамика дохода по продукту: {product_names[0]}'
-        elif len(product_names) > 1:
-            title_text = f'Динамика дохода по продуктам: {", ".join(product_names)}'
-
-        fig.update_layout(
-            title=title_text,
-            xaxis_title='Дата',
-            yaxis=dict(
-                title='Дневной доход',
-                titlefont=dict(color='blue'),
-                tickfont=dict(color='blue')
-            ),
-            yaxis2=dict(
-                title='Накопительный доход',
-                titlefont=dict(color='red'),
-                tickfont=dict(color='red'),
-                overlaying='y',
-                side='right'
-            ),
-            legend=dict(x=0.1, y=1.1, orientation='h'),
-            margin=dict(l=60, r=60, t=60, b=60)
-        )
+        # Если график уже отображается, отправляются только данные трасс;
+        # столбцы таблицы доходов в этом случае тоже не меняются
+        fig = cached_frame_figure('sales-by-product-chart', df, {'product_names': product_names, 'x_range': None},
+                                  lambda: _build_product_sales_figure(df, product_names))
+        fig, figure_shape = patch_figure(fig, figure_shape)
+        if is_patch(fig):
+            table_columns = no_update
+
         # Логика для сводной таблицы и конверсии
         if summary_df.empty:
             summary_table_data = []
@@ -222,19 +215,86 @@ def register_callbacks(app):
                 {"name": "Средний чек", "id": "average_check"},
             ]
 
+        # Дата актуальности данных для блока "Бирюзовый фонд": последний заказ
+        # по сводке таблицы (без запроса max()), но не позже конца периода
+        max_creation_date = get_table_metadata('orders')['max_date']
+        if max_creation_date is not None:
+            max_creation_date = min(max_creation_date, end_date_dt - timedelta(seconds=1))
         # Преобразуем дату в строку для JSON-сериализации
         max_date_str = max_creation_date.isoformat() if max_creation_date else None
-        return fig, table_data, table_columns, summary_table_data, summary_table_columns, conversion_text, max_date_str
+        return fig, figure_shape, table_data, table_columns, summary_table_data, summary_table_columns, conversion_text, max_date_str
+
+    # Clientside callback для процентов от прихода фестиваля в таблице доходов:
+    # изменение суммы прихода пересчитывает таблицу без запроса к серверу
+    app.clientside_callback(
+        ClientsideFunction(
+            namespace='clientside',
+            function_name='festival_percentages'
+        ),
+        Output('product-sales-table', 'data'),
+        [Input('product-sales-rows', 'data'),
+         Input('festival-income-input', 'value')]
+    )
+
+    # Callback для пересчета графика продуктов при изменении масштаба:
+    # видимое окно строится в полном (дневном) разрешении.
+    @app.callback(
+        [Output('sales-by-product-chart', 'figure', allow_duplicate=True),
+         Output('sales-by-product-chart-shape', 'data', allow_duplicate=True)],
+        Input('sales-by-product-chart', 'relayoutData'),
+        [State('product-dropdown', 'value'),
+         State('start-date-picker-product', 'date'),
+         State('end-date-picker-product', 'date'),
+         State('category-dropdown-product', 'value'),
+         State('sales-by-product-chart-shape', 'data'),
+         State('session-id', 'data')],
+        prevent_initial_call=True
+    )
+    @cancellable
+    def zoom_product_sales_chart(relayout_data, product_names, start_date, end_date, category_id, figure_shape):
+        zoom = parse_zoom(relayout_data)
+        if zoom is None or not all([start_date, end_date]):
+            raise PreventUpdate
+        if not product_names and not category_id:
+            raise PreventUpdate
+
+        end_date_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+        # Запрос всегда начинается с начала периода, чтобы накопительный доход
+        # в окне увеличения совпадал с полным графиком
+        df = get_sales_by_product(product_names or [], start_date, end_date_dt.strftime('%Y-%m-%d'), category_id)
+        if df.empty:
+            raise PreventUpdate
+
+        df['daily_sales'] = df['daily_sales'].round(2)
+        df['cumulative_sales'] = df['cumulative_sales'].round(2)
 
-    # Callback для обновления отчета "Период и продажи"
+        x_range = None
+        if zoom != 'reset':
+            df = df[(df['date'] >= zoom[0]) & (df['date'] <= zoom[1])]
+            if df.empty:
+                raise PreventUpdate
+            x_range = [relayout_data.get('xaxis.range[0]', zoom[0]), relayout_data.get('xaxis.range[1]', zoom[1])]
+        product_names = product_names or []
+        fig = cached_frame_figure('sales-by-product-chart', df, {'product_names': product_names, 'x_range': x_range},
+                                  lambda: _build_product_sales_figure(df, product_names, x_range))
+        return patch_figure(fig, figure_shape)
+
+    # Callback для обновления отчета "Период и продажи" (постранично, на стороне сервера)
     @app.callback(
         [Output('period-sales-table', 'data'),
-         Output('period-sales-table', 'columns')],
+         Output('period-sales-table', 'columns'),
+         Output('period-sales-table', 'page_count')],
         [Input('period-sales-date-picker', 'start_date'),
          Input('period-sales-date-picker', 'end_date'),
-         Input('category-dropdown-period', 'value')]
+         Input('category-dropdown-period', 'value'),
+         Input('period-sales-table', 'page_current'),
+         Input('period-sales-table', 'page_size'),
+         Input('period-sales-table', 'sort_by'),
+         Input('period-sales-table', 'filter_query')],
+        [State('session-id', 'data')]
     )
-    def update_period_sales_report(start_date, end_date, category_id):
+    @cancellable
+    def update_period_sales_report(start_date, end_date, category_id, page_current, page_size, sort_by, filter_query):
         if not start_date or not end_date:
             raise PreventUpdate
 
@@ -242,7 +302,10 @@ def register_callbacks(app):
         end_date_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
         end_date_corrected = end_date_dt.strftime('%Y-%m-%d')
 
-        df = get_paid_products_summary(start_date, end_date_corrected, category_id)
+        df, total_rows, totals = get_paid_products_summary_page(
+            start_date, end_date_corrected, category_id,
+            page_current, page_size, sort_by, filter_query
+        )
 
         # Подготовка колонок для таблицы
         table_columns = [
@@ -252,39 +315,43 @@ def register_callbacks(app):
         ]
 
         if df.empty:
-            return [], table_columns
+            return [], table_columns_update(table_columns, 'period-sales-table'), 1
 
         # Округление дохода
         df['total_income'] = df['total_income'].round(2)
 
-        # Расчет итоговой строки
-        total_paid_orders = df['paid_orders'].sum()
-        total_income = df['total_income'].sum()
-
+        # Итоговая строка считается по всем отфильтрованным строкам, а не только по странице
         total_row = {
             'product': 'Итого',
-            'paid_orders': total_paid_orders,
-            'total_income': round(total_income, 2)
+            'paid_orders': totals['paid_orders'],
+            'total_income': round(totals['total_income'] or 0, 2)
         }
         
         table_data = df.to_dict('records')
         table_data.append(total_row)
 
-        return table_data, table_columns
+        return table_data, table_columns_update(table_columns, 'period-sales-table'), page_count(total_rows, page_size)
 
     # Callback для обновления вкладки "Анализ дохода по категориям"
     @app.callback(
         [Output('category-revenue-bar-chart', 'figure'),
+         Output('category-revenue-bar-chart-shape', 'data'),
          Output('category-revenue-pie-chart', 'figure'),
-         Output('category-revenue-table', 'data'),
-         Output('category-revenue-table', 'columns')],
+         Output('category-revenue-pie-chart-shape', 'data')],
         [Input('category-revenue-date-picker', 'start_date'),
          Input('category-revenue-date-picker', 'end_date'),
          Input('exclude-category-dropdown', 'value'),
          Input('include-category-dropdown', 'value'),
-         Input('category-revenue-date-checklist', 'value')]
+         Input('category-revenue-date-checklist', 'value'),
+         Input('category-revenue-level-dropdown', 'value')],
+        [State('category-revenue-bar-chart-shape', 'data'),
+         State('category-revenue-pie-chart-shape', 'data'),
+         State('session-id', 'data')],
+        **background_options(app, 'category-revenue-running')
     )
-    def update_category_revenue_tab(start_date, end_date, excluded_categories, included_categories, date_checklist):
+    @cancellable
+    def update_category_revenue_tab(start_date, end_date, excluded_categories, included_categories, date_checklist, level,
+                                     bar_shape, pie_shape):
         use_dates = 'USE_DATES' in date_checklist
 
         if use_dates and (not start_date or not end_date):
@@ -298,120 +365,144 @@ def register_callbacks(app):
             end_date_final = end_date_dt.strftime('%Y-%m-%d')
             start_date_final = start_date
 
-        df = get_category_revenue_by_period(start_date_final, end_date_final, excluded_categories, included_categories)
+        df = get_category_revenue_by_period(start_date_final, end_date_final, excluded_categories, included_categories, level)
 
         empty_figure = _create_empty_figure("Нет данных за выбранный период")
         
         if df.empty:
-            return empty_figure, empty_figure, [], []
-
-        # 1. Столбчатый график
-        bar_fig = px.bar(
-            df, 
-            x='category_name', 
-            y='total_revenue',
-            title='Доход по категориям',
-            labels={'category_name': 'Категория', 'total_revenue': 'Суммарный доход'},
-            text='total_revenue'
-        )
-        bar_fig.update_traces(texttemplate='%{text:.2s}', textposition='outside')
-        bar_fig.update_layout(uniformtext_minsize=8, uniformtext_mode='hide')
-
-        # 2. Круговой график
-        pie_fig = px.pie(
-            df, 
-            names='category_name', 
-            values='total_revenue',
-            title='Доля категорий в общем доходе',
-            hole=.3
+            return (*patch_figure(empty_figure, bar_shape), *patch_figure(empty_figure, pie_shape))
+
+        # Фигуры кэшируются по содержимому данных: возврат к прежним
+        # фильтрам не требует построения и сериализации графиков
+        bar_fig = cached_frame_figure('category-revenue-bar-chart', df, None,
+                                      lambda: build_category_revenue_bar_figure(df))
+        pie_fig = cached_frame_figure('category-revenue-pie-chart', df, None,
+                                      lambda: build_category_revenue_pie_figure(df))
+
+        return (*patch_figure(bar_fig, bar_shape), *patch_figure(pie_fig, pie_shape))
+
+    # Callback для таблицы доходов по категориям (постранично, на стороне сервера)
+    @app.callback(
+        [Output('category-revenue-table', 'data'),
+         Output('category-revenue-table', 'columns'),
+         Output('category-revenue-table', 'page_count')],
+        [Input('category-revenue-date-picker', 'start_date'),
+         Input('category-revenue-date-picker', 'end_date'),
+         Input('exclude-category-dropdown', 'value'),
+         Input('include-category-dropdown', 'value'),
+         Input('category-revenue-date-checklist', 'value'),
+         Input('category-revenue-level-dropdown', 'value'),
+         Input('category-revenue-table', 'page_current'),
+         Input('category-revenue-table', 'page_size'),
+         Input('category-revenue-table', 'sort_by'),
+         Input('category-revenue-table', 'filter_query')],
+        [State('session-id', 'data')]
+    )
+    @cancellable
+    def update_category_revenue_table(start_date, end_date, excluded_categories, included_categories, date_checklist, level,
+                                      page_current, page_size, sort_by, filter_query):
+        use_dates = 'USE_DATES' in date_checklist
+
+        if use_dates and (not start_date or not end_date):
+            raise PreventUpdate
+
+        start_date_final = None
+        end_date_final = None
+        if use_dates:
+            end_date_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+            end_date_final = end_date_dt.strftime('%Y-%m-%d')
+            start_date_final = start_date
+
+        df, total_rows, totals = get_category_revenue_page(
+            start_date_final, end_date_final, excluded_categories, included_categories,
+            page_current, page_size, sort_by, filter_query, level
         )
-        pie_fig.update_traces(textposition='inside', textinfo='percent+label')
 
-        # 3. Таблица
-        total_revenue_sum = df['total_revenue'].sum()
+        table_columns = [
+            {"name": "Категория", "id": "category_name"},
+            {"name": "Доход", "id": "total_revenue"},
+        ]
+
+        if df.empty:
+            return [], table_columns_update(table_columns, 'category-revenue-table'), 1
+
         df['total_revenue'] = df['total_revenue'].round(2)
         table_data = df.to_dict('records')
         
-        # Добавляем итоговую строку
+        # Добавляем итоговую строку по всем отфильтрованным категориям
         table_data.append({
             'category_name': 'Итого',
-            'total_revenue': round(total_revenue_sum, 2)
+            'total_revenue': round(totals['total_revenue'] or 0, 2)
         })
 
-        table_columns = [
-            {"name": "Категория", "id": "category_name"},
-            {"name": "Доход", "id": "total_revenue"},
-        ]
-
-        return bar_fig, pie_fig, table_data, table_columns
+        return table_data, table_columns_update(table_columns, 'category-revenue-table'), page_count(total_rows, page_size)
 
     # Callback для обновления вкладки "Аналитика по партнерам"
     @app.callback(
         [Output('partner-analytics-chart', 'figure'),
+         Output('partner-analytics-chart-shape', 'data'),
          Output('partner-analytics-income-chart', 'figure'),
-         Output('partner-analytics-table', 'data'),
-         Output('partner-analytics-table', 'columns')],
+         Output('partner-analytics-income-chart-shape', 'data')],
         [Input('partner-analytics-date-picker', 'start_date'),
          Input('partner-analytics-date-picker', 'end_date'),
          Input('exclude-common-source-checklist', 'value'),
-         Input('show-income-checklist', 'value')]
+         Input('show-income-checklist', 'value')],
+        [State('partner-analytics-chart-shape', 'data'),
+         State('partner-analytics-income-chart-shape', 'data'),
+         State('session-id', 'data')],
+        **background_options(app, 'partner-analytics-running')
     )
-    def update_partner_analytics_tab(start_date, end_date, exclude_common_value, show_income_value):
+    @cancellable
+    def update_partner_analytics_tab(start_date, end_date, exclude_common_value, show_income_value,
+                                     registrations_shape, income_shape):
         if not start_date or not end_date:
             raise PreventUpdate
 
         exclude_common = 'exclude' in exclude_common_value
         show_income = 'show' in show_income_value
 
-        db = SessionLocal()
-        try:
-            data = partner_queries.get_partner_analytics_data(db, start_date, end_date, exclude_common)
-        finally:
-            db.close()
+        df = get_partner_analytics(start_date, end_date, exclude_common)
 
         empty_fig = _create_empty_figure("")
-        if not data:
-            return _create_empty_figure("Нет данных за выбранный период"), empty_fig, [], []
-
-        df = pd.DataFrame(data, columns=['partner', 'utm_source', 'order_count', 'total_income'])
-
-        # Сортируем данные для графика по регистрациям
-        df_sorted_by_registrations = df.sort_values(by='order_count', ascending=False)
-
-        # График по регистрациям
-        registrations_fig = px.bar(
-            df_sorted_by_registrations,
-            x='partner',
-            y='order_count',
-            title='Количество регистраций по партнерам',
-            labels={'partner': 'Партнер', 'order_count': 'Количество регистраций'},
-            text='order_count'
-        )
-        registrations_fig.update_traces(textposition='outside')
-        registrations_fig.update_layout(
-            uniformtext_minsize=8, 
-            uniformtext_mode='hide',
-            yaxis_range=[0, df_sorted_by_registrations['order_count'].max() * 1.1] # Увеличиваем диапазон оси Y
-        )
+        if df.empty:
+            return (*patch_figure(_create_empty_figure("Нет данных за выбранный период"), registrations_shape),
+                    *patch_figure(empty_fig, income_shape))
+
+        # Фигуры кэшируются по содержимому данных (см. cached_frame_figure)
+        registrations_fig = cached_frame_figure('partner-analytics-chart', df, None,
+                                                lambda: build_partner_registrations_figure(df))
 
         # График по доходу (если нужно)
         income_fig = empty_fig
         if show_income:
-            income_fig = px.bar(
-                df,
-                x='partner',
-                y='total_income',
-                title='Доход по партнерам',
-                labels={'partner': 'Партнер', 'total_income': 'Доход'},
-                text='total_income'
-            )
-            income_fig.update_traces(texttemplate='%{text:.2s}', textposition='outside')
-            income_fig.update_layout(uniformtext_minsize=8, uniformtext_mode='hide')
+            income_fig = cached_frame_figure('partner-analytics-income-chart', df, None,
+                                             lambda: build_partner_income_figure(df))
+
+        return (*patch_figure(registrations_fig, registrations_shape), *patch_figure(income_fig, income_shape))
+
+    # Callback для таблицы по партнерам (постранично, на стороне сервера)
+    @app.callback(
+        [Output('partner-analytics-table', 'data'),
+         Output('partner-analytics-table', 'columns'),
+         Output('partner-analytics-table', 'page_count')],
+        [Input('partner-analytics-date-picker', 'start_date'),
+         Input('partner-analytics-date-picker', 'end_date'),
+         Input('exclude-common-source-checklist', 'value'),
+         Input('show-income-checklist', 'value'),
+         Input('partner-analytics-table', 'page_current'),
+         Input('partner-analytics-table', 'page_size'),
+         Input('partner-analytics-table', 'sort_by'),
+         Input('partner-analytics-table', 'filter_query')],
+        [State('session-id', 'data')]
+    )
+    @cancellable
+    def update_partner_analytics_table(start_date, end_date, exclude_common_value, show_income_value,
+                                       page_current, page_size, sort_by, filter_query):
+        if not start_date or not end_date:
+            raise PreventUpdate
+
+        show_income = 'show' in show_income_value
 
-        # Таблица
-        df['total_income'] = df['total_income'].round(2)
-        table_data = df.to_dict('records')
-        
         table_columns = [
             {"name": "Партнер", "id": "partner"},
             {"name": "UTM Source", "id": "utm_source"},
@@ -420,7 +511,13 @@ def register_callbacks(app):
         if show_income:
             table_columns.append({"name": "Доход", "id": "total_income"})
 
-        return registrations_fig, income_fig, table_data, table_columns
+        df, total_rows, _ = get_partner_analytics_page(
+            start_date, end_date, 'exclude' in exclude_common_value,
+            page_current, page_size, sort_by, filter_query
+        )
+        df['total_income'] = df['total_income'].round(2)
+
+        return df.to_dict('records'), table_columns_update(table_columns, 'partner-analytics-table'), page_count(total_rows, page_size)
 
     # Clientside callback для экспорта в PDF (закомментировано из-за ошибки)
     # app.clientside_callback(
@@ -433,20 +530,44 @@ def register_callbacks(app):
     # )
 
     # Callback для экспорта в Excel
+    # Таблица хранит в браузере только текущую страницу, поэтому для экспорта
+    # данные заново запрашиваются целиком с теми же фильтрами и сортировкой.
     @app.callback(
         Output("download-excel", "data"),
         [Input("export-excel-button", "n_clicks")],
-        [State("partner-analytics-table", "data")]
+        [State('partner-analytics-date-picker', 'start_date'),
+         State('partner-analytics-date-picker', 'end_date'),
+         State('exclude-common-source-checklist', 'value'),
+         State('show-income-checklist', 'value'),
+         State('partner-analytics-table', 'sort_by'),
+         State('partner-analytics-table', 'filter_query')],
+        **background_options(app, 'partner-analytics-running', running=[
+            (Output('export-excel-button', 'disabled'), True, False),
+        ])
     )
-    def download_excel(n_clicks, data):
-        if n_clicks == 0 or not data:
+    def download_excel(n_clicks, start_date, end_date, exclude_common_value, show_income_value, sort_by, filter_query):
+        if n_clicks == 0 or not start_date or not end_date:
             raise PreventUpdate
         
-        df = pd.DataFrame(data)
+        df, _, _ = get_partner_analytics_page(
+            start_date, end_date, 'exclude' in exclude_common_value,
+            page_size=None, sort_by=sort_by, filter_query=filter_query
+        )
+        if df.empty:
+            raise PreventUpdate
+
+        df['total_income'] = df['total_income'].round(2)
+        if 'show' not in show_income_value:
+            df = df.drop(columns=['total_income'])
         return dcc.send_data_frame(df.to_excel, "partner_analytics.xlsx", sheet_name="Sheet_1", index=False)
 
-    # Callback для обновления общего дохода и блока "Бирюзовый фонд"
-    @app.callback(
+    # Clientside callback для общего дохода и блока "Бирюзовый фонд":
+    # расчеты выполняются в браузере по итоговой строке сводной таблицы
+    app.clientside_callback(
+        ClientsideFunction(
+            namespace='clientside',
+            function_name='turquoise_fund'
+        ),
         [Output('total-income-product', 'children'),
          Output('turquoise-fund-block', 'style'),
          Output('turquoise-fund-title', 'children'),
@@ -459,107 +580,34 @@ def register_callbacks(app):
          Input('max-date-store', 'data')],
         [State('category-dropdown-product', 'options')]
     )
-    def update_turquoise_fund(summary_data, category_id, employee_count, max_date_str, category_options):
-        default_title = "Бирюзовый фонд"
-        if not summary_data:
-            return "Общий доход: 0.00 руб.", {'display': 'none'}, default_title, "", "", ""
-
-        # 1. Расчет общего дохода
-        total_income = 0
-        # Итоговая строка обычно последняя
-        if summary_data and summary_data[-1]['product'] == 'Итого':
-            total_income = summary_data[-1].get('total_income', 0)
-        
-        total_income_text = f"Общий доход: {total_income:,.2f} руб.".replace(',', ' ')
-
-        # 2. Логика для "Бирюзового фонда"
-        show_turquoise_block = False
-        category_name = ""
-        if category_id and category_options:
-            # Находим полное имя категории
-            for option in category_options:
-                if option['value'] == category_id:
-                    category_name = option['label']
-                    break
-        
-        if "АстроФест" in category_name:
-            show_turquoise_block = True
-
-        if not show_turquoise_block:
-            return total_income_text, {'display': 'none'}, default_title, "", "", ""
-
-        # Формируем заголовок с датой
-        title = default_title
-        if max_date_str:
-            # Конвертируем время в московское
-            utc_date = datetime.fromisoformat(max_date_str).replace(tzinfo=pytz.utc)
-            moscow_tz = pytz.timezone('Europe/Moscow')
-            moscow_date = utc_date.astimezone(moscow_tz)
-            title += f" на {moscow_date.strftime('%d.%m.%Y %H:%M')}"
-
-        # Расчеты для фонда
-        fund_income = total_income * 0.20
-        fund_after_tax = fund_income * 0.94  # Вычет 6%
-        
-        employee_income = 0
-        if employee_count and employee_count > 0:
-            employee_income = fund_after_tax / employee_count
-
-        # Стили
-        text_style = {'fontWeight': 'bold', 'color': '#008080'} # Темно-бирюзовый
-        number_style = {'fontSize': '1.2em', 'color': 'purple', 'fontWeight': 'bold', 'marginLeft': '5px'}
-
-        # Формирование стилизованных выводов
-        fund_income_text = html.Div([
-            html.Span("Бирюзовый фонд (доход): ", style=text_style),
-            html.Span(f"{fund_income:,.2f} руб.".replace(',', ' '), style=number_style)
-        ])
-        fund_after_tax_text = html.Div([
-            html.Span("Бирюзовый фонд (с вычетом 6%): ", style=text_style),
-            html.Span(f"{fund_after_tax:,.2f} руб.".replace(',', ' '), style=number_style)
-        ])
-        employee_income_text = html.Div([
-            html.Span("Доход сотрудника: ", style=text_style),
-            html.Span(f"{employee_income:,.2f} руб.".replace(',', ' '), style=number_style)
-        ])
-        
-        style = {'display': 'block', 'marginTop': '30px', 'padding': '15px', 'border': '2px solid #40E0D0', 'borderRadius': '5px'}
-
-        return total_income_text, style, title, fund_income_text, fund_after_tax_text, employee_income_text
 
-
-    # Callback для обновления списка продуктов на вкладке "Помесячные продажи"
-    @app.callback(
-        [Output('monthly-sales-product-dropdown', 'options'),
-         Output('monthly-sales-exclude-product-dropdown', 'options')],
-        [Input('monthly-sales-category-dropdown', 'value'),
-         Input('monthly-sales-exclude-category-dropdown', 'value')]
-    )
-    def update_monthly_sales_product_dropdowns(include_cat_ids, exclude_cat_ids):
-        # Используем set для избежания дублирования, если одна и та же категория в обоих списках
-        all_relevant_cat_ids = set(include_cat_ids if include_cat_ids else []) | set(exclude_cat_ids if exclude_cat_ids else [])
-        
-        if not all_relevant_cat_ids:
-            products = get_unique_products()
-        else:
-            products = get_unique_products(category_id=list(all_relevant_cat_ids))
-        
-        product_options = [{'label': i, 'value': i} for i in products]
-        
-        # Возвращаем одинаковые опции для обоих дропдаунов
-        return [product_options, product_options]
+    # Callback'и для обновления списков продуктов на вкладке "Помесячные продажи"
+    # (поиск по мере ввода, у каждого списка свой текст поиска)
+    for dropdown_id in ('monthly-sales-product-dropdown', 'monthly-sales-exclude-product-dropdown'):
+        @app.callback(
+            Output(dropdown_id, 'options'),
+            [Input('monthly-sales-category-dropdown', 'value'),
+             Input('monthly-sales-exclude-category-dropdown', 'value'),
+             Input(dropdown_id, 'search_value')],
+            [State(dropdown_id, 'value')]
+        )
+        def update_monthly_sales_product_dropdown(include_cat_ids, exclude_cat_ids, search_value, selected):
+            # Используем set для избежания дублирования, если одна и та же категория в обоих списках
+            all_relevant_cat_ids = set(include_cat_ids if include_cat_ids else []) | set(exclude_cat_ids if exclude_cat_ids else [])
+            return product_options(search_value, list(all_relevant_cat_ids), selected)
 
     # Callback для обновления вкладки "Помесячные продажи"
     @app.callback(
         [Output('monthly-sales-graph', 'figure'),
+         Output('monthly-sales-graph-shape', 'data'),
          Output('monthly-sales-table', 'data'),
          Output('monthly-sales-table', 'columns'),
          Output('monthly-sales-summary', 'children'),
          Output('monthly-sales-by-product-graph', 'figure'),
-         Output('monthly-sales-by-product-table', 'data'),
-         Output('monthly-sales-by-product-table', 'columns'),
+         Output('monthly-sales-by-product-graph-shape', 'data'),
          Output('monthly-sales-by-product-summary', 'children'),
          Output('monthly-sales-by-category-graph', 'figure'),
+         Output('monthly-sales-by-category-graph-shape', 'data'),
          Output('monthly-sales-by-category-table', 'data'),
          Output('monthly-sales-by-category-table', 'columns'),
          Output('monthly-sales-by-category-summary', 'children')],
@@ -568,9 +616,17 @@ def register_callbacks(app):
          Input('monthly-sales-category-dropdown', 'value'),
          Input('monthly-sales-product-dropdown', 'value'),
          Input('monthly-sales-exclude-category-dropdown', 'value'),
-         Input('monthly-sales-exclude-product-dropdown', 'value')]
+         Input('monthly-sales-exclude-product-dropdown', 'value'),
+         Input('monthly-sales-category-level-dropdown', 'value')],
+        [State('monthly-sales-graph-shape', 'data'),
+         State('monthly-sales-by-product-graph-shape', 'data'),
+         State('monthly-sales-by-category-graph-shape', 'data'),
+         State('session-id', 'data')],
+        **background_options(app, 'monthly-sales-running')
     )
-    def update_monthly_sales_tab(start_date, end_date, category_ids, product_names, exclude_category_ids, exclude_product_names):
+    @cancellable
+    def update_monthly_sales_tab(start_date, end_date, category_ids, product_names, exclude_category_ids, exclude_product_names,
+                                 level, monthly_shape, by_product_shape, by_category_shape):
         if not start_date or not end_date:
             raise PreventUpdate
 
@@ -578,14 +634,17 @@ def register_callbacks(app):
         end_date_corrected = end_date_dt.strftime('%Y-%m-%d')
 
         # Получение данных
-        df_monthly = get_monthly_sales(start_date, end_date_corrected, category_ids, product_names, exclude_category_ids, exclude_product_names)
-        df_by_product = get_monthly_sales_by_product(start_date, end_date_corrected, category_ids, product_names, exclude_category_ids, exclude_product_names)
-        df_by_category = get_monthly_sales_by_category(start_date, end_date_corrected, category_ids, product_names, exclude_category_ids, exclude_product_names)
+        filters = (start_date, end_date_corrected, category_ids, product_names, exclude_category_ids, exclude_product_names)
+        df_monthly = get_monthly_sales(*filters)
+        df_by_product = get_monthly_sales_by_product(*filters)
+        df_by_category = get_monthly_sales_by_category(*filters, level=level)
 
         empty_fig = _create_empty_figure("Нет данных за выбранный период")
         empty_summary = []
         if df_monthly.empty:
-            return empty_fig, [], [], empty_summary, empty_fig, [], [], empty_summary, empty_fig, [], [], empty_summary
+            return (*patch_figure(empty_fig, monthly_shape), [], [], empty_summary,
+                    *patch_figure(empty_fig, by_product_shape), empty_summary,
+                    *patch_figure(empty_fig, by_category_shape), [], [], empty_summary)
 
         # --- Общая функция для создания сводки ---
         def create_summary(df, total_sales_col='total_sales', total_orders_col='total_orders', paid_orders_col='paid_orders', is_monthly=False):
@@ -612,12 +671,7 @@ def register_callbacks(app):
         total_monthly_orders = df_monthly['total_orders'].sum()
         total_monthly_paid_orders = df_monthly['paid_orders'].sum()
         
-        fig_monthly = px.bar(
-            df_monthly, x='month', y='total_sales', title='Динамика продаж по месяцам',
-            labels={'month': 'Месяц', 'total_sales': 'Сумма продаж'}, text='total_sales'
-        )
-        fig_monthly.update_traces(texttemplate='%{text:,.0f}', textposition='outside')
-        fig_monthly.update_layout(uniformtext_minsize=8, uniformtext_mode='hide', yaxis_title="Сумма продаж")
+        fig_monthly = cached_figure('monthly-sales-graph', filters, lambda: build_monthly_sales_figure(df_monthly))
         
         summary_monthly = create_summary(df_monthly, 'total_sales', 'total_orders', 'paid_orders', is_monthly=True)
         df_monthly['total_sales'] = df_monthly['total_sales'].apply(lambda x: f"{x:,.2f}".replace(",", " "))
@@ -633,35 +687,16 @@ def register_callbacks(app):
         ]
 
         # --- Второй график, таблица и сводка (по продуктам) ---
+        # Таблица по продуктам обновляется отдельным callback постранично
         if df_by_product.empty:
-            fig_by_product, table_by_product_data, table_by_product_columns, summary_by_product = empty_fig, [], [], empty_summary
+            fig_by_product, summary_by_product = empty_fig, empty_summary
         else:
-            total_product_sales = df_by_product['total_sales'].sum()
-            total_product_orders = df_by_product['total_orders'].sum()
-            total_product_paid_orders = df_by_product['paid_orders'].sum()
-
-            fig_by_product = px.bar(
-                df_by_product, x='month', y='total_sales', color='product', title='Динамика продаж по продуктам',
-                labels={'month': 'Месяц', 'total_sales': 'Сумма продаж', 'product': 'Продукт'},
-                barmode='group', text='total_sales'
+            fig_by_product = cached_figure(
+                'monthly-sales-by-product-graph', filters,
+                lambda: build_monthly_breakdown_figure(df_by_product, 'product', 'Продукт', 'Динамика продаж по продуктам')
             )
-            fig_by_product.update_traces(texttemplate='%{text:,.0f}', textposition='outside')
-            fig_by_product.update_layout(uniformtext_minsize=8, uniformtext_mode='hide', yaxis_title="Сумма продаж")
             
             summary_by_product = create_summary(df_by_product, 'total_sales', 'total_orders', 'paid_orders', is_monthly=True)
-            df_by_product['total_sales'] = df_by_product['total_sales'].apply(lambda x: f"{x:,.2f}".replace(",", " "))
-            table_by_product_data = df_by_product.to_dict('records')
-            table_by_product_data.append({
-                'month': 'Итого',
-                'product': '',
-                'total_sales': f"{total_product_sales:,.2f}".replace(",", " "),
-                'paid_orders': total_product_paid_orders
-            })
-            table_by_product_columns = [
-                {"name": "Месяц", "id": "month"}, {"name": "Продукт", "id": "product"},
-                {"name": "Сумма продаж", "id": "total_sales"},
-                {"name": "Оплаты", "id": "paid_orders"}
-            ]
 
         # --- Третий график, таблица и сводка (по категориям) ---
         if df_by_category.empty:
@@ -671,13 +706,10 @@ def register_callbacks(app):
             total_category_orders = df_by_category['total_orders'].sum()
             total_category_paid_orders = df_by_category['paid_orders'].sum()
 
-            fig_by_category = px.bar(
-                df_by_category, x='month', y='total_sales', color='category', title='Динамика продаж по категориям',
-                labels={'month': 'Месяц', 'total_sales': 'Сумма продаж', 'category': 'Категория'},
-                barmode='group', text='total_sales'
+            fig_by_category = cached_figure(
+                'monthly-sales-by-category-graph', (*filters, level),
+                lambda: build_monthly_breakdown_figure(df_by_category, 'category', 'Категория', 'Динамика продаж по категориям')
             )
-            fig_by_category.update_traces(texttemplate='%{text:,.0f}', textposition='outside')
-            fig_by_category.update_layout(uniformtext_minsize=8, uniformtext_mode='hide', yaxis_title="Сумма продаж")
             
             summary_by_category = create_summary(df_by_category, 'total_sales', 'total_orders', 'paid_orders', is_monthly=True)
             df_by_category['total_sales'] = df_by_category['total_sales'].apply(lambda x: f"{x:,.2f}".replace(",", " "))
@@ -694,9 +726,253 @@ def register_callbacks(app):
                 {"name": "Оплаты", "id": "paid_orders"}
             ]
 
-        return (fig_monthly, table_monthly_data, table_monthly_columns, summary_monthly,
-                fig_by_product, table_by_product_data, table_by_product_columns, summary_by_product,
-                fig_by_category, table_by_category_data, table_by_category_columns, summary_by_category)
+        # Если графики уже отображаются, отправляются только данные трасс;
+        # столбцы соответствующих таблиц в этом случае тоже не меняются
+        fig_monthly, monthly_shape = patch_figure(fig_monthly, monthly_shape)
+        if is_patch(fig_monthly):
+            table_monthly_columns = no_update
+        fig_by_product, by_product_shape = patch_figure(fig_by_product, by_product_shape)
+        fig_by_category, by_category_shape = patch_figure(fig_by_category, by_category_shape)
+        if is_patch(fig_by_category):
+            table_by_category_columns = no_update
+
+        return (fig_monthly, monthly_shape, table_monthly_data, table_monthly_columns, summary_monthly,
+                fig_by_product, by_product_shape, summary_by_product,
+                fig_by_category, by_category_shape, table_by_category_data, table_by_category_columns, summary_by_category)
+
+    # Callback для таблицы продаж по продуктам за месяц (постранично, на стороне сервера)
+    @app.callback(
+        [Output('monthly-sales-by-product-table', 'data'),
+         Output('monthly-sales-by-product-table', 'columns'),
+         Output('monthly-sales-by-product-table', 'page_count')],
+        [Input('monthly-sales-date-picker', 'start_date'),
+         Input('monthly-sales-date-picker', 'end_date'),
+         Input('monthly-sales-category-dropdown', 'value'),
+         Input('monthly-sales-product-dropdown', 'value'),
+         Input('monthly-sales-exclude-category-dropdown', 'value'),
+         Input('monthly-sales-exclude-product-dropdown', 'value'),
+         Input('monthly-sales-by-product-table', 'page_current'),
+         Input('monthly-sales-by-product-table', 'page_size'),
+         Input('monthly-sales-by-product-table', 'sort_by'),
+         Input('monthly-sales-by-product-table', 'filter_query')],
+        [State('session-id', 'data')]
+    )
+    @cancellable
+    def update_monthly_sales_by_product_table(start_date, end_date, category_ids, product_names, exclude_category_ids, exclude_product_names,
+                                              page_current, page_size, sort_by, filter_query):
+        if not start_date or not end_date:
+            raise PreventUpdate
+
+        end_date_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+        end_date_corrected = end_date_dt.strftime('%Y-%m-%d')
+
+        df, total_rows, totals = get_monthly_sales_by_product_page(
+            start_date, end_date_corrected, category_ids, product_names, exclude_category_ids, exclude_product_names,
+            page_current, page_size, sort_by, filter_query
+        )
+
+        table_columns = [
+            {"name": "Месяц", "id": "month"}, {"name": "Продукт", "id": "product"},
+            {"name": "Сумма продаж", "id": "total_sales"},
+            {"name": "Оплаты", "id": "paid_orders"}
+        ]
+
+        if df.empty:
+            return [], table_columns_update(table_columns, 'monthly-sales-by-product-table'), 1
+
+        df['total_sales'] = df['total_sales'].apply(lambda x: f"{x:,.2f}".replace(",", " "))
+        table_data = df.to_dict('records')
+        table_data.append({
+            'month': 'Итого',
+            'product': '',
+            'total_sales': f"{totals['total_sales'] or 0:,.2f}".replace(",", " "),
+            'paid_orders': totals['paid_orders']
+        })
+
+        return table_data, table_columns_update(table_columns, 'monthly-sales-by-product-table'), page_count(total_rows, page_size)
+
+def build_general_sales_figure(df):
+    """
+    Строит график дохода по дням для вкладки "Общая динамика".
+    Длинные ряды прореживаются, разрешение указывается в заголовке.
+    """
+    if df.empty:
+        return _create_empty_figure("Нет данных за выбранный период")
+
+    df, resolution = downsample_line(df, 'date', 'total_sales')
+    title = 'Динамика дохода по дням'
+    if resolution:
+        title += f' ({resolution}; увеличьте масштаб для полного разрешения)'
+
+    fig = px.line(
+        df, x='date', y='total_sales', title=title,
+        labels={'date': 'Дата', 'total_sales': 'Сумма дохода'}
+    )
+    fig.update_layout(margin=dict(l=40, r=40, t=40, b=40))
+    return fig
+
+def build_category_revenue_bar_figure(df):
+    """
+    Строит столбчатый график дохода по категориям.
+    """
+    fig = px.bar(
+        df, 
+        x='category_name', 
+        y='total_revenue',
+        title='Доход по категориям',
+        labels={'category_name': 'Категория', 'total_revenue': 'Суммарный доход'},
+        text='total_revenue'
+    )
+    fig.update_traces(texttemplate='%{text:.2s}', textposition='outside')
+    fig.update_layout(uniformtext_minsize=8, uniformtext_mode='hide')
+    return fig
+
+def build_category_revenue_pie_figure(df):
+    """
+    Строит круговой график долей категорий в общем доходе.
+    """
+    fig = px.pie(
+        df, 
+        names='category_name', 
+        values='total_revenue',
+        title='Доля категорий в общем доходе',
+        hole=.3
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
+def build_partner_registrations_figure(df):
+    """
+    Строит график количества регистраций по партнерам (по убыванию).
+    """
+    df_sorted = df.sort_values(by='order_count', ascending=False)
+    fig = px.bar(
+        df_sorted,
+        x='partner',
+        y='order_count',
+        title='Количество регистраций по партнерам',
+        labels={'partner': 'Партнер', 'order_count': 'Количество регистраций'},
+        text='order_count'
+    )
+    fig.update_traces(textposition='outside')
+    fig.update_layout(
+        uniformtext_minsize=8, 
+        uniformtext_mode='hide',
+        yaxis_range=[0, df_sorted['order_count'].max() * 1.1] # Увеличиваем диапазон оси Y
+    )
+    return fig
+
+def build_partner_income_figure(df):
+    """
+    Строит график дохода по партнерам.
+    """
+    fig = px.bar(
+        df,
+        x='partner',
+        y='total_income',
+        title='Доход по партнерам',
+        labels={'partner': 'Партнер', 'total_income': 'Доход'},
+        text='total_income'
+    )
+    fig.update_traces(texttemplate='%{text:.2s}', textposition='outside')
+    fig.update_layout(uniformtext_minsize=8, uniformtext_mode='hide')
+    return fig
+
+def build_monthly_sales_figure(df):
+    """
+    Строит график продаж по месяцам для вкладки "Помесячные продажи".
+    """
+    if df.empty:
+        return _create_empty_figure("Нет данных за выбранный период")
+
+    fig = px.bar(
+        df, x='month', y='total_sales', title='Динамика продаж по месяцам',
+        labels={'month': 'Месяц', 'total_sales': 'Сумма продаж'}, text='total_sales'
+    )
+    fig.update_traces(texttemplate='%{text:,.0f}', textposition='outside')
+    fig.update_layout(uniformtext_minsize=8, uniformtext_mode='hide', yaxis_title="Сумма продаж")
+    return fig
+
+def build_monthly_breakdown_figure(df, column, label, title):
+    """
+    Строит сгруппированный по месяцам график продаж в разрезе продуктов
+    или категорий (столбец column).
+    """
+    if df.empty:
+        return _create_empty_figure("Нет данных за выбранный период")
+
+    fig = px.bar(
+        df, x='month', y='total_sales', color=column, title=title,
+        labels={'month': 'Месяц', 'total_sales': 'Сумма продаж', column: label},
+        barmode='group', text='total_sales'
+    )
+    fig.update_traces(texttemplate='%{text:,.0f}', textposition='outside')
+    fig.update_layout(uniformtext_minsize=8, uniformtext_mode='hide', yaxis_title="Сумма продаж")
+    return fig
+
+def _build_product_sales_figure(df, product_names, x_range=None):
+    """
+    Строит график дневного и накопительного дохода по продуктам.
+    Если дней больше бюджета точек, столбцы агрегируются по неделям или месяцам.
+    """
+    df, resolution = bucket_by_period(df, 'date', {
+        'daily_sales': 'sum',
+        'total_orders': 'sum',
+        'paid_orders': 'sum',
+        'cumulative_sales': 'last',
+    })
+
+    # Создаем фигуру с двумя осями Y
+    fig = go.Figure()
+
+    # Добавляем столбчатую диаграмму для дневного дохода (основная ось Y)
+    fig.add_trace(go.Bar(
+        x=df['date'],
+        y=df['daily_sales'],
+        name='Дневной доход' if resolution == 'по дням' else f'Доход {resolution}',
+        marker_color='blue'
+    ))
+
+    # Добавляем линейный график для накопительного дохода (вторичная ось Y)
+    fig.add_trace(go.Scatter(
+        x=df['date'],
+        y=df['cumulative_sales'],
+        name='Накопительный доход',
+        yaxis='y2',
+        mode='lines+markers',
+        line=dict(color='red')
+    ))
+
+    # Настраиваем layout
+    title_text = "Динамика дохода по выбранным продуктам"
+    if len(product_names) == 1:
+        title_text = f'Динамика дохода по продукту: {product_names[0]}'
+    elif len(product_names) > 1:
+        title_text = f'Динамика дохода по продуктам: {", ".join(product_names)}'
+    if resolution != 'по дням':
+        title_text += f' ({resolution}; увеличьте масштаб для дневных данных)'
+
+    fig.update_layout(
+        title=title_text,
+        xaxis_title='Дата',
+        yaxis=dict(
+            title='Дневной доход',
+            titlefont=dict(color='blue'),
+            tickfont=dict(color='blue')
+        ),
+        yaxis2=dict(
+            title='Накопительный доход',
+            titlefont=dict(color='red'),
+            tickfont=dict(color='red'),
+            overlaying='y',
+            side='right'
+        ),
+        legend=dict(x=0.1, y=1.1, orientation='h'),
+        margin=dict(l=60, r=60, t=60, b=60)
+    )
+    if x_range:
+        fig.update_xaxes(range=x_range)
+    return fig
 
 def _create_empty_figure(text):
     """Создает пустую фигуру с текстовым сообщением."""
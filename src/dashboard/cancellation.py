@@ -0,0 +1,145 @@
+"""
+Отмена устаревших запросов дашборда.
+
+Перетаскивание дат или правка списков с множественным выбором порождает
+серию вызовов одного callback'а, но на экране остается только результат
+последнего. Каждый вызов регистрируется как последний для пары
+(сессия браузера, callback): в общем кэше сохраняется новый токен. Пока
+выполняется SQL-запрос, обработчик прогресса SQLite периодически сверяет
+свой токен с сохраненным и прерывает запрос, если его вытеснил более
+новый вызов. Callback в этом случае завершается без обновления (PreventUpdate).
+
+Идентификатор сессии создается в браузере (хранилище 'session-id').
+Для запросов через аналитическое зеркало (DuckDB) проверка выполняется
+только перед запуском запроса.
+"""
+import contextvars
+import functools
+import time
+import uuid
+from contextlib import contextmanager
+
+from dash.exceptions import PreventUpdate
+from sqlalchemy.exc import OperationalError
+
+# Как часто (секунд) обработчик прогресса сверяет токен с общим кэшем
+CHECK_INTERVAL = 0.1
+
+# Через сколько инструкций виртуальной машины SQLite вызывается обработчик прогресса
+PROGRESS_STEPS = 10000
+
+# Время хранения токена последнего вызова, секунд
+TOKEN_TTL = 3600
+
+_current = contextvars.ContextVar('dashboard_cancel_token', default=None)
+
+
+class QueryCancelled(Exception):
+    """Запрос прерван, так как его вытеснил более новый вызов того же callback'а."""
+
+
+class _Token:
+    """Токен вызова callback'а для пары (сессия, callback)."""
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.cancelled = False
+        self._checked_at = 0.0
+
+    def is_cancelled(self):
+        """
+        Возвращает True, если вызов вытеснен. Общий кэш опрашивается
+        не чаще раза в CHECK_INTERVAL секунд.
+        """
+        if self.cancelled:
+            return True
+        now = time.monotonic()
+        if now - self._checked_at >= CHECK_INTERVAL:
+            from .cache import get_cache
+
+            self._checked_at = now
+            latest = get_cache().get(self.key)
+            self.cancelled = latest is not None and latest != self.value
+        return self.cancelled
+
+    def raise_if_cancelled(self):
+        if self.is_cancelled():
+            raise QueryCancelled(self.key)
+
+
+@contextmanager
+def supersede(session_id, scope):
+    """
+    Регистрирует текущий вызов как последний для пары (session_id, scope);
+    предыдущие вызовы той же пары прерываются. Без session_id ничего не делает.
+    """
+    if not session_id:
+        yield
+        return
+
+    from .cache import get_cache
+
+    token = _Token(f"cancel:{session_id}:{scope}", uuid.uuid4().hex)
+    get_cache().set(token.key, token.value, expire=TOKEN_TTL)
+    reset = _current.set(token)
+    try:
+        yield
+    finally:
+        _current.reset(reset)
+
+
+def raise_if_cancelled():
+    """
+    Прерывает выполнение (QueryCancelled), если текущий вызов уже вытеснен.
+    """
+    token = _current.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def interruptible(db):
+    """
+    Делает SQL-запросы сессии db прерываемыми: если текущий вызов вытеснен,
+    выполнение запроса SQLite останавливается и выбрасывается QueryCancelled.
+    """
+    token = _current.get()
+    if token is None:
+        yield
+        return
+
+    token.raise_if_cancelled()
+    raw_connection = db.connection().connection.driver_connection
+    if not hasattr(raw_connection, 'set_progress_handler'):
+        yield  # Не SQLite
+        return
+
+    # Ненулевой результат обработчика прерывает текущий запрос SQLite
+    raw_connection.set_progress_handler(lambda: int(token.is_cancelled()), PROGRESS_STEPS)
+    try:
+        yield
+    except OperationalError as e:
+        if token.cancelled:
+            raise QueryCancelled(token.key) from e
+        raise
+    finally:
+        raw_connection.set_progress_handler(None, PROGRESS_STEPS)
+
+
+def cancellable(func):
+    """
+    Декоратор callback'а: последним аргументом callback получает id сессии
+    (State('session-id', 'data')). Вызов вытесняет предыдущие вызовы того же
+    callback'а в этой сессии, а вытесненный вызов завершается без обновления.
+    """
+    @functools.wraps(func)
+    def wrapper(*args):
+        *args, session_id = args
+        try:
+            with supersede(session_id, func.__name__):
+                return func(*args)
+        except QueryCancelled:
+            raise PreventUpdate
+
+    return wrapper
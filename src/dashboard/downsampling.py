@@ -0,0 +1,151 @@
+"""
+Прореживание данных для графиков дашборда.
+
+На длинных периодах дневных точек становится слишком много: фигуры Plotly
+разрастаются и медленно отрисовываются. Если число точек превышает бюджет
+(переменная окружения DASHBOARD_MAX_CHART_POINTS), то:
+- линии прореживаются алгоритмом LTTB (Largest-Triangle-Three-Buckets),
+  который сохраняет форму ряда;
+- столбцы агрегируются по неделям или месяцам.
+При увеличении масштаба графика данные пересчитываются для видимого окна,
+и там снова используется полное разрешение.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Максимальное число точек на одном графике
+MAX_CHART_POINTS = int(os.getenv("DASHBOARD_MAX_CHART_POINTS", "500"))
+
+# Частоты агрегации для столбчатых графиков: (правило pandas, подпись)
+_BUCKETS = [
+    (None, "по дням"),
+    ('W-MON', "по неделям"),
+    ('MS', "по месяцам"),
+]
+
+
+def lttb(x, y, threshold):
+    """
+    Прореживает ряд алгоритмом Largest-Triangle-Three-Buckets.
+
+    Args:
+        x (array-like): Числовые значения по оси X (возрастающие).
+        y (array-like): Значения по оси Y.
+        threshold (int): Требуемое число точек.
+
+    Returns:
+        np.ndarray: Индексы выбранных точек (первая и последняя всегда включены).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    # Внутренние точки делятся на threshold - 2 корзины
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Среднее следующей корзины (для последней — последняя точка)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Выбираем точку, образующую треугольник наибольшей площади
+        # с предыдущей выбранной точкой и средним следующей корзины
+        area = np.abs(
+            (x[selected] - avg_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(np.argmax(area))
+        indices[i + 1] = selected
+    return indices
+
+
+def downsample_line(df, x_col, y_col, max_points=None):
+    """
+    Прореживает DataFrame с линейным рядом методом LTTB.
+
+    Returns:
+        tuple: (DataFrame, подпись разрешения или None, если прореживание не понадобилось).
+    """
+    max_points = max_points or MAX_CHART_POINTS
+    if len(df) <= max_points:
+        return df, None
+
+    x = pd.to_datetime(df[x_col]).astype('int64')
+    y = df[y_col].fillna(0)
+    indices = lttb(x, y, max_points)
+    label = f"LTTB: {len(indices)} из {len(df)} точек"
+    return df.iloc[indices].reset_index(drop=True), label
+
+
+def bucket_by_period(df, date_col, aggregations, max_points=None):
+    """
+    Агрегирует дневные данные по неделям или месяцам, если дней больше бюджета.
+
+    Args:
+        df (DataFrame): Дневные данные.
+        date_col (str): Столбец с датой ('YYYY-MM-DD').
+        aggregations (dict): Функции агрегации по столбцам, например {'daily_sales': 'sum'}.
+
+    Returns:
+        tuple: (DataFrame, подпись разрешения: "по дням", "по неделям" или "по месяцам").
+    """
+    max_points = max_points or MAX_CHART_POINTS
+    dates = pd.to_datetime(df[date_col])
+    span_days = (dates.max() - dates.min()).days + 1 if len(df) else 0
+
+    for rule, label in _BUCKETS:
+        if rule is None:
+            if len(df) <= max_points:
+                return df, label
+            continue
+        periods = span_days / 7 if rule.startswith('W') else span_days / 30
+        if periods <= max_points or rule == _BUCKETS[-1][0]:
+            grouped = (
+                df.assign(**{date_col: dates})
+                  .groupby(pd.Grouper(key=date_col, freq=rule, label='left', closed='left'))
+                  .agg(aggregations)
+                  .ffill()
+                  .reset_index()
+            )
+            grouped[date_col] = grouped[date_col].dt.strftime('%Y-%m-%d')
+            return grouped, label
+    return df, _BUCKETS[0][1]
+
+
+def parse_zoom(relayout_data):
+    """
+    Извлекает видимый диапазон оси X из relayoutData графика.
+
+    Returns:
+        tuple | str | None: (начало, конец) в формате 'YYYY-MM-DD' при увеличении,
+        'reset' при возврате к полному масштабу, None — если ось X не менялась.
+    """
+    if not relayout_data:
+        return None
+    if relayout_data.get('xaxis.autorange'):
+        return 'reset'
+
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        start, end = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    elif 'xaxis.range' in relayout_data:
+        start, end = relayout_data['xaxis.range']
+    else:
+        return None
+
+    return (
+        pd.to_datetime(start).strftime('%Y-%m-%d'),
+        pd.to_datetime(end).strftime('%Y-%m-%d'),
+    )
@@ -0,0 +1,92 @@
+"""
+Быстрое получение результатов запросов в виде DataFrame.
+
+pd.read_sql на каждом вызове заново оборачивает подключение, получает строки
+как объекты Row и угадывает типы столбцов. Здесь:
+- каждая форма запроса компилируется один раз (собственный кэш скомпилированных
+  выражений SQLAlchemy);
+- строки читаются напрямую из DBAPI-курсора пачками в заранее выделенные
+  типизированные массивы NumPy (по массиву на столбец);
+- типы столбцов берутся из выражения запроса, а не выводятся по данным.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import Float, Integer, Numeric
+from sqlalchemy.types import NullType
+from sqlalchemy.util import LRUCache
+
+# Кэш скомпилированных запросов: ключ — структура запроса без значений параметров
+_STATEMENT_CACHE = LRUCache(500)
+
+# Размер пачки строк, читаемых из курсора за один раз
+FETCH_BATCH_SIZE = 10000
+
+
+def _column_dtype(column):
+    """
+    Определяет dtype NumPy по типу SQLAlchemy выбранного столбца.
+    """
+    if isinstance(column.type, (Float, Numeric)):
+        return np.float64
+    if isinstance(column.type, Integer):
+        return np.int64
+    return object
+
+
+def _fetch_columns(cursor, dtypes):
+    """
+    Читает все строки курсора пачками в заранее выделенные массивы NumPy,
+    по одному массиву на столбец. При заполнении массивы увеличиваются вдвое.
+    """
+    capacity = FETCH_BATCH_SIZE
+    arrays = [np.empty(capacity, dtype=dtype) for dtype in dtypes]
+    size = 0
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not rows:
+            break
+        count = len(rows)
+        end = size + count
+        if end > capacity:
+            capacity = max(end, capacity * 2)
+            for i, array in enumerate(arrays):
+                grown = np.empty(capacity, dtype=array.dtype)
+                grown[:size] = array[:size]
+                arrays[i] = grown
+        for i, array in enumerate(arrays):
+            try:
+                array[size:end] = np.fromiter((row[i] for row in rows), dtype=array.dtype, count=count)
+            except TypeError:
+                # NULL в целочисленном столбце (например, SUM по пустой выборке):
+                # переводим столбец в float64, как это сделал бы pandas.
+                arrays[i] = array = array.astype(np.float64)
+                array[size:end] = np.fromiter((row[i] for row in rows), dtype=np.float64, count=count)
+        size = end
+    return [array[:size] for array in arrays]
+
+
+def read_frame(db, statement):
+    """
+    Выполняет запрос и строит DataFrame без поэлементной упаковки строк.
+
+    Args:
+        db: Сессия SQLAlchemy.
+        statement: Выражение SELECT (например, query.statement).
+    """
+    columns = list(statement.selected_columns)
+    names = [c.key for c in columns]
+
+    connection = db.connection().execution_options(compiled_cache=_STATEMENT_CACHE)
+    result = connection.execute(statement)
+    try:
+        # Читаем кортежи напрямую из DBAPI-курсора, минуя объекты Row
+        arrays = _fetch_columns(result.cursor, [_column_dtype(c) for c in columns])
+    finally:
+        result.close()
+
+    df = pd.DataFrame(dict(zip(names, arrays)), columns=names)
+    for i, column in enumerate(columns):
+        if isinstance(column.type, NullType):
+            # Тип выражения неизвестен (date(), avg() и т.п.) — уточняем по данным
+            df[names[i]] = df[names[i]].infer_objects()
+    return df
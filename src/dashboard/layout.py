@@ -3,457 +3,568 @@
 """
 from dash import dcc, html, dash_table
 from datetime import date, timedelta
+from .tables import DEFAULT_PAGE_SIZE
+from .background import running_indicator
+from .patching import shape_store
+
+# Параметры таблиц с серверной пагинацией, сортировкой и фильтрацией:
+# в браузер передается только видимая страница.
+SERVER_SIDE_TABLE = dict(
+    page_action='custom',
+    page_current=0,
+    page_size=DEFAULT_PAGE_SIZE,
+    sort_action='custom',
+    sort_mode='single',
+    sort_by=[],
+    filter_action='custom',
+    filter_query='',
+)
+
+# Период по умолчанию (дней до сегодняшнего дня) для большинства вкладок
+# и для вкладки "Помесячные продажи". Эти же значения прогреваются в кэше.
+DEFAULT_PERIOD_DAYS = 30
+DEFAULT_MONTHLY_PERIOD_DAYS = 365
+
+# Оформление блока "Бирюзовый фонд"
+FUND_TEXT_STYLE = {'fontWeight': 'bold', 'color': '#008080'} # Темно-бирюзовый
+FUND_NUMBER_STYLE = {'fontSize': '1.2em', 'color': 'purple', 'fontWeight': 'bold', 'marginLeft': '5px'}
+
+# Параметры сохранения выбранных фильтров: вкладки создаются заново при каждом
+# переключении, а значения фильтров восстанавливаются в пределах сессии браузера.
+PERSISTED = dict(persistence=True, persistence_type='session')
+
+# Уровни дерева категорий, к которым сворачиваются отчеты по категориям
+# (пустое значение — категории как назначены продуктам)
+CATEGORY_LEVEL_OPTIONS = [
+    {'label': 'Верхний уровень', 'value': 0},
+    {'label': '2-й уровень', 'value': 1},
+    {'label': '3-й уровень', 'value': 2},
+]
+
+
+def category_level_dropdown(dropdown_id):
+    """
+    Выпадающий список уровня свертки категорий.
+    """
+    return dcc.Dropdown(
+        id=dropdown_id, **PERSISTED, options=CATEGORY_LEVEL_OPTIONS,
+        clearable=True,
+        placeholder="Как назначены"
+    )
+
+
+def build_general_tab(categories):
+    """
+    Вкладка 1: Общая динамика.
+    """
+    return html.Div([
+        html.Div([
+            html.Label("Выберите период:"),
+            dcc.DatePickerSingle(
+                id='start-date-picker-general', **PERSISTED,
+                min_date_allowed=date(2020, 1, 1),
+                max_date_allowed=date.today(),
+                initial_visible_month=date.today(),
+                date=date.today() - timedelta(days=DEFAULT_PERIOD_DAYS),
+                display_format='DD.MM.YYYY'
+            ),
+            dcc.DatePickerSingle(
+                id='end-date-picker-general', **PERSISTED,
+                min_date_allowed=date(2020, 1, 1),
+                max_date_allowed=date.today(),
+                initial_visible_month=date.today(),
+                date=date.today(),
+                display_format='DD.MM.YYYY'
+            ),
+            html.Div([
+                html.Label("Выберите категорию:"),
+                dcc.Dropdown(id='category-dropdown-general', **PERSISTED, options=categories, placeholder="Все категории", clearable=True),
+            ], style={'width': '30%', 'display': 'inline-block', 'marginLeft': '20px'}),
+        ], style={'marginTop': '20px', 'marginBottom': '20px'}),
+        dcc.Graph(id='sales-by-day-chart'), shape_store('sales-by-day-chart')
+    ])
+
+
+def build_product_tab(categories):
+    """
+    Вкладка 2: Отчет по продуктам.
+    """
+    return html.Div([
+        html.Div([
+            html.Div([
+                html.Label("Выберите категорию:"),
+                dcc.Dropdown(id='category-dropdown-product', **PERSISTED, options=categories, placeholder="Все категории", clearable=True),
+            ], style={'width': '30%', 'display': 'inline-block', 'verticalAlign': 'top'}),
+
+            html.Div([
+                html.Label("Выберите продукт(ы):"),
+                dcc.Dropdown(id='product-dropdown', **PERSISTED, placeholder="Выберите категорию...", multi=True),
+            ], style={'width': '30%', 'display': 'inline-block', 'verticalAlign': 'top', 'marginLeft': '2%'}),
+
+            html.Div([
+                html.Label("Приход от одного из предыдущих фестивалей (по умолчанию от Infinitum 10)"),
+                dcc.Input(
+                    id='festival-income-input', **PERSISTED,
+                    type='number',
+                    value=722556.74,
+                    style={'width': '100%', 'padding': '5px'}
+                ),
+            ], style={'width': '30%', 'display': 'inline-block', 'marginLeft': '2%', 'verticalAlign': 'top'}),
 
-# Определяем layout приложения
-layout = html.Div([
-    html.Div([
-        html.H1("Аналитический дашборд", style={'display': 'inline-block', 'marginRight': '20px'}),
-        html.A(html.Button("Вернуться на главный экран"), href='/', style={'display': 'inline-block', 'verticalAlign': 'top', 'marginTop': '20px'}),
-    ]),
-    
-    dcc.Tabs(id="tabs-main", value='tab-general', children=[
-        # Вкладка 1: Общая динамика
-        dcc.Tab(label='Общая динамика', value='tab-general', children=[
             html.Div([
                 html.Label("Выберите период:"),
                 dcc.DatePickerSingle(
-                    id='start-date-picker-general',
+                    id='start-date-picker-product', **PERSISTED,
                     min_date_allowed=date(2020, 1, 1),
                     max_date_allowed=date.today(),
                     initial_visible_month=date.today(),
-                    date=date.today() - timedelta(days=30),
+                    date=date.today() - timedelta(days=DEFAULT_PERIOD_DAYS),
                     display_format='DD.MM.YYYY'
                 ),
                 dcc.DatePickerSingle(
-                    id='end-date-picker-general',
+                    id='end-date-picker-product', **PERSISTED,
                     min_date_allowed=date(2020, 1, 1),
                     max_date_allowed=date.today(),
                     initial_visible_month=date.today(),
                     date=date.today(),
                     display_format='DD.MM.YYYY'
                 ),
-                html.Div([
-                    html.Label("Выберите категорию:"),
-                    dcc.Dropdown(id='category-dropdown-general', placeholder="Все категории", clearable=True),
-                ], style={'width': '30%', 'display': 'inline-block', 'marginLeft': '20px'}),
-            ], style={'marginTop': '20px', 'marginBottom': '20px'}),
-            dcc.Graph(id='sales-by-day-chart')
-        ]),
+            ], style={'width': '30%', 'display': 'inline-block', 'verticalAlign': 'top'}),
+        ], style={'display': 'flex', 'justifyContent': 'space-between', 'alignItems': 'flex-start', 'flexWrap': 'wrap', 'marginTop': '20px', 'marginBottom': '20px'}),
         
-        # Вкладка 2: Отчет по продуктам
-        dcc.Tab(label='Отчет по продуктам', value='tab-product', children=[
+        # Контейнер для общего дохода
+        html.Div(id='total-income-product', style={'fontSize': 20, 'fontWeight': 'bold', 'marginTop': '20px', 'marginBottom': '20px'}),
+
+        dcc.Graph(id='sales-by-product-chart'), shape_store('sales-by-product-chart'),
+        html.H4("Данные по доходам"),
+        # Строки таблицы без процентов от прихода фестиваля: проценты
+        # считаются в браузере (см. assets/clientside.js)
+        dcc.Store(id='product-sales-rows'),
+        dash_table.DataTable(
+            id='product-sales-table',
+            sort_action="native",
+            filter_action="native",
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left', 'minWidth': '100px', 'width': '100px', 'maxWidth': '100px'},
+            style_header={
+                'backgroundColor': 'rgb(230, 230, 230)',
+                'fontWeight': 'bold'
+            },
+            style_data_conditional=[
+                {
+                    'if': {'row_index': 'odd'},
+                    'backgroundColor': 'rgb(248, 248, 248)'
+                }
+            ],
+        ),
+        html.Div(id='conversion-summary-div', style={
+            'marginTop': '20px',
+            'padding': '10px',
+            'border': '1px solid #ddd',
+            'borderRadius': '5px',
+            'backgroundColor': '#f9f9f9'
+        }),
+        html.H4("Сводка по продуктам", style={'marginTop': '20px'}),
+        dash_table.DataTable(
+            id='product-summary-table',
+            sort_action="native",
+            filter_action="native",
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left', 'minWidth': '100px', 'width': '100px', 'maxWidth': '100px'},
+            style_header={
+                'backgroundColor': 'rgb(230, 230, 230)',
+                'fontWeight': 'bold'
+            },
+            style_data_conditional=[
+                {
+                    'if': {'row_index': 'odd'},
+                    'backgroundColor': 'rgb(248, 248, 248)'
+                }
+            ],
+        ),
+        
+        # Блок для Бирюзового фонда
+        html.Div(id='turquoise-fund-block', style={'display': 'none', 'marginTop': '30px', 'padding': '15px', 'border': '2px solid #40E0D0', 'borderRadius': '5px'}, children=[
+            html.H4(id='turquoise-fund-title', style={'color': '#40E0D0'}),
             html.Div([
-                html.Div([
-                    html.Label("Выберите категорию:"),
-                    dcc.Dropdown(id='category-dropdown-product', placeholder="Все категории", clearable=True),
-                ], style={'width': '30%', 'display': 'inline-block', 'verticalAlign': 'top'}),
-
-                html.Div([
-                    html.Label("Выберите продукт(ы):"),
-                    dcc.Dropdown(id='product-dropdown', placeholder="Выберите категорию...", multi=True),
-                ], style={'width': '30%', 'display': 'inline-block', 'verticalAlign': 'top', 'marginLeft': '2%'}),
-
-                html.Div([
-                    html.Label("Приход от одного из предыдущих фестивалей (по умолчанию от Infinitum 10)"),
-                    dcc.Input(
-                        id='festival-income-input',
-                        type='number',
-                        value=722556.74,
-                        style={'width': '100%', 'padding': '5px'}
-                    ),
-                ], style={'width': '30%', 'display': 'inline-block', 'marginLeft': '2%', 'verticalAlign': 'top'}),
-
-                html.Div([
-                    html.Label("Выберите период:"),
-                    dcc.DatePickerSingle(
-                        id='start-date-picker-product',
-                        min_date_allowed=date(2020, 1, 1),
-                        max_date_allowed=date.today(),
-                        initial_visible_month=date.today(),
-                        date=date.today() - timedelta(days=30),
-                        display_format='DD.MM.YYYY'
-                    ),
-                    dcc.DatePickerSingle(
-                        id='end-date-picker-product',
-                        min_date_allowed=date(2020, 1, 1),
-                        max_date_allowed=date.today(),
-                        initial_visible_month=date.today(),
-                        date=date.today(),
-                        display_format='DD.MM.YYYY'
-                    ),
-                ], style={'width': '30%', 'display': 'inline-block', 'verticalAlign': 'top'}),
-            ], style={'display': 'flex', 'justifyContent': 'space-between', 'alignItems': 'flex-start', 'flexWrap': 'wrap', 'marginTop': '20px', 'marginBottom': '20px'}),
-            
-            # Контейнер для общего дохода
-            html.Div(id='total-income-product', style={'fontSize': 20, 'fontWeight': 'bold', 'marginTop': '20px', 'marginBottom': '20px'}),
-
-            dcc.Graph(id='sales-by-product-chart'),
-            html.H4("Данные по доходам"),
-            dash_table.DataTable(
-                id='product-sales-table',
-                sort_action="native",
-                filter_action="native",
-                style_table={'overflowX': 'auto'},
-                style_cell={'textAlign': 'left', 'minWidth': '100px', 'width': '100px', 'maxWidth': '100px'},
-                style_header={
-                    'backgroundColor': 'rgb(230, 230, 230)',
-                    'fontWeight': 'bold'
-                },
-                style_data_conditional=[
-                    {
-                        'if': {'row_index': 'odd'},
-                        'backgroundColor': 'rgb(248, 248, 248)'
-                    }
-                ],
-            ),
-            html.Div(id='conversion-summary-div', style={
-                'marginTop': '20px',
-                'padding': '10px',
-                'border': '1px solid #ddd',
-                'borderRadius': '5px',
-                'backgroundColor': '#f9f9f9'
-            }),
-            html.H4("Сводка по продуктам", style={'marginTop': '20px'}),
-            dash_table.DataTable(
-                id='product-summary-table',
-                sort_action="native",
-                filter_action="native",
-                style_table={'overflowX': 'auto'},
-                style_cell={'textAlign': 'left', 'minWidth': '100px', 'width': '100px', 'maxWidth': '100px'},
-                style_header={
-                    'backgroundColor': 'rgb(230, 230, 230)',
-                    'fontWeight': 'bold'
-                },
-                style_data_conditional=[
-                    {
-                        'if': {'row_index': 'odd'},
-                        'backgroundColor': 'rgb(248, 248, 248)'
-                    }
-                ],
-            ),
-            
-            # Блок для Бирюзового фонда
-            html.Div(id='turquoise-fund-block', style={'display': 'none', 'marginTop': '30px', 'padding': '15px', 'border': '2px solid #40E0D0', 'borderRadius': '5px'}, children=[
-                html.H4(id='turquoise-fund-title', style={'color': '#40E0D0'}),
-                html.Div(id='turquoise-fund-income', style={'fontWeight': 'bold'}),
-                html.Div([
-                    html.Label("Число сотрудников:", style={'marginRight': '10px'}),
-                    dcc.Input(id='employee-count-input', type='number', value=2, style={'width': '100px'}),
-                ], style={'marginTop': '10px'}),
-                html.Div(id='turquoise-fund-after-tax', style={'marginTop': '10px'}),
-                html.Div(id='employee-income', style={'marginTop': '10px'}),
-            ])
-        ]),
+                html.Span("Бирюзовый фонд (доход): ", style=FUND_TEXT_STYLE),
+                html.Span(id='turquoise-fund-income', style=FUND_NUMBER_STYLE),
+            ], style={'fontWeight': 'bold'}),
+            html.Div([
+                html.Label("Число сотрудников:", style={'marginRight': '10px'}),
+                dcc.Input(id='employee-count-input', **PERSISTED, type='number', value=2, style={'width': '100px'}),
+            ], style={'marginTop': '10px'}),
+            html.Div([
+                html.Span("Бирюзовый фонд (с вычетом 6%): ", style=FUND_TEXT_STYLE),
+                html.Span(id='turquoise-fund-after-tax', style=FUND_NUMBER_STYLE),
+            ], style={'marginTop': '10px'}),
+            html.Div([
+                html.Span("Доход сотрудника: ", style=FUND_TEXT_STYLE),
+                html.Span(id='employee-income', style=FUND_NUMBER_STYLE),
+            ], style={'marginTop': '10px'}),
+        ])
+    ])
+
+
+def build_period_sales_tab(categories):
+    """
+    Вкладка 3: Период и продажи.
+    """
+    return html.Div([
+        html.Div([
+            html.Div([
+                html.Label("Выберите категорию:"),
+                dcc.Dropdown(id='category-dropdown-period', **PERSISTED, options=categories, placeholder="Все категории", clearable=True),
+            ], style={'width': '30%', 'display': 'inline-block', 'verticalAlign': 'top'}),
+            html.Div([
+                html.Label("Выберите период:"),
+                dcc.DatePickerRange(
+                    id='period-sales-date-picker', **PERSISTED,
+                    min_date_allowed=date(2020, 1, 1),
+                    max_date_allowed=date.today(),
+                    start_date=date.today() - timedelta(days=DEFAULT_PERIOD_DAYS),
+                    end_date=date.today(),
+                    display_format='DD.MM.YYYY'
+                ),
+            ], style={'display': 'inline-block', 'marginLeft': '20px'}),
+        ], style={'marginTop': '20px', 'marginBottom': '20px'}),
         
-        # Вкладка 3: Период и продажи
-        dcc.Tab(label='Период и продажи', value='tab-period-sales', children=[
+        html.H4("Продукты с оплатой за период"),
+        dash_table.DataTable(
+            id='period-sales-table',
+            **SERVER_SIDE_TABLE,
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left', 'minWidth': '100px', 'width': '100px', 'maxWidth': '100px'},
+            style_header={
+                'backgroundColor': 'rgb(230, 230, 230)',
+                'fontWeight': 'bold'
+            },
+            style_data_conditional=[
+                {
+                    'if': {'row_index': 'odd'},
+                    'backgroundColor': 'rgb(248, 248, 248)'
+                }
+            ],
+        )
+    ])
+
+
+def build_category_revenue_tab(categories):
+    """
+    Вкладка 4: Анализ дохода по категориям.
+    """
+    return html.Div([
+        html.Div([
             html.Div([
-                html.Div([
-                    html.Label("Выберите категорию:"),
-                    dcc.Dropdown(id='category-dropdown-period', placeholder="Все категории", clearable=True),
-                ], style={'width': '30%', 'display': 'inline-block', 'verticalAlign': 'top'}),
-                html.Div([
-                    html.Label("Выберите период:"),
-                    dcc.DatePickerRange(
-                        id='period-sales-date-picker',
-                        min_date_allowed=date(2020, 1, 1),
-                        max_date_allowed=date.today(),
-                        start_date=date.today() - timedelta(days=30),
-                        end_date=date.today(),
-                        display_format='DD.MM.YYYY'
-                    ),
-                ], style={'display': 'inline-block', 'marginLeft': '20px'}),
-            ], style={'marginTop': '20px', 'marginBottom': '20px'}),
-            
-            html.H4("Продукты с оплатой за период"),
-            dash_table.DataTable(
-                id='period-sales-table',
-                sort_action="native",
-                filter_action="native",
-                style_table={'overflowX': 'auto'},
-                style_cell={'textAlign': 'left', 'minWidth': '100px', 'width': '100px', 'maxWidth': '100px'},
-                style_header={
-                    'backgroundColor': 'rgb(230, 230, 230)',
-                    'fontWeight': 'bold'
-                },
-                style_data_conditional=[
-                    {
-                        'if': {'row_index': 'odd'},
-                        'backgroundColor': 'rgb(248, 248, 248)'
-                    }
-                ],
-            )
-        ]),
+                html.Label("Выберите период:"),
+                dcc.DatePickerRange(
+                    id='category-revenue-date-picker', **PERSISTED,
+                    min_date_allowed=date(2020, 1, 1),
+                    max_date_allowed=date.today(),
+                    start_date=date.today() - timedelta(days=DEFAULT_PERIOD_DAYS),
+                    end_date=date.today(),
+                    display_format='DD.MM.YYYY'
+                ),
+                dcc.Checklist(
+                    id='category-revenue-date-checklist', **PERSISTED,
+                    options=[{'label': 'Учитывать даты?', 'value': 'USE_DATES'}],
+                    value=['USE_DATES'], # По умолчанию включен
+                    style={'marginTop': '5px'}
+                ),
+            ], style={'display': 'inline-block', 'marginRight': '20px', 'verticalAlign': 'top'}),
+            html.Div([
+                html.Label("Исключить категории:"),
+                dcc.Dropdown(
+                    id='exclude-category-dropdown', **PERSISTED, options=categories,
+                    multi=True,
+                    placeholder="Выберите категории для исключения"
+                ),
+            ], style={'display': 'inline-block', 'width': '30%', 'marginRight': '2%'}),
+            html.Div([
+                html.Label("Включить категории:"),
+                dcc.Dropdown(
+                    id='include-category-dropdown', **PERSISTED, options=categories,
+                    multi=True,
+                    placeholder="Выберите категории для включения"
+                ),
+            ], style={'display': 'inline-block', 'width': '30%', 'marginRight': '2%'}),
+            html.Div([
+                html.Label("Уровень категорий:"),
+                category_level_dropdown('category-revenue-level-dropdown'),
+            ], style={'display': 'inline-block', 'width': '13%'}),
+        ], style={'marginTop': '20px', 'marginBottom': '20px', 'display': 'flex'}),
         
-        # Вкладка 4: Анализ дохода по категориям
-        dcc.Tab(label='Анализ дохода по категориям', value='tab-category-revenue', children=[
+        running_indicator('category-revenue-running'),
+        html.Div([
+            # Контейнер для графиков
             html.Div([
-                html.Div([
-                    html.Label("Выберите период:"),
-                    dcc.DatePickerRange(
-                        id='category-revenue-date-picker',
-                        min_date_allowed=date(2020, 1, 1),
-                        max_date_allowed=date.today(),
-                        start_date=date.today() - timedelta(days=30),
-                        end_date=date.today(),
-                        display_format='DD.MM.YYYY'
-                    ),
-                    dcc.Checklist(
-                        id='category-revenue-date-checklist',
-                        options=[{'label': 'Учитывать даты?', 'value': 'USE_DATES'}],
-                        value=['USE_DATES'], # По умолчанию включен
-                        style={'marginTop': '5px'}
-                    ),
-                ], style={'display': 'inline-block', 'marginRight': '20px', 'verticalAlign': 'top'}),
-                html.Div([
-                    html.Label("Исключить категории:"),
-                    dcc.Dropdown(
-                        id='exclude-category-dropdown',
-                        multi=True,
-                        placeholder="Выберите категории для исключения"
-                    ),
-                ], style={'display': 'inline-block', 'width': '45%', 'marginRight': '2%'}),
-                html.Div([
-                    html.Label("Включить категории:"),
-                    dcc.Dropdown(
-                        id='include-category-dropdown',
-                        multi=True,
-                        placeholder="Выберите категории для включения"
-                    ),
-                ], style={'display': 'inline-block', 'width': '45%'}),
-            ], style={'marginTop': '20px', 'marginBottom': '20px', 'display': 'flex'}),
+                dcc.Graph(id='category-revenue-bar-chart'), shape_store('category-revenue-bar-chart'),
+            ], style={'width': '50%', 'display': 'inline-block'}),
             
             html.Div([
-                # Контейнер для графиков
-                html.Div([
-                    dcc.Graph(id='category-revenue-bar-chart'),
-                ], style={'width': '50%', 'display': 'inline-block'}),
-                
-                html.Div([
-                    dcc.Graph(id='category-revenue-pie-chart'),
-                ], style={'width': '50%', 'display': 'inline-block'}),
-            ]),
-            
-            html.H4("Таблица доходов по категориям"),
-            dash_table.DataTable(
-                id='category-revenue-table',
-                sort_action="native",
-                filter_action="native",
-                style_table={'overflowX': 'auto'},
-                style_cell={'textAlign': 'left', 'minWidth': '150px', 'width': '150px', 'maxWidth': '150px'},
-                style_header={
-                    'backgroundColor': 'rgb(230, 230, 230)',
-                    'fontWeight': 'bold'
-                },
-                style_data_conditional=[
-                    {
-                        'if': {'row_index': 'odd'},
-                        'backgroundColor': 'rgb(248, 248, 248)'
-                    }
-                ],
-            )
+                dcc.Graph(id='category-revenue-pie-chart'), shape_store('category-revenue-pie-chart'),
+            ], style={'width': '50%', 'display': 'inline-block'}),
         ]),
         
-        # Вкладка 5: Аналитика по партнерам
-        dcc.Tab(label='Аналитика по партнерам', value='tab-partner-analytics', children=[
+        html.H4("Таблица доходов по категориям"),
+        dash_table.DataTable(
+            id='category-revenue-table',
+            **SERVER_SIDE_TABLE,
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left', 'minWidth': '150px', 'width': '150px', 'maxWidth': '150px'},
+            style_header={
+                'backgroundColor': 'rgb(230, 230, 230)',
+                'fontWeight': 'bold'
+            },
+            style_data_conditional=[
+                {
+                    'if': {'row_index': 'odd'},
+                    'backgroundColor': 'rgb(248, 248, 248)'
+                }
+            ],
+        )
+    ])
+
+
+def build_partner_analytics_tab(categories):
+    """
+    Вкладка 5: Аналитика по партнерам.
+    """
+    return html.Div([
+        html.Div([
             html.Div([
-                html.Div([
-                    html.Label("Выберите период:"),
-                    dcc.DatePickerRange(
-                        id='partner-analytics-date-picker',
-                        min_date_allowed=date(2020, 1, 1),
-                        max_date_allowed=date.today(),
-                        start_date=date.today() - timedelta(days=30),
-                        end_date=date.today(),
-                        display_format='DD.MM.YYYY'
-                    ),
-                ], style={'display': 'inline-block', 'marginRight': '20px'}),
-                html.Div([
-                    dcc.Checklist(
-                        id='exclude-common-source-checklist',
-                        options=[{'label': 'Не учитывать "Общий источник"', 'value': 'exclude'}],
-                        value=['exclude'] # По умолчанию включен
-                    ),
-                ], style={'display': 'inline-block', 'verticalAlign': 'top', 'marginTop': '25px', 'marginRight': '20px'}),
-                html.Div([
-                    dcc.Checklist(
-                        id='show-income-checklist',
-                        options=[{'label': 'Выводить график дохода и поле "Доход" в таблице', 'value': 'show'}],
-                        value=[] # По умолчанию выключен
-                    ),
-                ], style={'display': 'inline-block', 'verticalAlign': 'top', 'marginTop': '25px'}),
-            ], style={'marginTop': '20px', 'marginBottom': '20px'}),
-            
-            dcc.Graph(id='partner-analytics-chart'),
-            dcc.Graph(id='partner-analytics-income-chart'),
-            
-            html.H4("Данные по партнерам"),
+                html.Label("Выберите период:"),
+                dcc.DatePickerRange(
+                    id='partner-analytics-date-picker', **PERSISTED,
+                    min_date_allowed=date(2020, 1, 1),
+                    max_date_allowed=date.today(),
+                    start_date=date.today() - timedelta(days=DEFAULT_PERIOD_DAYS),
+                    end_date=date.today(),
+                    display_format='DD.MM.YYYY'
+                ),
+            ], style={'display': 'inline-block', 'marginRight': '20px'}),
             html.Div([
-                html.Button("Экспорт в Excel", id="export-excel-button", n_clicks=0),
-            ], style={'marginBottom': '10px'}),
-            dash_table.DataTable(
-                id='partner-analytics-table',
-                sort_action="native",
-                export_format="xlsx",
-                export_headers="display",
-                filter_action="native",
-                style_table={'overflowX': 'auto'},
-                style_cell={'textAlign': 'left', 'minWidth': '150px', 'width': '150px', 'maxWidth': '150px'},
-                style_header={
-                    'backgroundColor': 'rgb(230, 230, 230)',
-                    'fontWeight': 'bold'
-                },
-                style_data_conditional=[
-                    {
-                        'if': {'row_index': 'odd'},
-                        'backgroundColor': 'rgb(248, 248, 248)'
-                    }
-                ],
-            ),
-            dcc.Download(id="download-excel")
-        ]),
+                dcc.Checklist(
+                    id='exclude-common-source-checklist', **PERSISTED,
+                    options=[{'label': 'Не учитывать "Общий источник"', 'value': 'exclude'}],
+                    value=['exclude'] # По умолчанию включен
+                ),
+            ], style={'display': 'inline-block', 'verticalAlign': 'top', 'marginTop': '25px', 'marginRight': '20px'}),
+            html.Div([
+                dcc.Checklist(
+                    id='show-income-checklist', **PERSISTED,
+                    options=[{'label': 'Выводить график дохода и поле "Доход" в таблице', 'value': 'show'}],
+                    value=[] # По умолчанию выключен
+                ),
+            ], style={'display': 'inline-block', 'verticalAlign': 'top', 'marginTop': '25px'}),
+        ], style={'marginTop': '20px', 'marginBottom': '20px'}),
         
-        # Вкладка 6: Помесячные продажи
-        dcc.Tab(label='Помесячные продажи', value='tab-monthly-sales', children=[
+        running_indicator('partner-analytics-running'),
+        dcc.Graph(id='partner-analytics-chart'), shape_store('partner-analytics-chart'),
+        dcc.Graph(id='partner-analytics-income-chart'), shape_store('partner-analytics-income-chart'),
+        
+        html.H4("Данные по партнерам"),
+        html.Div([
+            html.Button("Экспорт в Excel", id="export-excel-button", n_clicks=0),
+        ], style={'marginBottom': '10px'}),
+        dash_table.DataTable(
+            id='partner-analytics-table',
+            **SERVER_SIDE_TABLE,
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left', 'minWidth': '150px', 'width': '150px', 'maxWidth': '150px'},
+            style_header={
+                'backgroundColor': 'rgb(230, 230, 230)',
+                'fontWeight': 'bold'
+            },
+            style_data_conditional=[
+                {
+                    'if': {'row_index': 'odd'},
+                    'backgroundColor': 'rgb(248, 248, 248)'
+                }
+            ],
+        ),
+        dcc.Download(id="download-excel")
+    ])
+
+
+def build_monthly_sales_tab(categories):
+    """
+    Вкладка 6: Помесячные продажи.
+    """
+    return html.Div([
+        html.Div([
+            html.Div([
+                html.Label("Выберите период:"),
+                dcc.DatePickerRange(
+                    id='monthly-sales-date-picker', **PERSISTED,
+                    min_date_allowed=date(2020, 1, 1),
+                    max_date_allowed=date.today(),
+                    start_date=date.today() - timedelta(days=DEFAULT_MONTHLY_PERIOD_DAYS),
+                    end_date=date.today(),
+                    display_format='DD.MM.YYYY'
+                ),
+            ], style={'display': 'inline-block', 'marginRight': '20px', 'verticalAlign': 'top'}),
+            html.Div([
+                html.Label("Выберите категорию:"),
+                dcc.Dropdown(
+                    id='monthly-sales-category-dropdown', **PERSISTED, options=categories,
+                    multi=True,
+                    placeholder="Все категории"
+                ),
+            ], style={'display': 'inline-block', 'width': '30%', 'marginRight': '2%', 'verticalAlign': 'top'}),
             html.Div([
-                html.Div([
-                    html.Label("Выберите период:"),
-                    dcc.DatePickerRange(
-                        id='monthly-sales-date-picker',
-                        min_date_allowed=date(2020, 1, 1),
-                        max_date_allowed=date.today(),
-                        start_date=date.today() - timedelta(days=365),
-                        end_date=date.today(),
-                        display_format='DD.MM.YYYY'
-                    ),
-                ], style={'display': 'inline-block', 'marginRight': '20px', 'verticalAlign': 'top'}),
-                html.Div([
-                    html.Label("Выберите категорию:"),
-                    dcc.Dropdown(
-                        id='monthly-sales-category-dropdown',
-                        multi=True,
-                        placeholder="Все категории"
-                    ),
-                ], style={'display': 'inline-block', 'width': '30%', 'marginRight': '2%', 'verticalAlign': 'top'}),
-                html.Div([
-                    html.Label("Выберите продукт(ы):"),
-                    dcc.Dropdown(
-                        id='monthly-sales-product-dropdown',
-                        multi=True,
-                        placeholder="Все продукты"
-                    ),
-                ], style={'display': 'inline-block', 'width': '30%', 'verticalAlign': 'top'}),
-            ], style={'marginTop': '20px', 'marginBottom': '20px', 'display': 'flex', 'flexWrap': 'wrap'}),
+                html.Label("Выберите продукт(ы):"),
+                dcc.Dropdown(
+                    id='monthly-sales-product-dropdown', **PERSISTED,
+                    multi=True,
+                    placeholder="Все продукты"
+                ),
+            ], style={'display': 'inline-block', 'width': '30%', 'verticalAlign': 'top'}),
+        ], style={'marginTop': '20px', 'marginBottom': '20px', 'display': 'flex', 'flexWrap': 'wrap'}),
 
+        html.Div([
+             html.Div([
+                html.Label("Исключить категорию:"),
+                dcc.Dropdown(
+                    id='monthly-sales-exclude-category-dropdown', **PERSISTED, options=categories,
+                    multi=True,
+                    placeholder="Выберите для исключения"
+                ),
+            ], style={'display': 'inline-block', 'width': '30%', 'marginRight': '2%', 'verticalAlign': 'top'}),
             html.Div([
-                 html.Div([
-                    html.Label("Исключить категорию:"),
-                    dcc.Dropdown(
-                        id='monthly-sales-exclude-category-dropdown',
-                        multi=True,
-                        placeholder="Выберите для исключения"
-                    ),
-                ], style={'display': 'inline-block', 'width': '30%', 'marginRight': '2%', 'verticalAlign': 'top'}),
-                html.Div([
-                    html.Label("Исключить продукт(ы):"),
-                    dcc.Dropdown(
-                        id='monthly-sales-exclude-product-dropdown',
-                        multi=True,
-                        placeholder="Выберите для исключения"
-                    ),
-                ], style={'display': 'inline-block', 'width': '30%', 'verticalAlign': 'top'}),
-            ], style={'marginTop': '10px', 'marginBottom': '20px', 'display': 'flex', 'flexWrap': 'wrap'}),
-            
-            dcc.Graph(id='monthly-sales-graph'),
-            
-            html.H4("Данные по месяцам"),
-            dash_table.DataTable(
-                id='monthly-sales-table',
-                sort_action="native",
-                filter_action="native",
-                style_table={'overflowX': 'auto'},
-                style_cell={'textAlign': 'left', 'minWidth': '150px', 'width': '150px', 'maxWidth': '150px'},
-                style_header={
-                    'backgroundColor': 'rgb(230, 230, 230)',
-                    'fontWeight': 'bold'
-                },
-                style_data_conditional=[
-                    {
-                        'if': {'row_index': 'odd'},
-                        'backgroundColor': 'rgb(248, 248, 248)'
-                    }
-                ],
-            ),
-            html.Div(id='monthly-sales-summary', style={
-                'marginTop': '20px',
-                'padding': '10px',
-                'border': '1px solid #ddd',
-                'borderRadius': '5px',
-                'backgroundColor': '#f9f9f9'
-            }),
-
-            html.Hr(style={'marginTop': '30px', 'marginBottom': '30px'}),
-
-            html.H4("Продажи по продуктам за месяц"),
-            dcc.Graph(id='monthly-sales-by-product-graph'),
-
-            html.H4("Данные по продуктам за месяц"),
-            dash_table.DataTable(
-                id='monthly-sales-by-product-table',
-                sort_action="native",
-                filter_action="native",
-                style_table={'overflowX': 'auto'},
-                style_cell={'textAlign': 'left', 'minWidth': '150px', 'width': '150px', 'maxWidth': '150px'},
-                style_header={
-                    'backgroundColor': 'rgb(230, 230, 230)',
-                    'fontWeight': 'bold'
-                },
-                style_data_conditional=[
-                    {
-                        'if': {'row_index': 'odd'},
-                        'backgroundColor': 'rgb(248, 248, 248)'
-                    }
-                ],
-            ),
-            html.Div(id='monthly-sales-by-product-summary', style={
-                'marginTop': '20px',
-                'padding': '10px',
-                'border': '1px solid #ddd',
-                'borderRadius': '5px',
-                'backgroundColor': '#f9f9f9'
-            }),
-
-            html.Hr(style={'marginTop': '30px', 'marginBottom': '30px'}),
-
-            html.H4("Продажи по категориям за месяц"),
-            dcc.Graph(id='monthly-sales-by-category-graph'),
-
-            html.H4("Данные по категориям за месяц"),
-            dash_table.DataTable(
-                id='monthly-sales-by-category-table',
-                sort_action="native",
-                filter_action="native",
-                style_table={'overflowX': 'auto'},
-                style_cell={'textAlign': 'left', 'minWidth': '150px', 'width': '150px', 'maxWidth': '150px'},
-                style_header={
-                    'backgroundColor': 'rgb(230, 230, 230)',
-                    'fontWeight': 'bold'
-                },
-                style_data_conditional=[
-                    {
-                        'if': {'row_index': 'odd'},
-                        'backgroundColor': 'rgb(248, 248, 248)'
-                    }
-                ],
-            ),
-            html.Div(id='monthly-sales-by-category-summary', style={
-                'marginTop': '20px',
-                'padding': '10px',
-                'border': '1px solid #ddd',
-                'borderRadius': '5px',
-                'backgroundColor': '#f9f9f9'
-            })
-        ]),
+                html.Label("Исключить продукт(ы):"),
+                dcc.Dropdown(
+                    id='monthly-sales-exclude-product-dropdown', **PERSISTED,
+                    multi=True,
+                    placeholder="Выберите для исключения"
+                ),
+            ], style={'display': 'inline-block', 'width': '30%', 'verticalAlign': 'top'}),
+        ], style={'marginTop': '10px', 'marginBottom': '20px', 'display': 'flex', 'flexWrap': 'wrap'}),
+        
+        running_indicator('monthly-sales-running'),
+        dcc.Graph(id='monthly-sales-graph'), shape_store('monthly-sales-graph'),
+        
+        html.H4("Данные по месяцам"),
+        dash_table.DataTable(
+            id='monthly-sales-table',
+            sort_action="native",
+            filter_action="native",
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left', 'minWidth': '150px', 'width': '150px', 'maxWidth': '150px'},
+            style_header={
+                'backgroundColor': 'rgb(230, 230, 230)',
+                'fontWeight': 'bold'
+            },
+            style_data_conditional=[
+                {
+                    'if': {'row_index': 'odd'},
+                    'backgroundColor': 'rgb(248, 248, 248)'
+                }
+            ],
+        ),
+        html.Div(id='monthly-sales-summary', style={
+            'marginTop': '20px',
+            'padding': '10px',
+            'border': '1px solid #ddd',
+            'borderRadius': '5px',
+            'backgroundColor': '#f9f9f9'
+        }),
+
+        html.Hr(style={'marginTop': '30px', 'marginBottom': '30px'}),
+
+        html.H4("Продажи по продуктам за месяц"),
+        dcc.Graph(id='monthly-sales-by-product-graph'), shape_store('monthly-sales-by-product-graph'),
+
+        html.H4("Данные по продуктам за месяц"),
+        dash_table.DataTable(
+            id='monthly-sales-by-product-table',
+            **SERVER_SIDE_TABLE,
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left', 'minWidth': '150px', 'width': '150px', 'maxWidth': '150px'},
+            style_header={
+                'backgroundColor': 'rgb(230, 230, 230)',
+                'fontWeight': 'bold'
+            },
+            style_data_conditional=[
+                {
+                    'if': {'row_index': 'odd'},
+                    'backgroundColor': 'rgb(248, 248, 248)'
+                }
+            ],
+        ),
+        html.Div(id='monthly-sales-by-product-summary', style={
+            'marginTop': '20px',
+            'padding': '10px',
+            'border': '1px solid #ddd',
+            'borderRadius': '5px',
+            'backgroundColor': '#f9f9f9'
+        }),
+
+        html.Hr(style={'marginTop': '30px', 'marginBottom': '30px'}),
+
+        html.H4("Продажи по категориям за месяц"),
+        html.Div([
+            html.Label("Уровень категорий:"),
+            category_level_dropdown('monthly-sales-category-level-dropdown'),
+        ], style={'width': '20%', 'marginBottom': '10px'}),
+        dcc.Graph(id='monthly-sales-by-category-graph'), shape_store('monthly-sales-by-category-graph'),
+
+        html.H4("Данные по категориям за месяц"),
+        dash_table.DataTable(
+            id='monthly-sales-by-category-table',
+            sort_action="native",
+            filter_action="native",
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left', 'minWidth': '150px', 'width': '150px', 'maxWidth': '150px'},
+            style_header={
+                'backgroundColor': 'rgb(230, 230, 230)',
+                'fontWeight': 'bold'
+            },
+            style_data_conditional=[
+                {
+                    'if': {'row_index': 'odd'},
+                    'backgroundColor': 'rgb(248, 248, 248)'
+                }
+            ],
+        ),
+        html.Div(id='monthly-sales-by-category-summary', style={
+            'marginTop': '20px',
+            'padding': '10px',
+            'border': '1px solid #ddd',
+            'borderRadius': '5px',
+            'backgroundColor': '#f9f9f9'
+        })
+    ])
+
+
+# Построители содержимого вкладок: вкладка создается только при ее открытии
+TAB_BUILDERS = {
+    'tab-general': build_general_tab,
+    'tab-product': build_product_tab,
+    'tab-period-sales': build_period_sales_tab,
+    'tab-category-revenue': build_category_revenue_tab,
+    'tab-partner-analytics': build_partner_analytics_tab,
+    'tab-monthly-sales': build_monthly_sales_tab,
+}
+
+# Определяем layout приложения
+layout = html.Div([
+    html.Div([
+        html.H1("Аналитический дашборд", style={'display': 'inline-block', 'marginRight': '20px'}),
+        html.A(html.Button("Вернуться на главный экран"), href='/', style={'display': 'inline-block', 'verticalAlign': 'top', 'marginTop': '20px'}),
+    ]),
+    
+    dcc.Tabs(id="tabs-main", value='tab-general', children=[
+        dcc.Tab(label='Общая динамика', value='tab-general'),
+        dcc.Tab(label='Отчет по продуктам', value='tab-product'),
+        dcc.Tab(label='Период и продажи', value='tab-period-sales'),
+        dcc.Tab(label='Анализ дохода по категориям', value='tab-category-revenue'),
+        dcc.Tab(label='Аналитика по партнерам', value='tab-partner-analytics'),
+        dcc.Tab(label='Помесячные продажи', value='tab-monthly-sales'),
     ]),
-    dcc.Store(id='max-date-store') # Хранилище для максимальной даты
+    # Содержимое активной вкладки (см. TAB_BUILDERS)
+    html.Div(id='tab-content'),
+    dcc.Store(id='categories-store'), # Список категорий, загружается один раз при открытии дашборда
+    dcc.Store(id='max-date-store'), # Хранилище для максимальной даты
+    dcc.Store(id='session-id', storage_type='session') # Id сессии вкладки браузера для отмены устаревших запросов
 ])
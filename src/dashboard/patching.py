@@ -0,0 +1,101 @@
+"""
+Частичное обновление графиков и таблиц дашборда (dash.Patch).
+
+При смене фильтров обычно меняются только данные: оформление, оси и
+подписи графика остаются прежними. Вместо полной фигуры в браузер
+отправляется Patch с массивами трасс и заголовком.
+
+Чтобы знать, какая фигура сейчас отображается, рядом с графиком хранится
+"форма" фигуры (dcc.Store с id '<id графика>-shape'): типы трасс и их оси.
+Если форма совпадает с новой фигурой, отправляется Patch, иначе — полная
+фигура и новая форма. Пустые фигуры-заглушки формы не имеют и всегда
+отправляются целиком.
+"""
+from dash import Patch, ctx, dcc, no_update
+
+# Свойства трасс, которые зависят от данных и передаются в Patch
+PATCHED_TRACE_KEYS = (
+    'x', 'y', 'text', 'name', 'labels', 'values',
+    'hovertemplate', 'customdata', 'legendgroup', 'offsetgroup',
+)
+
+
+def shape_store(graph_id):
+    """
+    Возвращает хранилище формы фигуры для графика graph_id.
+    """
+    return dcc.Store(id=f'{graph_id}-shape')
+
+
+def _figure_dict(figure):
+    if hasattr(figure, 'to_plotly_json'):
+        return figure.to_plotly_json()
+    return figure
+
+
+def figure_shape(figure):
+    """
+    Возвращает форму фигуры: типы трасс и их оси. Для фигур без трасс
+    (заглушек с текстом) возвращает None.
+    """
+    data = _figure_dict(figure).get('data') or []
+    if not data:
+        return None
+    return '|'.join(
+        f"{trace.get('type', 'scatter')}:{trace.get('xaxis', 'x')}:{trace.get('yaxis', 'y')}"
+        for trace in data
+    )
+
+
+def patch_figure(figure, client_shape):
+    """
+    Готовит обновление графика.
+
+    Args:
+        figure: Новая фигура (go.Figure или dict).
+        client_shape (str): Форма фигуры, которая сейчас отображается в браузере.
+
+    Returns:
+        tuple: (фигура или Patch, новая форма или no_update).
+    """
+    shape = figure_shape(figure)
+    if shape is None or shape != client_shape:
+        return figure, shape
+
+    figure = _figure_dict(figure)
+    patch = Patch()
+    for index, trace in enumerate(figure['data']):
+        for key in PATCHED_TRACE_KEYS:
+            if key in trace:
+                patch['data'][index][key] = trace[key]
+
+    layout = figure.get('layout', {})
+    title = (layout.get('title') or {}).get('text')
+    if title is not None:
+        patch['layout']['title']['text'] = title
+    for axis in ('xaxis', 'yaxis'):
+        axis_range = (layout.get(axis) or {}).get('range')
+        if axis_range is not None:
+            patch['layout'][axis]['range'] = list(axis_range)
+            patch['layout'][axis]['autorange'] = False
+        else:
+            patch['layout'][axis]['autorange'] = True
+    return patch, no_update
+
+
+def is_patch(value):
+    """
+    Возвращает True, если обновление графика отправляется как Patch.
+    """
+    return isinstance(value, Patch)
+
+
+def table_columns_update(columns, table_id):
+    """
+    Возвращает столбцы таблицы или no_update, если callback вызван
+    переключением страницы, сортировкой или фильтром самой таблицы:
+    в этом случае набор столбцов не меняется.
+    """
+    if ctx.triggered_id == table_id:
+        return no_update
+    return columns
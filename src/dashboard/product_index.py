@@ -0,0 +1,130 @@
+"""
+Поиск продуктов для выпадающих списков дашборда (поиск по мере ввода).
+
+Раньше в списки отправлялись все продукты из заказов, что при большом
+каталоге делало ответы тяжелыми. Теперь каталог загружается один раз в
+индекс в памяти процесса, а список получает только лучшие совпадения для
+введенного текста (не более DASHBOARD_PRODUCT_SEARCH_LIMIT):
+сначала названия, начинающиеся с запроса, затем названия, в которых
+с запроса начинается одно из слов, затем остальные вхождения подстроки.
+
+Индекс перестраивается при смене поколения данных (импорт заказов,
+изменение каталога продуктов или категорий).
+"""
+import bisect
+import os
+import threading
+
+from src.analytics.generation import get_generation
+from .queries import get_product_catalog
+
+# Максимальное число продуктов в выпадающем списке на один запрос поиска
+PRODUCT_SEARCH_LIMIT = int(os.getenv("DASHBOARD_PRODUCT_SEARCH_LIMIT", "50"))
+
+
+def _word_starts(text):
+    """Возвращает позиции начала слов в строке."""
+    return [i for i, char in enumerate(text) if char.isalnum() and (i == 0 or not text[i - 1].isalnum())]
+
+
+class ProductIndex:
+    """
+    Индекс названий продуктов для поиска по префиксу слова и подстроке.
+
+    Args:
+        rows: Пары (название продукта, id категории или None).
+    """
+
+    def __init__(self, rows):
+        self._categories = {}
+        for name, category_id in rows:
+            category_ids = self._categories.setdefault(name, set())
+            if category_id is not None and category_id == category_id:  # NaN из DataFrame
+                category_ids.add(int(category_id))
+
+        self.names = sorted(self._categories)
+        self._lower = {name: name.lower() for name in self.names}
+
+        # Отсортированные окончания названий, начиная с каждого слова:
+        # префиксный поиск выполняется двоичным поиском
+        suffixes = sorted(
+            (lower[start:], name)
+            for name, lower in self._lower.items()
+            for start in _word_starts(lower) or [0]
+        )
+        self._suffix_keys = [key for key, _ in suffixes]
+        self._suffix_names = [name for _, name in suffixes]
+
+    def __len__(self):
+        return len(self.names)
+
+    def _in_categories(self, name, category_ids):
+        return not category_ids or not self._categories[name].isdisjoint(category_ids)
+
+    def search(self, query, category_ids=None, limit=PRODUCT_SEARCH_LIMIT):
+        """
+        Возвращает до limit названий продуктов, подходящих под запрос.
+
+        Args:
+            query (str): Введенный текст (без учета регистра). Пустой запрос
+                возвращает первые продукты по алфавиту.
+            category_ids: id категории или список id; если задан, ищутся
+                только продукты из этих категорий.
+            limit (int): Максимальное число результатов.
+        """
+        if isinstance(category_ids, int):
+            category_ids = [category_ids]
+        category_ids = set(category_ids or [])
+        text = (query or '').strip().lower()
+
+        if not text:
+            matches = (name for name in self.names if self._in_categories(name, category_ids))
+            return [name for _, name in zip(range(limit), matches)]
+
+        name_prefix, word_prefix = set(), set()
+        position = bisect.bisect_left(self._suffix_keys, text)
+        while position < len(self._suffix_keys) and self._suffix_keys[position].startswith(text):
+            name = self._suffix_names[position]
+            if self._in_categories(name, category_ids):
+                (name_prefix if self._lower[name].startswith(text) else word_prefix).add(name)
+            position += 1
+
+        results = sorted(name_prefix) + sorted(word_prefix - name_prefix)
+        if len(results) < limit:
+            found = set(results)
+            results += [
+                name for name in self.names
+                if name not in found and text in self._lower[name] and self._in_categories(name, category_ids)
+            ]
+        return results[:limit]
+
+
+_index = None
+_index_generation = None
+_index_lock = threading.Lock()
+
+
+def get_product_index():
+    """
+    Возвращает индекс продуктов, перестраивая его при смене поколения данных.
+    """
+    global _index, _index_generation
+    generation = get_generation()
+    with _index_lock:
+        if _index is None or _index_generation != generation:
+            catalog = get_product_catalog()
+            _index = ProductIndex(zip(catalog['product'], catalog['category_id']))
+            _index_generation = generation
+        return _index
+
+
+def product_options(search_value, category_ids=None, selected=None):
+    """
+    Возвращает опции выпадающего списка продуктов для введенного текста.
+    Уже выбранные продукты всегда остаются в опциях, иначе список их не покажет.
+    """
+    names = get_product_index().search(search_value, category_ids)
+    if isinstance(selected, str):
+        selected = [selected]
+    names += [name for name in (selected or []) if name not in names]
+    return [{'label': name, 'value': name} for name in names]
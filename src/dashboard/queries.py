@@ -1,11 +1,70 @@
 """
 Функции для выполнения SQL-запросов к базе данных для дашборда.
 """
-import pandas as pd
-from sqlalchemy import func, case
+from sqlalchemy import func, case, select
 from src.analytics.models import SessionLocal, Order
-from src.product_grouping.models import Product, ProductCategory, product_category_association
+from src.analytics import mirror
+from src.product_grouping.models import Product, ProductCategory, category_closure, product_category_association
+from src.product_grouping.hierarchy import category_tree, rollup_categories, subtree_ids
+from src.partner_analytics import queries as partner_queries
+from .frames import read_frame
+from .tables import DEFAULT_PAGE_SIZE, build_table_statements, paginate, page_count
+from .cache import cached_query
+from .cancellation import interruptible, raise_if_cancelled
+
+# Отступ дочерней категории в выпадающих списках (неразрывные пробелы)
+CATEGORY_INDENT = '\u00a0' * 4
+
+def _read_frame(query, db):
+    """
+    Выполняет запрос (Query или SELECT) и возвращает результат в виде DataFrame.
+    Если включено аналитическое зеркало, запрос выполняется в DuckDB.
+    Запрос прерывается (QueryCancelled), если вызвавший его callback
+    вытеснен более новым вызовом (см. cancellation.py).
+    """
+    statement = getattr(query, 'statement', query)
+    if mirror.is_mirror_enabled():
+        raise_if_cancelled()
+        return mirror.read_frame(statement)
+    with interruptible(db):
+        return read_frame(db, statement)
+
+def _read_page(statement, db, page_current, page_size, sort_by, filter_query, default_sort=None, totals=None):
+    """
+    Возвращает одну страницу результата запроса для серверной таблицы.
+
+    Returns:
+        tuple: (DataFrame со строками страницы, общее число строк после фильтрации,
+        словарь итоговых сумм по столбцам totals или None).
+    """
+    rows_statement, count_statement, totals_statement = build_table_statements(
+        statement, sort_by, filter_query, default_sort, totals
+    )
+    total_rows = int(_read_frame(count_statement, db).iloc[0, 0])
+
+    if page_size:
+        # Если после смены фильтров текущая страница стала лишней, показываем последнюю
+        page_current = min(page_current or 0, page_count(total_rows, page_size) - 1)
+        rows_statement = paginate(rows_statement, page_current, page_size)
+    df = _read_frame(rows_statement, db)
+
+    totals_row = None
+    if totals_statement is not None:
+        totals_row = _read_frame(totals_statement, db).astype(object).iloc[0].to_dict()
+    return df, total_rows, totals_row
+
+def _in_categories(category_ids):
+    """
+    Условие «заказ продукта из категорий category_ids или их потомков».
+    Полузапрос вместо соединения: заказ продукта из нескольких подходящих
+    категорий учитывается один раз.
+    """
+    products = select(Product.name)\
+        .join(product_category_association, Product.id == product_category_association.c.product_id)\
+        .where(product_category_association.c.category_id.in_(subtree_ids(category_ids)))
+    return Order.content.in_(products)
 
+@cached_query
 def get_sales_by_day(start_date, end_date, category_id=None):
     """
     Возвращает суммарный доход по дням за указанный период.
@@ -19,24 +78,27 @@ def get_sales_by_day(start_date, end_date, category_id=None):
         ).filter(Order.creation_date.between(start_date, end_date))
 
         if category_id:
-            # Присоединяем продукты и их категории для фильтрации
-            query = query.join(Product, Order.content == Product.name)\
-                         .join(product_category_association)\
-                         .filter(product_category_association.c.category_id == category_id)
+            # Категория вместе с дочерними
+            query = query.filter(_in_categories(category_id))
 
         query = query.group_by(func.date(Order.creation_date)).order_by(func.date(Order.creation_date))
         
-        df = pd.read_sql(query.statement, db.bind)
+        df = _read_frame(query, db)
         return df
     finally:
         db.close()
 
-def get_monthly_sales_by_category(start_date, end_date, category_ids=None, product_names=None, exclude_category_ids=None, exclude_product_names=None):
+@cached_query
+def get_monthly_sales_by_category(start_date, end_date, category_ids=None, product_names=None, exclude_category_ids=None, exclude_product_names=None,
+                                  level=None):
     """
     Возвращает суммарный доход по месяцам в разрезе категорий за указанный период.
+    Фильтры по категориям учитывают их дочерние категории; level сворачивает
+    категории к уровню дерева (0 — корневые, None — как назначены).
     """
     db = SessionLocal()
     try:
+        rollup = rollup_categories(level, category_ids, exclude_category_ids)
         query = db.query(
             func.strftime('%Y-%m', Order.creation_date).label('month'),
             ProductCategory.name.label('category'),
@@ -44,77 +106,88 @@ def get_monthly_sales_by_category(start_date, end_date, category_ids=None, produ
             func.count(Order.id).label('total_orders'),
             func.sum(case((Order.income > 0, 1), else_=0)).label('paid_orders')
         ).join(Product, Order.content == Product.name)\
-         .join(product_category_association)\
-         .join(ProductCategory)\
+         .join(rollup, rollup.c.product_id == Product.id)\
+         .join(ProductCategory, ProductCategory.id == rollup.c.category_id)\
          .filter(Order.income > 0)
 
         if start_date and end_date:
             query = query.filter(Order.creation_date.between(start_date, end_date))
 
-        if category_ids:
-            query = query.filter(ProductCategory.id.in_(category_ids))
-        
         if product_names:
             query = query.filter(Order.content.in_(product_names))
-        
-        if exclude_category_ids:
-            query = query.filter(ProductCategory.id.notin_(exclude_category_ids))
 
         if exclude_product_names:
             query = query.filter(Order.content.notin_(exclude_product_names))
 
         query = query.group_by('month', 'category').order_by('month', 'category')
         
-        df = pd.read_sql(query.statement, db.bind)
+        df = _read_frame(query, db)
         return df
     finally:
         db.close()
 
-def get_monthly_sales_by_product(start_date, end_date, category_ids=None, product_names=None, exclude_category_ids=None, exclude_product_names=None):
+def _monthly_sales_by_product_query(db, start_date, end_date, category_ids=None, product_names=None, exclude_category_ids=None, exclude_product_names=None):
     """
-    Возвращает суммарный доход по месяцам в разрезе продуктов за указанный период,
-    опционально фильтруя по категориям и продуктам.
+    Строит запрос дохода по месяцам в разрезе продуктов.
     """
-    db = SessionLocal()
-    try:
-        query = db.query(
-            func.strftime('%Y-%m', Order.creation_date).label('month'),
-            Order.content.label('product'),
-            func.sum(Order.income).label('total_sales'),
-            func.count(Order.id).label('total_orders'),
-            func.sum(case((Order.income > 0, 1), else_=0)).label('paid_orders')
-        ).filter(Order.income > 0)
+    query = db.query(
+        func.strftime('%Y-%m', Order.creation_date).label('month'),
+        Order.content.label('product'),
+        func.sum(Order.income).label('total_sales'),
+        func.count(Order.id).label('total_orders'),
+        func.sum(case((Order.income > 0, 1), else_=0)).label('paid_orders')
+    ).filter(Order.income > 0)
 
-        if start_date and end_date:
-            query = query.filter(Order.creation_date.between(start_date, end_date))
+    if start_date and end_date:
+        query = query.filter(Order.creation_date.between(start_date, end_date))
 
-        # Флаг, чтобы избежать повторного join
-        joined_product = False
-        if category_ids:
-            query = query.join(Product, Order.content == Product.name)\
-                         .join(product_category_association)\
-                         .filter(product_category_association.c.category_id.in_(category_ids))
-            joined_product = True
-        
-        if product_names:
-            query = query.filter(Order.content.in_(product_names))
+    # Категории учитываются вместе с дочерними
+    if category_ids:
+        query = query.filter(_in_categories(category_ids))
 
-        if exclude_category_ids:
-            if not joined_product:
-                query = query.join(Product, Order.content == Product.name)\
-                             .join(product_category_association)
-            query = query.filter(product_category_association.c.category_id.notin_(exclude_category_ids))
+    if product_names:
+        query = query.filter(Order.content.in_(product_names))
 
-        if exclude_product_names:
-            query = query.filter(Order.content.notin_(exclude_product_names))
+    if exclude_category_ids:
+        query = query.filter(~_in_categories(exclude_category_ids))
 
-        query = query.group_by('month', 'product').order_by('month', 'product')
-        
-        df = pd.read_sql(query.statement, db.bind)
+    if exclude_product_names:
+        query = query.filter(Order.content.notin_(exclude_product_names))
+
+    return query.group_by('month', 'product').order_by('month', 'product')
+
+@cached_query
+def get_monthly_sales_by_product(start_date, end_date, category_ids=None, product_names=None, exclude_category_ids=None, exclude_product_names=None):
+    """
+    Возвращает суммарный доход по месяцам в разрезе продуктов за указанный период,
+    опционально фильтруя по категориям и продуктам.
+    """
+    db = SessionLocal()
+    try:
+        query = _monthly_sales_by_product_query(db, start_date, end_date, category_ids, product_names, exclude_category_ids, exclude_product_names)
+        df = _read_frame(query, db)
         return df
     finally:
         db.close()
 
+@cached_query
+def get_monthly_sales_by_product_page(start_date, end_date, category_ids=None, product_names=None, exclude_category_ids=None, exclude_product_names=None,
+                                      page_current=0, page_size=DEFAULT_PAGE_SIZE, sort_by=None, filter_query=None):
+    """
+    Возвращает одну страницу таблицы продаж по месяцам в разрезе продуктов.
+    """
+    db = SessionLocal()
+    try:
+        query = _monthly_sales_by_product_query(db, start_date, end_date, category_ids, product_names, exclude_category_ids, exclude_product_names)
+        return _read_page(
+            query.statement, db, page_current, page_size, sort_by, filter_query,
+            default_sort=[{'column_id': 'month', 'direction': 'asc'}, {'column_id': 'product', 'direction': 'asc'}],
+            totals=['total_sales', 'paid_orders']
+        )
+    finally:
+        db.close()
+
+@cached_query
 def get_monthly_sales(start_date, end_date, category_ids=None, product_names=None, exclude_category_ids=None, exclude_product_names=None):
     """
     Возвращает суммарный доход по месяцам за указанный период,
@@ -132,66 +205,80 @@ def get_monthly_sales(start_date, end_date, category_ids=None, product_names=Non
         if start_date and end_date:
             query = query.filter(Order.creation_date.between(start_date, end_date))
 
-        # Флаг, чтобы избежать повторного join
-        joined_product = False
+        # Категории учитываются вместе с дочерними
         if category_ids:
-            query = query.join(Product, Order.content == Product.name)\
-                         .join(product_category_association)\
-                         .filter(product_category_association.c.category_id.in_(category_ids))
-            joined_product = True
-        
+            query = query.filter(_in_categories(category_ids))
+
         if product_names:
             query = query.filter(Order.content.in_(product_names))
 
         if exclude_category_ids:
-            if not joined_product:
-                query = query.join(Product, Order.content == Product.name)\
-                             .join(product_category_association)
-            query = query.filter(product_category_association.c.category_id.notin_(exclude_category_ids))
+            query = query.filter(~_in_categories(exclude_category_ids))
 
         if exclude_product_names:
             query = query.filter(Order.content.notin_(exclude_product_names))
 
         query = query.group_by('month').order_by('month')
         
-        df = pd.read_sql(query.statement, db.bind)
+        df = _read_frame(query, db)
         return df
     finally:
         db.close()
 
-def get_category_revenue_by_period(start_date, end_date, excluded_category_ids=None, included_category_ids=None):
+def _category_revenue_query(db, start_date, end_date, excluded_category_ids=None, included_category_ids=None, level=None):
+    """
+    Строит запрос дохода по категориям продуктов за период.
+    Включенные и исключенные категории учитываются вместе с дочерними;
+    level сворачивает категории к уровню дерева (см. rollup_categories).
+    """
+    rollup = rollup_categories(level, included_category_ids, excluded_category_ids)
+    query = db.query(
+        ProductCategory.name.label('category_name'),
+        func.sum(Order.income).label('total_revenue')
+    ).select_from(Order)\
+     .join(Product, Order.content == Product.name)\
+     .join(rollup, rollup.c.product_id == Product.id)\
+     .join(ProductCategory, ProductCategory.id == rollup.c.category_id)\
+     .filter(Order.income > 0)
+
+    if start_date and end_date:
+        query = query.filter(Order.creation_date.between(start_date, end_date))
+
+    return query.group_by(ProductCategory.name)\
+                .order_by(func.sum(Order.income).desc())
+
+@cached_query
+def get_category_revenue_by_period(start_date, end_date, excluded_category_ids=None, included_category_ids=None, level=None):
     """
     Возвращает доход по каждой категории продуктов за указанный период,
     исключая категории из списка excluded_category_ids.
     """
     db = SessionLocal()
     try:
-        query = db.query(
-            ProductCategory.name.label('category_name'),
-            func.sum(Order.income).label('total_revenue')
-        ).select_from(Order)\
-         .join(Product, Order.content == Product.name)\
-         .join(product_category_association, Product.id == product_category_association.c.product_id)\
-         .join(ProductCategory, ProductCategory.id == product_category_association.c.category_id)\
-         .filter(Order.income > 0)
-
-        if start_date and end_date:
-            query = query.filter(Order.creation_date.between(start_date, end_date))
-
-        if included_category_ids:
-            query = query.filter(ProductCategory.id.in_(included_category_ids))
-            
-        if excluded_category_ids:
-            query = query.filter(ProductCategory.id.notin_(excluded_category_ids))
-
-        query = query.group_by(ProductCategory.name)\
-                     .order_by(func.sum(Order.income).desc())
-
-        df = pd.read_sql(query.statement, db.bind)
+        query = _category_revenue_query(db, start_date, end_date, excluded_category_ids, included_category_ids, level)
+        df = _read_frame(query, db)
         return df
     finally:
         db.close()
 
+@cached_query
+def get_category_revenue_page(start_date, end_date, excluded_category_ids=None, included_category_ids=None,
+                              page_current=0, page_size=DEFAULT_PAGE_SIZE, sort_by=None, filter_query=None, level=None):
+    """
+    Возвращает одну страницу таблицы доходов по категориям.
+    """
+    db = SessionLocal()
+    try:
+        query = _category_revenue_query(db, start_date, end_date, excluded_category_ids, included_category_ids, level)
+        return _read_page(
+            query.statement, db, page_current, page_size, sort_by, filter_query,
+            default_sort=[{'column_id': 'total_revenue', 'direction': 'desc'}],
+            totals=['total_revenue']
+        )
+    finally:
+        db.close()
+
+@cached_query
 def get_product_summary(product_names, start_date, end_date, category_id=None):
     """
     Возвращает сводную информацию по продуктам.
@@ -210,9 +297,7 @@ def get_product_summary(product_names, start_date, end_date, category_id=None):
         ).filter(Order.creation_date.between(start_date, end_date))
 
         if category_id:
-            query = query.join(Product, Order.content == Product.name)\
-                         .join(product_category_association)\
-                         .filter(product_category_association.c.category_id == category_id)
+            query = query.filter(_in_categories(category_id))
         
         # Если указаны конкретные продукты, фильтруем по ним
         if product_names:
@@ -220,79 +305,63 @@ def get_product_summary(product_names, start_date, end_date, category_id=None):
 
         query = query.group_by(Order.content).order_by(Order.content)
         
-        df = pd.read_sql(query.statement, db.bind)
+        df = _read_frame(query, db)
         return df
     finally:
         db.close()
 
-def get_unique_products(category_id=None):
+@cached_query
+def get_product_catalog():
     """
-    Возвращает список уникальных продуктов, опционально фильтруя по категории.
-    category_id может быть одиночным значением или списком.
+    Возвращает каталог продуктов для поиска в выпадающих списках:
+    уникальные продукты из заказов и id их категорий вместе с предками
+    (по строке на пару продукт-категория; category_id пуст, если продукт
+    не в категории), поэтому поиск по категории находит и продукты дочерних.
     """
     db = SessionLocal()
     try:
-        query = db.query(Order.content).filter(Order.content.isnot(None))
-
-        if category_id:
-            query = query.join(Product, Order.content == Product.name)\
-                         .join(product_category_association)
-            
-            # Проверяем, является ли category_id списком и не пуст ли он
-            if isinstance(category_id, list) and category_id:
-                query = query.filter(product_category_association.c.category_id.in_(category_id))
-            # Проверяем, является ли category_id одиночным числом
-            elif isinstance(category_id, int):
-                query = query.filter(product_category_association.c.category_id == category_id)
-
-        products = query.distinct().order_by(Order.content).all()
-        return [product[0] for product in products]
+        query = db.query(
+            Order.content.label('product'),
+            category_closure.c.ancestor_id.label('category_id')
+        ).filter(Order.content.isnot(None))\
+         .outerjoin(Product, Order.content == Product.name)\
+         .outerjoin(product_category_association)\
+         .outerjoin(category_closure, category_closure.c.descendant_id == product_category_association.c.category_id)\
+         .distinct()
+        return _read_frame(query, db)
     finally:
         db.close()
 
+@cached_query
 def get_categories():
     """
-    Возвращает список всех категорий продуктов.
+    Возвращает список всех категорий продуктов в порядке обхода дерева.
+    Дочерние категории выделены отступом; поиск в списке идет по названию.
     """
     db = SessionLocal()
     try:
-        categories = db.query(ProductCategory).order_by(ProductCategory.name).all()
-        return [{"label": cat.name, "value": cat.id} for cat in categories]
+        return [
+            {"label": CATEGORY_INDENT * cat.level + cat.name, "value": cat.id, "search": cat.name}
+            for cat in category_tree(db)
+        ]
     finally:
         db.close()
 
+@cached_query
 def get_sales_by_product(product_names, start_date, end_date, category_id=None):
     """
-    Возвращает дневной и накопительный доход для указанных продуктов и периода,
-    а также максимальную дату создания заказа в этом периоде.
+    Возвращает дневной и накопительный доход для указанных продуктов и периода.
     """
     db = SessionLocal()
     try:
-        # --- Запрос для получения максимальной даты ---
-        max_date_query = db.query(func.max(Order.creation_date)).filter(
-            Order.creation_date.between(start_date, end_date)
-        )
-
         # --- Общий запрос для данных ---
         base_query = db.query(Order).filter(Order.creation_date.between(start_date, end_date))
 
-        # Применяем фильтры к обоим запросам
         if product_names:
             base_query = base_query.filter(Order.content.in_(product_names))
-            max_date_query = max_date_query.filter(Order.content.in_(product_names))
         
         if category_id:
-            join_clause = Product.__table__.join(
-                product_category_association,
-                Product.id == product_category_association.c.product_id
-            )
-            base_query = base_query.join(join_clause, Product.name == Order.content)\
-                                   .filter(product_category_association.c.category_id == category_id)
-            max_date_query = max_date_query.join(join_clause, Product.name == Order.content)\
-                                           .filter(product_category_association.c.category_id == category_id)
-
-        # Выполняем запрос на максимальную дату
-        max_creation_date = max_date_query.scalar()
+            base_query = base_query.filter(_in_categories(category_id))
 
         # --- Запрос для агрегации данных (как и раньше) ---
         daily_agg_subquery = base_query.with_entities(
@@ -316,37 +385,87 @@ def get_sales_by_product(product_names, start_date, end_date, category_id=None):
             .order_by(daily_agg_subquery.c.date)
         )
         
-        df = pd.read_sql(query.statement, db.bind)
-        
-        return df, max_creation_date
+        return _read_frame(query, db)
     finally:
         db.close()
 
+def _paid_products_summary_query(db, start_date, end_date, category_id=None):
+    """
+    Строит запрос сводки по продуктам с оплатами.
+    """
+    paid_orders_case = case((Order.income > 0, 1), else_=0)
+    
+    query = db.query(
+        Order.content.label('product'),
+        func.count(Order.id).label('total_orders'),
+        func.sum(paid_orders_case).label('paid_orders'),
+        func.sum(Order.income).label('total_income')
+    ).filter(Order.creation_date.between(start_date, end_date))
+
+    if category_id:
+        query = query.filter(_in_categories(category_id))
+
+    return query.group_by(Order.content)\
+                .having(func.sum(paid_orders_case) > 0)\
+                .order_by(Order.content)
+
+@cached_query
 def get_paid_products_summary(start_date, end_date, category_id=None):
     """
     Возвращает сводку по продуктам с оплатами, опционально фильтруя по категории.
     """
     db = SessionLocal()
     try:
-        paid_orders_case = case((Order.income > 0, 1), else_=0)
-        
-        query = db.query(
-            Order.content.label('product'),
-            func.count(Order.id).label('total_orders'),
-            func.sum(paid_orders_case).label('paid_orders'),
-            func.sum(Order.income).label('total_income')
-        ).filter(Order.creation_date.between(start_date, end_date))
+        query = _paid_products_summary_query(db, start_date, end_date, category_id)
+        df = _read_frame(query, db)
+        return df
+    finally:
+        db.close()
 
-        if category_id:
-            query = query.join(Product, Order.content == Product.name)\
-                         .join(product_category_association)\
-                         .filter(product_category_association.c.category_id == category_id)
+@cached_query
+def get_paid_products_summary_page(start_date, end_date, category_id=None,
+                                   page_current=0, page_size=DEFAULT_PAGE_SIZE, sort_by=None, filter_query=None):
+    """
+    Возвращает одну страницу сводки по продуктам с оплатами.
+    """
+    db = SessionLocal()
+    try:
+        query = _paid_products_summary_query(db, start_date, end_date, category_id)
+        return _read_page(
+            query.statement, db, page_current, page_size, sort_by, filter_query,
+            default_sort=[{'column_id': 'product', 'direction': 'asc'}],
+            totals=['paid_orders', 'total_income']
+        )
+    finally:
+        db.close()
 
-        query = query.group_by(Order.content)\
-                     .having(func.sum(paid_orders_case) > 0)\
-                     .order_by(Order.content)
-        
-        df = pd.read_sql(query.statement, db.bind)
-        return df
+@cached_query
+def get_partner_analytics_page(start_date, end_date, exclude_common=False,
+                               page_current=0, page_size=DEFAULT_PAGE_SIZE, sort_by=None, filter_query=None):
+    """
+    Возвращает одну страницу таблицы аналитики по партнерам.
+    page_size=None возвращает все строки с учетом фильтра и сортировки (для экспорта).
+    """
+    db = SessionLocal()
+    try:
+        statement = partner_queries.build_partner_analytics_query(start_date, end_date, exclude_common)
+        return _read_page(
+            statement, db, page_current, page_size, sort_by, filter_query,
+            default_sort=[{'column_id': 'total_income', 'direction': 'desc'}],
+            totals=['order_count', 'total_income']
+        )
+    finally:
+        db.close()
+
+@cached_query
+def get_partner_analytics(start_date, end_date, exclude_common=False):
+    """
+    Возвращает агрегированные данные по партнерам для графиков вкладки
+    "Аналитика по партнерам".
+    """
+    db = SessionLocal()
+    try:
+        statement = partner_queries.build_partner_analytics_query(start_date, end_date, exclude_common)
+        return _read_frame(statement, db)
     finally:
         db.close()
@@ -0,0 +1,146 @@
+"""
+Объединение одинаковых одновременных запросов дашборда (single-flight).
+
+Когда несколько пользователей одновременно открывают одну и ту же вкладку с
+одинаковыми фильтрами, каждый запрос запускал бы одну и ту же агрегацию.
+Здесь одновременные вызовы с одинаковым ключом ждут одного вычисления:
+- внутри процесса — через общий объект ожидания (threading.Event);
+- между воркерами на одном хосте — через файловую блокировку (fcntl):
+  воркер, дождавшийся блокировки, сначала проверяет общий кэш, куда
+  результат уже записал другой воркер.
+У каждого ключа своя блокировка — байт общего файла со смещением по хэшу
+ключа. Вычисление фигуры запрашивает внутри себя кэшированные запросы под
+другими ключами; общие для нескольких ключей блокировки приводили бы к
+взаимной блокировке (вложенный ключ ждет блокировку, которую держит
+внешний), а ключи фигур и запросов зависят друг от друга только в одну
+сторону, поэтому блокировки по ключам не образуют цикла.
+На платформах без fcntl объединение работает только внутри процесса.
+"""
+import copy
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Смещения блокировок ключей в файле: 60 бит хэша, в пределах off_t
+LOCK_OFFSET_BITS = 60
+
+
+class _Call:
+    """Вычисление, которое сейчас выполняется для одного ключа."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Выполняет не более одного вычисления для ключа одновременно.
+
+    Args:
+        lock_dir (str): Каталог для файлов межпроцессных блокировок.
+        incr: Функция incr(name) для подсчета событий
+            ('computed', 'coalesced_in_process', 'coalesced_across_processes').
+        retry_on (tuple): Типы ошибок вычисления, при которых ожидавшие вызовы
+            не получают ошибку, а повторяют вычисление сами (например, запрос
+            ведущего вызова прерван как устаревший).
+    """
+
+    def __init__(self, lock_dir, incr=None, retry_on=()):
+        self.lock_dir = lock_dir
+        self._incr = incr or (lambda name: None)
+        self._retry_on = tuple(retry_on)
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._lock_file = None
+        self._lock_file_pid = None
+
+    def _get_lock_file(self):
+        # Один открытый файл на процесс: закрытие любого дескриптора файла
+        # снимает все блокировки fcntl процесса на нем
+        with self._lock:
+            if self._lock_file is None or self._lock_file_pid != os.getpid():
+                os.makedirs(self.lock_dir, exist_ok=True)
+                self._lock_file = open(os.path.join(self.lock_dir, 'singleflight.lock'), 'a')
+                self._lock_file_pid = os.getpid()
+            return self._lock_file
+
+    @contextmanager
+    def _process_lock(self, key):
+        """
+        Межпроцессная блокировка для ключа (байт файла блокировок по хэшу ключа).
+        """
+        if fcntl is None:
+            yield
+            return
+
+        lock_file = self._get_lock_file()
+        offset = int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16) >> (160 - LOCK_OFFSET_BITS)
+        fcntl.lockf(lock_file, fcntl.LOCK_EX, 1, offset)
+        try:
+            yield
+        finally:
+            fcntl.lockf(lock_file, fcntl.LOCK_UN, 1, offset)
+
+    def do(self, key, compute, lookup, missing=None):
+        """
+        Возвращает результат для ключа, выполняя compute() не более одного раза
+        для всех одновременных вызовов.
+
+        Args:
+            key (str): Ключ вычисления.
+            compute: Функция без аргументов; должна сама сохранить результат
+                туда, где его найдет lookup().
+            lookup: Функция без аргументов, возвращающая сохраненный результат
+                или missing.
+            missing: Значение, которое lookup() возвращает при отсутствии результата.
+
+        Returns:
+            Результат вычисления. Ожидавшие вызовы получают собственную копию
+            из lookup(), чтобы изменение DataFrame одним вызовом не влияло на другие.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+
+            if leader:
+                break
+
+            call.event.wait()
+            if isinstance(call.error, self._retry_on):
+                continue  # Ведущий вызов прерван — вычисляем заново
+            self._incr('coalesced_in_process')
+            if call.error is not None:
+                raise call.error
+            value = lookup()
+            return copy.deepcopy(call.value) if value is missing else value
+
+        try:
+            with self._process_lock(key):
+                # Пока ждали блокировку, результат мог посчитать другой воркер
+                value = lookup()
+                if value is not missing:
+                    self._incr('coalesced_across_processes')
+                else:
+                    value = compute()
+                    self._incr('computed')
+            call.value = value
+            return value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            call.event.set()
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,153 @@
+"""
+Серверная пагинация, сортировка и фильтрация таблиц дашборда.
+
+Таблицы с page_action/sort_action/filter_action='custom' присылают в callback
+номер страницы, сортировку и строку фильтра. Здесь они переводятся в SQL:
+исходный агрегирующий запрос оборачивается в подзапрос, к которому
+применяются WHERE, ORDER BY и LIMIT/OFFSET. В браузер уходит только
+видимая страница.
+"""
+import math
+import re
+
+from sqlalchemy import String, cast, func, select
+
+# Размер страницы серверных таблиц по умолчанию
+DEFAULT_PAGE_SIZE = 50
+
+# Операторы из строки filter_query Dash DataTable -> внутреннее имя
+_OPERATORS = {
+    '=': 'eq', 'eq': 'eq', 's=': 'eq', 'i=': 'eq',
+    '!=': 'ne', 'ne': 'ne', 's!=': 'ne', 'i!=': 'ne',
+    '<': 'lt', 'lt': 'lt',
+    '<=': 'le', 'le': 'le',
+    '>': 'gt', 'gt': 'gt',
+    '>=': 'ge', 'ge': 'ge',
+    'contains': 'contains', 'scontains': 'contains', 'icontains': 'contains',
+    'datestartswith': 'startswith',
+    'is': 'is',
+}
+
+_FILTER_PART = re.compile(r'^\{(?P<column>[^}]+)\}\s+(?P<operator>\S+)\s*(?P<value>.*)$')
+
+
+def _parse_value(raw):
+    """
+    Разбирает значение из строки фильтра: строку в кавычках или число.
+    """
+    raw = raw.strip()
+    if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in ('"', "'", '`'):
+        return raw[1:-1].replace('\\' + raw[0], raw[0])
+    try:
+        return float(raw) if '.' in raw else int(raw)
+    except ValueError:
+        return raw
+
+
+def parse_filter_query(filter_query):
+    """
+    Разбирает строку filter_query Dash DataTable.
+
+    Returns:
+        list: Список кортежей (column_id, operator, value). Нераспознанные
+        части фильтра пропускаются.
+    """
+    conditions = []
+    if not filter_query:
+        return conditions
+
+    for part in filter_query.split(' && '):
+        match = _FILTER_PART.match(part.strip())
+        if not match:
+            continue
+        operator = _OPERATORS.get(match.group('operator'))
+        if operator is None:
+            continue
+        conditions.append((match.group('column'), operator, _parse_value(match.group('value'))))
+    return conditions
+
+
+def _condition(column, operator, value):
+    """
+    Строит SQL-условие для одного элемента фильтра.
+    """
+    if operator == 'is':
+        return column.is_(None) if value == 'blank' else None
+    if operator == 'contains':
+        return cast(column, String).contains(str(value), autoescape=True)
+    if operator == 'startswith':
+        return cast(column, String).startswith(str(value), autoescape=True)
+    if operator == 'eq':
+        return column == value
+    if operator == 'ne':
+        return column != value
+    if operator == 'lt':
+        return column < value
+    if operator == 'le':
+        return column <= value
+    if operator == 'gt':
+        return column > value
+    if operator == 'ge':
+        return column >= value
+    return None
+
+
+def build_table_statements(statement, sort_by=None, filter_query=None, default_sort=None, totals=None):
+    """
+    Строит запросы для серверной таблицы поверх исходного запроса.
+
+    Args:
+        statement: Исходный SELECT (query.statement или text(...).columns(...)).
+        sort_by (list): Сортировка в формате DataTable: [{'column_id': ..., 'direction': 'asc'}].
+        filter_query (str): Строка фильтра DataTable.
+        default_sort (list): Сортировка по умолчанию, если пользователь ее не задал.
+        totals (list): Столбцы, по которым нужно посчитать итоговые суммы.
+
+    Returns:
+        tuple: (rows_statement, count_statement, totals_statement). rows_statement
+        отфильтрован и отсортирован, но не ограничен страницей (см. paginate).
+        totals_statement равен None, если totals не заданы.
+    """
+    source = statement.subquery()
+    columns = source.c
+
+    conditions = []
+    for column_id, operator, value in parse_filter_query(filter_query):
+        if column_id not in columns:
+            continue
+        condition = _condition(columns[column_id], operator, value)
+        if condition is not None:
+            conditions.append(condition)
+
+    order_by = []
+    for item in (sort_by or default_sort or []):
+        column_id = item.get('column_id')
+        if column_id not in columns:
+            continue
+        column = columns[column_id]
+        order_by.append(column.desc() if item.get('direction') == 'desc' else column.asc())
+
+    rows_statement = select(source).where(*conditions).order_by(*order_by)
+    count_statement = select(func.count()).select_from(source).where(*conditions)
+
+    totals_statement = None
+    if totals:
+        totals_statement = select(
+            *[func.sum(columns[column_id]).label(column_id) for column_id in totals]
+        ).where(*conditions)
+
+    return rows_statement, count_statement, totals_statement
+
+
+def paginate(rows_statement, page_current, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Ограничивает запрос одной страницей (LIMIT/OFFSET).
+    """
+    return rows_statement.limit(page_size).offset(max(page_current or 0, 0) * page_size)
+
+
+def page_count(total_rows, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Возвращает количество страниц для таблицы (минимум одна).
+    """
+    return max(math.ceil(total_rows / page_size), 1)
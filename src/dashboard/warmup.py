@@ -0,0 +1,152 @@
+"""
+Прогрев кэша дашборда для представлений по умолчанию.
+
+Почти каждая сессия открывает дашборд с настройками по умолчанию: последние
+30 дней без категории и годовой период на вкладке "Помесячные продажи".
+Прогрев заранее выполняет эти запросы (и для N самых доходных категорий),
+строит фигуры и сохраняет результаты в общем кэше (см. cache.py). Первое
+обращение пользователя после импорта становится попаданием в кэш.
+
+Прогрев запускается в фоновом потоке при старте воркера и после каждого
+изменения поколения данных (импорт, изменение каталога). Если для текущего
+поколения и даты прогрев уже выполнен другим воркером, он пропускается.
+"""
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+from src.analytics.generation import on_generation_changed
+from .cache import cached_figure, get_cache, make_key
+from .layout import DEFAULT_MONTHLY_PERIOD_DAYS, DEFAULT_PERIOD_DAYS
+from .product_index import get_product_index
+from .tables import DEFAULT_PAGE_SIZE
+from . import queries
+
+# Включение прогрева ("0" — выключить)
+WARMUP_ENABLED = os.getenv("DASHBOARD_WARMUP", "1") != "0"
+
+# Число самых доходных категорий, для которых прогреваются представления
+WARMUP_TOP_CATEGORIES = int(os.getenv("DASHBOARD_WARMUP_TOP_CATEGORIES", "5"))
+
+# Параметры первой страницы серверных таблиц (как их присылает DataTable)
+_FIRST_PAGE = dict(page_current=0, page_size=DEFAULT_PAGE_SIZE, sort_by=[], filter_query='')
+
+_lock = threading.Lock()
+
+
+def _period(days):
+    """
+    Возвращает период по умолчанию так же, как его передают callback'и:
+    начало, конец и конец + 1 день (чтобы включить весь последний день).
+    """
+    today = date.today()
+    return (
+        (today - timedelta(days=days)).isoformat(),
+        today.isoformat(),
+        (today + timedelta(days=1)).isoformat(),
+    )
+
+
+def _top_categories(start_date, end_date_corrected, categories):
+    """
+    Возвращает id самых доходных категорий за период по умолчанию.
+    """
+    df = queries.get_category_revenue_by_period(start_date, end_date_corrected, None, None)
+    if df.empty:
+        return []
+    # Подпись дочерней категории содержит отступ, название хранится в 'search'
+    ids_by_name = {option['search']: option['value'] for option in categories}
+    top_names = df.sort_values('total_revenue', ascending=False)['category_name'].head(WARMUP_TOP_CATEGORIES)
+    return [ids_by_name[name] for name in top_names if name in ids_by_name]
+
+
+def warm_up():
+    """
+    Выполняет запросы и строит фигуры для представлений по умолчанию.
+    """
+    # Импорт здесь: callbacks импортирует модули дашборда, которые импортируют этот
+    from .callbacks import build_general_sales_figure, build_monthly_breakdown_figure, build_monthly_sales_figure
+
+    started = datetime.now()
+    start_date, end_date, end_date_corrected = _period(DEFAULT_PERIOD_DAYS)
+
+    categories = queries.get_categories()
+    top_categories = _top_categories(start_date, end_date_corrected, categories)
+
+    # "Общая динамика": без категории и по самым доходным категориям
+    for category_id in [None] + top_categories:
+        cached_figure(
+            'sales-by-day-chart', (start_date, end_date_corrected, category_id),
+            lambda: build_general_sales_figure(queries.get_sales_by_day(start_date, end_date_corrected, category_id))
+        )
+
+    # Индекс продуктов для поиска в выпадающих списках
+    get_product_index()
+
+    # "Отчет по продуктам": график и сводка по категориям
+    for category_id in top_categories:
+        queries.get_sales_by_product([], start_date, end_date_corrected, category_id)
+        queries.get_product_summary([], start_date, end_date_corrected, category_id)
+
+    # "Период и продажи", "Анализ дохода по категориям", "Аналитика по партнерам"
+    queries.get_paid_products_summary_page(start_date, end_date_corrected, None, **_FIRST_PAGE)
+    queries.get_category_revenue_page(start_date, end_date_corrected, None, None, **_FIRST_PAGE)
+    queries.get_partner_analytics(start_date, end_date, True)
+    queries.get_partner_analytics_page(start_date, end_date, True, **_FIRST_PAGE)
+
+    # "Помесячные продажи": годовой период без фильтров
+    monthly_start, _, monthly_end_corrected = _period(DEFAULT_MONTHLY_PERIOD_DAYS)
+    filters = (monthly_start, monthly_end_corrected, None, None, None, None)
+    df_monthly = queries.get_monthly_sales(*filters)
+    df_by_product = queries.get_monthly_sales_by_product(*filters)
+    df_by_category = queries.get_monthly_sales_by_category(*filters, level=None)
+    cached_figure('monthly-sales-graph', filters, lambda: build_monthly_sales_figure(df_monthly))
+    cached_figure(
+        'monthly-sales-by-product-graph', filters,
+        lambda: build_monthly_breakdown_figure(df_by_product, 'product', 'Продукт', 'Динамика продаж по продуктам')
+    )
+    # Ключ фигуры по категориям включает уровень свертки (по умолчанию — как назначены)
+    cached_figure(
+        'monthly-sales-by-category-graph', (*filters, None),
+        lambda: build_monthly_breakdown_figure(df_by_category, 'category', 'Категория', 'Динамика продаж по категориям')
+    )
+    queries.get_monthly_sales_by_product_page(*filters, **_FIRST_PAGE)
+
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"Кэш дашборда прогрет за {elapsed:.1f} с (категорий: {len(top_categories)}).")
+
+
+def _run():
+    if not _lock.acquire(blocking=False):
+        return  # Прогрев уже идет в этом процессе
+    try:
+        # Прогрев выполняется один раз на поколение данных и день
+        marker = make_key('warmup', date.today().isoformat())
+        cache = get_cache()
+        if cache.get(marker):
+            return
+        warm_up()
+        cache.set(marker, True)
+    except Exception as e:
+        print(f"Ошибка прогрева кэша дашборда: {e}")
+    finally:
+        _lock.release()
+
+
+def start_warmup():
+    """
+    Запускает прогрев в фоновом потоке, не блокируя воркер.
+    """
+    if not WARMUP_ENABLED:
+        return None
+    thread = threading.Thread(target=_run, name='dashboard-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def init_warmup():
+    """
+    Запускает прогрев при старте воркера и подписывает его на изменение данных.
+    """
+    on_generation_changed(lambda generation: start_warmup())
+    start_warmup()
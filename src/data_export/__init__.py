@@ -0,0 +1 @@
+# This file makes the data_export directory a Python package.
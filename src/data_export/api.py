@@ -0,0 +1,143 @@
+"""
+API для модуля выгрузки данных.
+"""
+import os
+from datetime import datetime
+
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context
+
+from src.analytics.generation import get_generation
+
+from . import archive_cache, columnar, core
+
+data_export_api = Blueprint('data_export_api', __name__)
+
+@data_export_api.route('/all', methods=['GET'])
+def export_all_tables():
+    """
+    Экспортирует все таблицы базы данных в zip-архив (по файлу на таблицу).
+    Архив отдается потоком по мере записи и сохраняется в кэш: пока данные
+    не изменились, повторные запросы получают готовый файл (с поддержкой
+    Range-запросов для докачки).
+
+    Параметры запроса:
+        format: 'xlsx' (по умолчанию) или 'csv'.
+        since: Отметка предыдущей выгрузки (заголовок X-Export-Watermark):
+            в архив попадают только заказы и контакты, созданные или
+            измененные после нее.
+
+    Новая отметка возвращается в заголовке X-Export-Watermark.
+    """
+    fmt = request.args.get('format', 'xlsx')
+    if fmt not in core.EXPORT_FORMATS:
+        return jsonify({"error": f"Неизвестный формат: {fmt}. Допустимые: {', '.join(core.EXPORT_FORMATS)}"}), 400
+    try:
+        since = _parse_watermark(request.args.get('since'))
+    except ValueError:
+        return jsonify({"error": "Неверная отметка since. Нужна дата и время в формате ISO 8601"}), 400
+
+    watermark = core.get_change_watermark()
+    if since is not None:
+        # Выгрузка изменений у каждого клиента своя и не кэшируется
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        stream = core.stream_export_archive(fmt, timestamp=timestamp, changes=(since, watermark))
+        return Response(
+            stream_with_context(stream),
+            mimetype="application/zip",
+            headers=_export_headers(core.export_filename(timestamp), watermark or since),
+        )
+
+    generation = get_generation()
+    cached_path = archive_cache.get_cached_archive(fmt, generation)
+    if cached_path is not None:
+        timestamp = datetime.fromtimestamp(os.path.getmtime(cached_path)).strftime('%Y%m%d_%H%M%S')
+        response = send_file(
+            cached_path,
+            mimetype="application/zip",
+            as_attachment=True,
+            download_name=core.export_filename(timestamp),
+            conditional=True,
+            etag=f"export-gen{generation}-{fmt}",
+        )
+        if watermark is not None:
+            response.headers["X-Export-Watermark"] = watermark.isoformat()
+        return response
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    stream = archive_cache.stream_and_cache(core.stream_export_archive(fmt, timestamp=timestamp), fmt, generation)
+    return Response(
+        stream_with_context(stream),
+        mimetype="application/zip",
+        headers=_export_headers(core.export_filename(timestamp), watermark),
+    )
+
+
+@data_export_api.route('/table/<table_name>', methods=['GET'])
+def export_table_columnar(table_name):
+    """
+    Выгружает одну таблицу в колоночном формате с сохранением типов.
+    Файл отдается потоком по мере чтения таблицы.
+
+    Параметры запроса:
+        format: 'parquet' (по умолчанию) или 'arrow' (Arrow IPC stream).
+        start_date, end_date: Период по дате создания (YYYY-MM-DD,
+            включительно) для таблиц со столбцом creation_date, например orders.
+        since: Отметка предыдущей выгрузки: только строки, созданные или
+            измененные после нее (orders, contacts).
+
+    Для таблиц с отслеживанием изменений новая отметка возвращается
+    в заголовке X-Export-Watermark.
+    """
+    fmt = request.args.get('format', 'parquet')
+    try:
+        start_date = _parse_date(request.args.get('start_date'))
+        end_date = _parse_date(request.args.get('end_date'))
+    except ValueError:
+        return jsonify({"error": "Неверный формат даты. Нужен YYYY-MM-DD"}), 400
+    try:
+        since = _parse_watermark(request.args.get('since'))
+    except ValueError:
+        return jsonify({"error": "Неверная отметка since. Нужна дата и время в формате ISO 8601"}), 400
+
+    watermark = core.get_change_watermark([table_name]) if table_name in core.get_export_tables() else None
+    changes = (since, watermark) if since is not None else None
+    try:
+        stream = columnar.stream_table(table_name, fmt, start_date=start_date, end_date=end_date, changes=changes)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return Response(
+        stream_with_context(stream),
+        mimetype=columnar.COLUMNAR_FORMATS[fmt][0],
+        headers=_export_headers(columnar.export_filename(table_name, fmt, timestamp), watermark or since),
+    )
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def _parse_watermark(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _export_headers(filename, watermark):
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if watermark is not None:
+        headers["X-Export-Watermark"] = watermark.isoformat()
+    return headers
+
+
+@data_export_api.route('/report', methods=['GET'])
+def export_report():
+    """
+    Возвращает отчет о последней полной выгрузке: время построения файлов
+    и записи в архив по каждой таблице.
+    """
+    report = core.get_last_export_report()
+    if report is None:
+        return jsonify({"error": "Выгрузка еще не выполнялась"}), 404
+    return jsonify(report)
@@ -0,0 +1,115 @@
+"""
+Дисковый кэш архивов полной выгрузки.
+
+Архив зависит только от данных, поэтому ключ кэша — поколение данных
+(src.analytics.generation) и формат файлов. Первый запрос после изменения
+данных строит архив потоком и одновременно записывает его в файл; если
+архив отдан полностью и данные за это время не менялись, файл становится
+кэшем. Повторные запросы получают готовый файл через send_file: с ETag,
+304 Not Modified и Range-запросами для докачки.
+
+Архивы прежних поколений удаляются сразу, остальные — начиная со старых,
+пока общий размер превышает EXPORT_CACHE_SIZE.
+"""
+import os
+import threading
+
+from src.analytics.generation import get_generation
+
+from . import core
+
+# Максимальный общий размер кэшированных архивов, байт (0 — кэш отключен)
+EXPORT_CACHE_SIZE = int(os.getenv("EXPORT_CACHE_SIZE", str(2 * 1024 ** 3)))
+
+ARCHIVE_PREFIX = 'analytics_export_gen'
+
+
+def _cache_dir():
+    return os.path.join(core.EXPORT_DIR, 'archives')
+
+
+def archive_path(generation, fmt):
+    """Путь к архиву поколения данных generation в формате fmt."""
+    return os.path.join(_cache_dir(), f"{ARCHIVE_PREFIX}{generation}_{fmt}.zip")
+
+
+def get_cached_archive(fmt, generation=None):
+    """
+    Возвращает путь к готовому архиву текущего поколения данных или None.
+    """
+    if EXPORT_CACHE_SIZE <= 0:
+        return None
+    generation = get_generation() if generation is None else generation
+    path = archive_path(generation, fmt)
+    return path if os.path.exists(path) else None
+
+
+def _archive_generation(filename):
+    try:
+        return int(filename[len(ARCHIVE_PREFIX):].split('_', 1)[0])
+    except ValueError:
+        return None
+
+
+def prune_archives(max_bytes=None, generation=None):
+    """
+    Удаляет архивы прежних поколений и самые старые архивы сверх max_bytes.
+    """
+    max_bytes = EXPORT_CACHE_SIZE if max_bytes is None else max_bytes
+    generation = get_generation() if generation is None else generation
+    try:
+        filenames = [f for f in os.listdir(_cache_dir()) if f.startswith(ARCHIVE_PREFIX) and f.endswith('.zip')]
+    except FileNotFoundError:
+        return
+
+    archives = []
+    for filename in filenames:
+        path = os.path.join(_cache_dir(), filename)
+        try:
+            if _archive_generation(filename) != generation:
+                os.remove(path)
+            else:
+                stat = os.stat(path)
+                archives.append((stat.st_mtime, stat.st_size, path))
+        except OSError:
+            continue  # Файл уже удалил другой воркер
+
+    total = 0
+    for _, size, path in sorted(archives, reverse=True):
+        total += size
+        if total > max_bytes:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def stream_and_cache(stream, fmt, generation):
+    """
+    Отдает байты архива из stream и записывает их в кэш. Файл попадает
+    в кэш, только если архив отдан полностью и поколение данных не изменилось.
+    """
+    if EXPORT_CACHE_SIZE <= 0:
+        yield from stream
+        return
+
+    path = archive_path(generation, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    completed = False
+    try:
+        with open(tmp_path, 'wb') as f:
+            for data in stream:
+                f.write(data)
+                yield data
+        completed = True
+    finally:
+        if completed and get_generation() == generation:
+            os.replace(tmp_path, path)
+            prune_archives(generation=generation)
+        else:
+            # Клиент прервал загрузку или данные изменились во время выгрузки
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
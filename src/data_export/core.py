@@ -0,0 +1,440 @@
+"""
+Бизнес-логика выгрузки данных.
+
+Полная выгрузка базы — zip-архив с файлом на каждую таблицу (.xlsx или .csv).
+Архив пишется потоком: таблицы читаются порциями по EXPORT_CHUNK_ROWS строк,
+строки сразу записываются в файл таблицы, а готовые байты архива отдаются
+клиенту по мере записи. Память не зависит от размера таблиц.
+
+Файлы .xlsx строятся книгой openpyxl в режиме write-only (строки
+сбрасываются во временный файл), затем копируются в архив частями.
+Таблица больше лимита Excel в 1 048 576 строк делится на несколько листов.
+
+Построение файлов (в первую очередь .xlsx) нагружает процессор, поэтому
+файлы строятся параллельно в пуле из EXPORT_WORKERS процессов: по заданию
+на таблицу, а таблицы больше EXPORT_SHARD_ROWS строк делятся на части по
+диапазонам rowid (отдельный файл на часть). Архив собирает один писатель
+в процессе запроса по мере готовности файлов. Время построения каждой
+таблицы выводится в лог и сохраняется в отчете (get_last_export_report).
+
+Инкрементальная выгрузка: импорт отмечает созданные и измененные заказы и
+контакты временем импорта (столбец updated_at). Отметка выгрузки
+(get_change_watermark) — максимальное updated_at на момент ее начала;
+выгрузка с since возвращает только строки с since < updated_at <= отметка,
+и следующая выгрузка начинается с полученной отметки.
+"""
+import contextlib
+import csv
+import io
+import json
+import math
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from sqlalchemy import MetaData, Table, false, func, inspect, literal_column, select
+
+from src.analytics.models import engine
+
+# Число строк, читаемых из базы за один раз
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+
+# Число процессов, параллельно строящих файлы таблиц (1 — без пула процессов)
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Таблицы больше этого числа строк выгружаются частями (файл на часть)
+EXPORT_SHARD_ROWS = int(os.getenv("EXPORT_SHARD_ROWS", "200000"))
+
+# Каталог для временных файлов выгрузки и отчета о последней выгрузке
+EXPORT_DIR = os.getenv("EXPORT_DIR", "./exports")
+
+# Столбец со временем последнего изменения строки импортом
+CHANGE_COLUMN = 'updated_at'
+
+# Поддерживаемые форматы файлов таблиц в архиве
+EXPORT_FORMATS = ('xlsx', 'csv')
+
+# Максимальное число строк данных на листе Excel (без строки заголовка)
+XLSX_MAX_ROWS = 1048576 - 1
+
+# Размер части при копировании файла в архив, байт
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def get_export_tables():
+    """
+    Возвращает имена всех таблиц базы данных.
+    """
+    return inspect(engine).get_table_names()
+
+
+def get_change_tracked_tables(tables=None):
+    """
+    Возвращает таблицы, изменения в которых отслеживаются (со столбцом updated_at).
+    """
+    inspector = inspect(engine)
+    tables = inspector.get_table_names() if tables is None else tables
+    return [t for t in tables if CHANGE_COLUMN in {c['name'] for c in inspector.get_columns(t)}]
+
+
+def get_change_watermark(tables=None):
+    """
+    Возвращает отметку изменений — максимальное updated_at по таблицам
+    с отслеживанием изменений (или None, если отмеченных строк нет).
+    """
+    values = []
+    with engine.connect() as connection:
+        for table_name in get_change_tracked_tables(tables):
+            table = Table(table_name, MetaData(), autoload_with=connection)
+            values.append(connection.execute(select(func.max(table.c[CHANGE_COLUMN]))).scalar())
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def filter_changes(statement, table, changes):
+    """
+    Оставляет в запросе строки, измененные в интервале changes = (since, watermark]:
+    since — отметка предыдущей выгрузки, watermark — отметка текущей.
+    """
+    since, watermark = changes
+    if watermark is None:
+        return statement.where(false())
+    column = table.c[CHANGE_COLUMN]
+    if since is not None:
+        statement = statement.where(column > since)
+    return statement.where(column <= watermark)
+
+
+def iter_table_chunks(connection, table_name, rowid_range=None, changes=None, chunk_rows=None):
+    """
+    Читает таблицу порциями и возвращает DataFrame для каждой порции.
+    Первая порция возвращается, даже если таблица пуста (для заголовка).
+
+    Args:
+        rowid_range (tuple): Диапазон rowid (SQLite) для выгрузки части таблицы.
+        changes (tuple): Интервал отметок (since, watermark] для выгрузки изменений.
+    """
+    # Отражение таблицы дает типы столбцов: даты читаются как datetime
+    table = Table(table_name, MetaData(), autoload_with=connection)
+    columns = [c.name for c in table.columns]
+    statement = select(table)
+    if rowid_range is not None:
+        rowid = literal_column('rowid')
+        statement = statement.where(rowid.between(*rowid_range)).order_by(rowid)
+    if changes is not None:
+        statement = filter_changes(statement, table, changes)
+    result = connection.execution_options(stream_results=True).execute(statement)
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    empty = True
+    for rows in result.partitions(chunk_rows):
+        empty = False
+        yield pd.DataFrame.from_records(rows, columns=columns)
+    if empty:
+        yield pd.DataFrame(columns=columns)
+
+
+def _cell_value(value):
+    """Приводит значение DataFrame к типу, который понимает openpyxl."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, str):
+        # Управляющие символы недопустимы в XML листа
+        return ILLEGAL_CHARACTERS_RE.sub('', value)
+    return value
+
+
+def write_table_xlsx(connection, table_name, path, rowid_range=None, changes=None):
+    """
+    Записывает таблицу (или ее часть) в файл .xlsx книгой в режиме write-only.
+
+    Returns:
+        int: Число записанных строк.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = 0
+    sheet_number = 0
+
+    total_rows = 0
+    for chunk in iter_table_chunks(connection, table_name, rowid_range, changes):
+        header = list(chunk.columns)
+        if sheet is None:
+            sheet_number += 1
+            sheet = workbook.create_sheet(table_name[:31])  # ограничение Excel на длину имени листа
+            sheet.append(header)
+        for row in chunk.itertuples(index=False, name=None):
+            if sheet_rows == XLSX_MAX_ROWS:
+                # Лист заполнен — продолжаем на следующем
+                sheet_number += 1
+                suffix = f"_{sheet_number}"
+                sheet = workbook.create_sheet(f"{table_name[:31 - len(suffix)]}{suffix}")
+                sheet.append(header)
+                sheet_rows = 0
+            sheet.append([_cell_value(value) for value in row])
+            sheet_rows += 1
+        total_rows += len(chunk)
+
+    workbook.save(path)
+    return total_rows
+
+
+def write_table_csv(connection, table_name, stream, rowid_range=None, changes=None):
+    """
+    Записывает таблицу (или ее часть) в бинарный поток в формате CSV
+    (UTF-8 с BOM для Excel).
+
+    Returns:
+        int: Число записанных строк.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        total_rows = 0
+        for chunk in iter_table_chunks(connection, table_name, rowid_range, changes):
+            if total_rows == 0:
+                csv.writer(text).writerow(chunk.columns)
+            chunk.to_csv(text, header=False, index=False, date_format='%Y-%m-%d %H:%M:%S')
+            total_rows += len(chunk)
+        text.flush()
+        return total_rows
+    finally:
+        text.detach()
+
+
+class _StreamBuffer(io.RawIOBase):
+    """
+    Поток только для записи, из которого генератор забирает накопленные байты.
+    tell() возвращает число записанных байт (нужно писателю Parquet), seek
+    не поддерживается: zipfile пишет такой архив последовательно.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _shard_ranges(connection, table_name):
+    """
+    Возвращает диапазоны rowid для выгрузки таблицы частями и оценку числа
+    строк. [None] — таблица выгружается целиком (небольшая таблица или не SQLite).
+    """
+    table = Table(table_name, MetaData(), autoload_with=connection)
+    row_count = connection.execute(select(func.count()).select_from(table)).scalar() or 0
+    if connection.dialect.name != 'sqlite' or row_count <= EXPORT_SHARD_ROWS:
+        return [None], row_count
+
+    rowid = literal_column('rowid')
+    low, high = connection.execute(select(func.min(rowid), func.max(rowid)).select_from(table)).one()
+    shards = math.ceil(row_count / EXPORT_SHARD_ROWS)
+    step = math.ceil((high - low + 1) / shards)
+    ranges = [(start, min(high, start + step - 1)) for start in range(low, high + 1, step)]
+    return ranges, row_count
+
+
+def plan_export(connection, tables, fmt, timestamp, tmp_dir, changes=None):
+    """
+    Разбивает выгрузку на задания: по заданию на таблицу или на часть
+    большой таблицы. Большие задания идут первыми, чтобы пул загружался равномерно.
+    Выгрузка изменений небольшая и на части не делится.
+    """
+    tasks = []
+    for table_name in tables:
+        if changes is None:
+            ranges, row_count = _shard_ranges(connection, table_name)
+        else:
+            ranges, row_count = [None], 0
+        for part, rowid_range in enumerate(ranges, start=1):
+            suffix = f"_part{part:02d}" if len(ranges) > 1 else ""
+            tasks.append({
+                'table': table_name,
+                'format': fmt,
+                'member_name': f"{table_name}_{timestamp}{suffix}.{fmt}",
+                'rowid_range': rowid_range,
+                'changes': changes,
+                'estimated_rows': row_count // len(ranges),
+                'tmp_dir': tmp_dir,
+            })
+    return sorted(tasks, key=lambda task: task['estimated_rows'], reverse=True)
+
+
+def build_table_file(task):
+    """
+    Строит файл одного задания выгрузки во временном каталоге.
+    Выполняется в процессе пула.
+
+    Returns:
+        dict: Задание с путем к файлу, числом строк и временем построения.
+    """
+    started = time.monotonic()
+    path = os.path.join(task['tmp_dir'], task['member_name'])
+    with engine.connect() as connection:
+        if task['format'] == 'csv':
+            with open(path, 'wb') as f:
+                rows = write_table_csv(connection, task['table'], f, task['rowid_range'], task['changes'])
+        else:
+            rows = write_table_xlsx(connection, task['table'], path, task['rowid_range'], task['changes'])
+    return dict(task, path=path, rows=rows, seconds=time.monotonic() - started)
+
+
+def _init_worker():
+    # Соединения родительского процесса нельзя использовать после fork
+    engine.dispose(close=False)
+
+
+def _run_tasks(tasks):
+    """
+    Выполняет задания в пуле процессов и возвращает результаты по мере готовности.
+    """
+    if EXPORT_WORKERS <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield build_table_file(task)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=min(EXPORT_WORKERS, len(tasks)), initializer=_init_worker)
+    try:
+        futures = [executor.submit(build_table_file, task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Если клиент прервал загрузку, ожидающие задания отменяются, а
+        # выполняющиеся дописываются до конца: иначе они писали бы файлы во
+        # временный каталог, который в это время удаляет вызывающий код
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _copy_member(zf, path, member_name):
+    """
+    Копирует готовый файл в zip-архив частями.
+    Генератор: возвращает управление после каждой части, чтобы вызывающий
+    код мог отдать накопленные байты архива.
+    """
+    with zf.open(member_name, mode='w', force_zip64=True) as member, open(path, 'rb') as f:
+        while True:
+            data = f.read(COPY_BUFFER_SIZE)
+            if not data:
+                break
+            member.write(data)
+            yield
+
+
+def _report_path():
+    return os.path.join(EXPORT_DIR, 'last_export_report.json')
+
+
+def _save_report(report):
+    """Сохраняет отчет о выгрузке (атомарно, общий для всех воркеров)."""
+    tmp_path = f"{_report_path()}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, _report_path())
+
+
+def get_last_export_report():
+    """
+    Возвращает отчет о последней полной выгрузке: время по таблицам
+    (построение файлов в пуле и запись в архив) или None.
+    """
+    try:
+        with open(_report_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def export_filename(timestamp):
+    """Имя архива полной выгрузки."""
+    return f"analytics_exports_{timestamp}.zip"
+
+
+def stream_export_archive(fmt='xlsx', tables=None, timestamp=None, changes=None):
+    """
+    Генератор байтов zip-архива со всеми таблицами (по файлу на таблицу
+    или на часть большой таблицы).
+
+    Args:
+        fmt (str): Формат файлов таблиц ('xlsx' или 'csv').
+        tables (list): Имена таблиц (по умолчанию все таблицы базы).
+        timestamp (str): Метка времени в именах файлов.
+        changes (tuple): Интервал отметок (since, watermark]: выгружаются
+            только строки, измененные в нем, из таблиц с отслеживанием изменений.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    tables = get_export_tables() if tables is None else tables
+    if changes is not None:
+        tables = get_change_tracked_tables(tables)
+    timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    started = time.monotonic()
+    timings = {table_name: {'rows': 0, 'parts': 0, 'build_seconds': 0.0, 'write_seconds': 0.0}
+               for table_name in tables}
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='export_', dir=EXPORT_DIR) as tmp_dir:
+        with engine.connect() as connection:
+            tasks = plan_export(connection, tables, fmt, timestamp, tmp_dir, changes)
+
+        buffer = _StreamBuffer()
+        # Файлы .xlsx уже сжаты, повторное сжатие только тратит время
+        compression = zipfile.ZIP_DEFLATED if fmt == 'csv' else zipfile.ZIP_STORED
+        # closing: пул закрывается до удаления временного каталога, даже если
+        # генератор выгрузки закрыт на середине (клиент прервал загрузку)
+        with zipfile.ZipFile(buffer, mode='w', compression=compression) as zf, \
+                contextlib.closing(_run_tasks(tasks)) as results:
+            for result in results:
+                write_started = time.monotonic()
+                for _ in _copy_member(zf, result['path'], result['member_name']):
+                    data = buffer.take()
+                    if data:
+                        yield data
+                os.remove(result['path'])
+
+                timing = timings[result['table']]
+                timing['rows'] += result['rows']
+                timing['parts'] += 1
+                timing['build_seconds'] += result['seconds']
+                timing['write_seconds'] += time.monotonic() - write_started
+        yield buffer.take()  # Центральный каталог архива
+
+    report = {
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'format': fmt,
+        'incremental': changes is not None,
+        'workers': EXPORT_WORKERS,
+        'total_seconds': round(time.monotonic() - started, 2),
+        'tables': [
+            dict(table=table_name, **{k: round(v, 2) if isinstance(v, float) else v for k, v in timing.items()})
+            for table_name, timing in sorted(timings.items(), key=lambda item: -item[1]['build_seconds'])
+        ],
+    }
+    for timing in report['tables']:
+        print(f"Выгрузка {timing['table']}: {timing['rows']} строк, частей: {timing['parts']}, "
+              f"построение {timing['build_seconds']} с, запись в архив {timing['write_seconds']} с")
+    print(f"Полная выгрузка ({fmt}) завершена за {report['total_seconds']} с")
+    try:
+        _save_report(report)
+    except OSError as e:
+        print(f"Ошибка сохранения отчета о выгрузке: {e}")
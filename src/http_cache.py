@@ -0,0 +1,135 @@
+"""
+Сжатие ответов и условные GET-запросы.
+
+Сжатие: ответы в текстовых форматах (JSON, HTML, CSS, JavaScript),
+включая ответы callback'ов Dash, сжимаются brotli (если установлен пакет
+brotli и браузер его поддерживает) или gzip, если они больше
+HTTP_COMPRESS_MIN_SIZE байт.
+
+Условные запросы: представления с декоратором @conditional_on_generation
+получают ETag и Last-Modified по поколению данных (src.analytics.generation).
+Пока данные не менялись, повторный запрос с If-None-Match/If-Modified-Since
+получает 304 Not Modified, и ответ не вычисляется заново.
+"""
+import functools
+import gzip
+import os
+
+from flask import make_response, request
+
+from src.analytics.generation import get_generation, get_generation_time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Минимальный размер ответа для сжатия, байт
+HTTP_COMPRESS_MIN_SIZE = int(os.getenv("HTTP_COMPRESS_MIN_SIZE", "500"))
+
+# Уровни сжатия: ответы сжимаются на каждый запрос, поэтому не максимальные
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'text/javascript',
+}
+
+
+def _choose_encoding():
+    """Возвращает кодировку сжатия, которую поддерживает клиент, или None."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """
+    Сжимает ответ, если его формат и размер подходят и клиент поддерживает сжатие.
+    Потоковые ответы и файлы (send_file) не сжимаются.
+    """
+    if (response.status_code < 200 or response.status_code >= 300
+            or response.status_code == 204
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < HTTP_COMPRESS_MIN_SIZE:
+        return response
+
+    if encoding == 'br':
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    # Сильный ETag относится к несжатому представлению
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def generation_etag():
+    """ETag ответа, зависящего только от данных аналитики."""
+    return f"gen-{get_generation()}"
+
+
+def conditional_on_generation(view):
+    """
+    Декоратор представления, результат которого зависит только от данных
+    (и параметров запроса). Ответ получает ETag и Last-Modified по поколению
+    данных; если они совпадают с присланными клиентом, возвращается
+    304 Not Modified без вызова представления.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = generation_etag()
+        last_modified = get_generation_time()
+
+        not_modified = False
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        elif last_modified is not None and request.if_modified_since is not None:
+            not_modified = last_modified.replace(microsecond=0) <= request.if_modified_since
+
+        if not_modified:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag, weak=True)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        # Браузер хранит ответ, но перед использованием сверяет его с сервером
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapper
+
+
+def init_http_cache(app):
+    """
+    Подключает сжатие ответов к Flask-приложению.
+    """
+    app.after_request(compress_response)
@@ -1,22 +1,22 @@
-import io
-import zipfile
 import pytz
-from datetime import datetime, date
-import pandas as pd
-import xlwt
-from flask import Flask, jsonify, render_template, render_template_string, send_file
-from sqlalchemy import func, inspect
+from flask import Flask, jsonify, render_template, render_template_string
 from src.auth.api import auth_api
 from src.analytics.api import analytics_api
 from src.contacts.api import contacts_api
 from src.product_grouping.api import product_grouping_api
 from src.partner_analytics.api import partner_analytics_api
-from src.analytics.models import init_db, SessionLocal, Order, engine
-from src.contacts.models import Contact
+from src.data_export.api import data_export_api
+from src.analytics.models import init_db, SessionLocal
+from src.analytics.metadata import get_table_metadata
 from src.dashboard.app import create_dash_app
+from src.dashboard.cache import get_singleflight_stats
+from src.http_cache import init_http_cache
 
 app = Flask(__name__)
 
+# Сжатие ответов (в том числе callback'ов Dash)
+init_http_cache(app)
+
 # --- Инициализация базы данных ---
 # Создаем все таблицы перед первым запросом
 @app.before_first_request
@@ -33,52 +33,16 @@ app.register_blueprint(analytics_api, url_prefix='/api/analytics')
 app.register_blueprint(contacts_api, url_prefix='/api/contacts')
 app.register_blueprint(product_grouping_api, url_prefix='/api/product-grouping')
 app.register_blueprint(partner_analytics_api, url_prefix='/api/partner-analytics')
+app.register_blueprint(data_export_api, url_prefix='/api/export')
 
-@app.route('/api/export/all')
-def export_all_tables():
+@app.route('/api/dashboard/cache-stats')
+def dashboard_cache_stats():
     """
-    Экспортирует все таблицы базы данных в набор отдельных XLS-файлов (по файлу на таблицу) внутри zip-архива.
+    Возвращает счетчики объединения одинаковых одновременных запросов дашборда:
+    сколько запросов выполнено и сколько вызовов дождались чужого результата
+    (внутри воркера и между воркерами).
     """
-    inspector = inspect(engine)
-    table_names = inspector.get_table_names()
-
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
-        with engine.connect() as connection:
-            for table in table_names:
-                df = pd.read_sql_table(table, connection)
-                excel_buffer = io.BytesIO()
-                workbook = xlwt.Workbook()
-                sheet = workbook.add_sheet(table[:31])  # ограничение Excel на длину имени листа
-
-                # Заголовок
-                for col_idx, col_name in enumerate(df.columns):
-                    sheet.write(0, col_idx, col_name)
-
-                # Данные
-                for row_idx, row in enumerate(df.itertuples(index=False), start=1):
-                    for col_idx, value in enumerate(row):
-                        if pd.isna(value):
-                            cell_value = ""
-                        elif isinstance(value, (datetime, date)):
-                            cell_value = value.strftime("%Y-%m-%d %H:%M:%S")
-                        else:
-                            cell_value = value
-                        sheet.write(row_idx, col_idx, cell_value)
-
-                workbook.save(excel_buffer)
-                excel_buffer.seek(0)
-                zf.writestr(f"{table}_{timestamp}.xls", excel_buffer.read())
-
-    zip_buffer.seek(0)
-    filename = f"analytics_exports_{timestamp}.zip"
-    return send_file(
-        zip_buffer,
-        download_name=filename,
-        as_attachment=True,
-        mimetype="application/zip",
-    )
+    return jsonify(get_singleflight_stats())
 
 
 # --- Основной интерфейс ---
@@ -87,12 +51,15 @@ def index():
     """
     Главная страница, которая отображает меню с доступом к модулям.
     """
+    # Сводка по таблицам ведется импортом (без max() по всей таблице)
     db = SessionLocal()
     try:
-        max_order_date_utc = db.query(func.max(Order.creation_date)).scalar()
-        max_contact_date_utc = db.query(func.max(Contact.creation_date)).scalar()
+        orders_metadata = get_table_metadata('orders', db)
+        contacts_metadata = get_table_metadata('contacts', db)
     finally:
         db.close()
+    max_order_date_utc = orders_metadata['max_date']
+    max_contact_date_utc = contacts_metadata['max_date']
 
     # Конвертация времени в московское
     moscow_tz = pytz.timezone('Europe/Moscow')
@@ -105,6 +72,14 @@ def index():
     if max_contact_date_utc:
         max_contact_date = max_contact_date_utc.replace(tzinfo=pytz.utc).astimezone(moscow_tz)
 
+    last_import = None
+    last_import_utc = max(
+        (m['last_import_at'] for m in (orders_metadata, contacts_metadata) if m['last_import_at']),
+        default=None
+    )
+    if last_import_utc:
+        last_import = last_import_utc.replace(tzinfo=pytz.utc).astimezone(moscow_tz)
+
     html_template = """
     <!DOCTYPE html>
     <html lang="ru">
@@ -131,6 +106,8 @@ def index():
             <div class="stats-container" style="background-color: #e9ecef; padding: 15px; border-radius: 8px; margin-bottom: 20px;">
                 <p><strong>Макс. дата создания заказа:</strong> {{ max_order_date.strftime('%d-%m-%Y %H:%M') if max_order_date else 'Нет данных' }}</p>
                 <p><strong>Макс. дата создания контакта:</strong> {{ max_contact_date.strftime('%d-%m-%Y %H:%M') if max_contact_date else 'Нет данных' }}</p>
+                <p><strong>Заказов:</strong> {{ orders_count }}, <strong>контактов:</strong> {{ contacts_count }}</p>
+                <p><strong>Последний импорт:</strong> {{ last_import.strftime('%d-%m-%Y %H:%M') if last_import else 'Нет данных' }}</p>
             </div>
 
             <!-- Модуль Аутентификации -->
@@ -170,8 +147,9 @@ def index():
             <!-- Модуль Выгрузки -->
             <div class="module">
                 <h2>Выгрузка данных</h2>
-                <p>Экспорт всех таблиц базы в отдельные XLS-файлы (zip-архив).</p>
-                <a href="/api/export/all"><button>ВЫГРУЗКА</button></a>
+                <p>Экспорт всех таблиц базы в отдельные файлы (zip-архив).</p>
+                <a href="/api/export/all"><button>ВЫГРУЗКА (XLSX)</button></a>
+                <a href="/api/export/all?format=csv"><button>ВЫГРУЗКА (CSV)</button></a>
             </div>
 
             <!-- Модуль Группировки Продуктов -->
@@ -246,7 +224,10 @@ def index():
     return render_template_string(
         html_template,
         max_order_date=max_order_date,
-        max_contact_date=max_contact_date
+        max_contact_date=max_contact_date,
+        orders_count=orders_metadata['row_count'],
+        contacts_count=contacts_metadata['row_count'],
+        last_import=last_import
     )
 
 @app.route('/product-grouping')
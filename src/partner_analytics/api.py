@@ -3,11 +3,13 @@ API для модуля аналитики по партнерам.
 """
 from flask import Blueprint, jsonify, request
 from src.analytics.models import SessionLocal
+from src.http_cache import conditional_on_generation
 from . import core
 
 partner_analytics_api = Blueprint('partner_analytics_api', __name__)
 
 @partner_analytics_api.route('/', methods=['GET'])
+@conditional_on_generation
 def get_partner_analytics_data():
     """
     Возвращает аналитику по партнерам за указанный период.
@@ -19,7 +21,7 @@ def get_partner_analytics_data():
     try:
         data = core.get_partner_analytics(db, start_date, end_date)
         # Преобразуем каждую строку в словарь
-        result = [dict(row._mapping) for row in data]
+        result = [row._asdict() for row in data]
         return jsonify(result)
     finally:
         db.close()
@@ -1,12 +1,15 @@
 """
 SQL-запросы для модуля аналитики по партнерам.
 """
-from sqlalchemy import text
+from sqlalchemy import Float, Integer, String, text
 from sqlalchemy.orm import Session
+from src.analytics import mirror
 
-def get_partner_analytics_data(db: Session, start_date: str, end_date: str, exclude_common: bool = False):
+def build_partner_analytics_query(start_date: str, end_date: str, exclude_common: bool = False):
     """
-    Выполняет SQL-запрос для получения агрегированных данных по партнерам.
+    Строит SQL-запрос агрегированных данных по партнерам.
+    Возвращает типизированный SELECT, который можно выполнить напрямую
+    или использовать как подзапрос (например, для постраничного вывода).
     """
     params = {"start_date": start_date, "end_date": end_date}
     
@@ -32,9 +35,26 @@ def get_partner_analytics_data(db: Session, start_date: str, end_date: str, excl
         GROUP BY
             partner, o.utm_source
         ORDER BY
-            total_income DESC;
+            total_income DESC
     """
     
-    query = text(query_sql)
-    result = db.execute(query, params)
+    return text(query_sql).bindparams(**params).columns(
+        partner=String,
+        utm_source=String,
+        order_count=Integer,
+        total_income=Float,
+    )
+
+def get_partner_analytics_data(db: Session, start_date: str, end_date: str, exclude_common: bool = False):
+    """
+    Выполняет SQL-запрос для получения агрегированных данных по партнерам.
+    """
+    query = build_partner_analytics_query(start_date, end_date, exclude_common)
+
+    if mirror.is_mirror_enabled():
+        df = mirror.read_frame(query)
+        df = df.astype(object).where(df.notna(), None)
+        return list(df.itertuples(index=False, name='Row'))
+
+    result = db.execute(query)
     return result.fetchall()
@@ -4,25 +4,88 @@ API для модуля группировки продуктов.
 from flask import Blueprint, jsonify, request
 from sqlalchemy.orm import Session
 from src.analytics.models import SessionLocal
-from .models import Product, ProductCategory
-from .core import sync_products_from_orders
+from src.analytics.generation import bump_generation
+from src.http_cache import conditional_on_generation
+from .models import CategoryRule, Product, ProductCategory
+from .rules import RuleMatcher, validate_rule
+from .hierarchy import category_tree, create_category, move_category, remove_category
+from .core import (
+    PRODUCTS_PAGE_SIZE,
+    PRODUCTS_PAGE_SIZE_MAX,
+    apply_rules,
+    bulk_assign_categories,
+    get_products_page,
+    search_products,
+    on_catalog_changed,
+    sync_products_from_orders,
+)
 
 product_grouping_api = Blueprint('product_grouping_api', __name__)
 
 @product_grouping_api.route('/products', methods=['GET'])
+@conditional_on_generation
 def get_products():
-    """Возвращает список всех продуктов и их категорий."""
+    """
+    Возвращает страницу продуктов и их категорий, упорядоченных по названию.
+
+    Параметры запроса:
+        q: Фильтр по названию (вхождение без учета регистра).
+        uncategorized: 1 — только продукты без категорий.
+        after: Курсор следующей страницы (next_cursor из предыдущего ответа).
+        limit: Размер страницы (не больше PRODUCTS_PAGE_SIZE_MAX).
+
+    Ответ: {"items": [...], "next_cursor": "..." или null}.
+    """
+    try:
+        limit = int(request.args.get('limit', PRODUCTS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    limit = min(max(limit, 1), PRODUCTS_PAGE_SIZE_MAX)
+
     db: Session = SessionLocal()
     try:
-        products = db.query(Product).all()
-        result = [
-            {
-                "id": p.id,
-                "name": p.name,
-                "categories": [c.name for c in p.categories]
-            } for p in products
-        ]
-        return jsonify(result)
+        items, next_cursor = get_products_page(
+            db,
+            query=request.args.get('q'),
+            uncategorized=request.args.get('uncategorized') == '1',
+            after=request.args.get('after'),
+            limit=limit,
+        )
+        return jsonify({"items": items, "next_cursor": next_cursor})
+    finally:
+        db.close()
+
+@product_grouping_api.route('/products/search', methods=['GET'])
+@conditional_on_generation
+def search_products_window():
+    """
+    Возвращает окно списка продуктов для виртуализированного списка
+    на странице группировки: только видимые строки с категориями.
+
+    Параметры запроса:
+        q: Фильтр по названию (вхождение без учета регистра).
+        uncategorized: 1 — только продукты без категорий.
+        offset: Позиция первого продукта окна.
+        limit: Размер окна (не больше PRODUCTS_PAGE_SIZE_MAX).
+
+    Ответ: {"total": ..., "offset": ..., "items": [...]}.
+    """
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = int(request.args.get('limit', PRODUCTS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    limit = min(max(limit, 1), PRODUCTS_PAGE_SIZE_MAX)
+
+    db: Session = SessionLocal()
+    try:
+        return jsonify(search_products(
+            db,
+            query=request.args.get('q'),
+            uncategorized=request.args.get('uncategorized') == '1',
+            offset=offset,
+            limit=limit,
+        ))
     finally:
         db.close()
 
@@ -46,7 +109,13 @@ def get_product_details(product_id):
 
 @product_grouping_api.route('/categories', methods=['GET', 'POST'])
 def handle_categories():
-    """Создает новую категорию или возвращает список всех категорий."""
+    """
+    Создает новую категорию или возвращает список всех категорий
+    в порядке обхода дерева.
+
+    Тело POST-запроса: {"name": "...", "parent_id": 1} — parent_id
+    необязателен, без него категория создается в корне дерева.
+    """
     db: Session = SessionLocal()
     try:
         if request.method == 'POST':
@@ -54,14 +123,56 @@ def handle_categories():
             if not data or 'name' not in data:
                 return jsonify({"error": "Missing category name"}), 400
             
-            new_category = ProductCategory(name=data['name'])
-            db.add(new_category)
+            try:
+                new_category = create_category(db, data['name'], data.get('parent_id'))
+            except ValueError as e:
+                db.rollback()
+                return jsonify({"error": str(e)}), 400
             db.commit()
-            return jsonify({"id": new_category.id, "name": new_category.name}), 201
+            on_catalog_changed()
+            return jsonify(_category_to_dict(new_category)), 201
 
         # GET request
-        categories = db.query(ProductCategory).all()
-        return jsonify([{"id": c.id, "name": c.name} for c in categories])
+        return jsonify([_category_to_dict(c) for c in category_tree(db)])
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
+
+def _category_to_dict(category):
+    return {
+        "id": category.id,
+        "name": category.name,
+        "parent_id": category.parent_id,
+        "level": category.level,
+    }
+
+@product_grouping_api.route('/categories/<int:category_id>', methods=['PATCH'])
+def update_category(category_id):
+    """
+    Переносит категорию вместе с дочерними в другую родительскую категорию.
+
+    Тело запроса: {"parent_id": 1} или {"parent_id": null} — перенос в корень.
+    """
+    db: Session = SessionLocal()
+    try:
+        category = db.get(ProductCategory, category_id)
+        if not category:
+            return jsonify({"error": "Category not found"}), 404
+
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or 'parent_id' not in data:
+            return jsonify({"error": "Missing 'parent_id'"}), 400
+
+        try:
+            move_category(db, category, data['parent_id'])
+        except ValueError as e:
+            db.rollback()
+            return jsonify({"error": str(e)}), 400
+        db.commit()
+        on_catalog_changed()
+        return jsonify(_category_to_dict(category)), 200
     except Exception as e:
         db.rollback()
         return jsonify({"error": str(e)}), 500
@@ -70,15 +181,16 @@ def handle_categories():
 
 @product_grouping_api.route('/categories/<int:category_id>', methods=['DELETE'])
 def delete_category(category_id):
-    """Удаляет категорию."""
+    """Удаляет категорию; ее дочерние категории переходят к ее родителю."""
     db: Session = SessionLocal()
     try:
         category = db.query(ProductCategory).filter(ProductCategory.id == category_id).first()
         if not category:
             return jsonify({"error": "Category not found"}), 404
         
-        db.delete(category)
+        remove_category(db, category)
         db.commit()
+        on_catalog_changed()
         return jsonify({"message": "Category deleted"}), 200
     except Exception as e:
         db.rollback()
@@ -104,6 +216,7 @@ def assign_categories_to_product(product_id):
         # Обновляем связь
         product.categories = categories
         db.commit()
+        on_catalog_changed()
         
         return jsonify({"message": "Categories assigned successfully"})
     except Exception as e:
@@ -112,6 +225,126 @@ def assign_categories_to_product(product_id):
     finally:
         db.close()
 
+@product_grouping_api.route('/products/bulk-assign-categories', methods=['POST'])
+def bulk_assign_categories_to_products():
+    """
+    Массово меняет категории продуктов в одной транзакции.
+
+    Тело запроса (любые из ключей):
+        assign: [{"product_id": 1, "category_ids": [2, 3]}] — заменить категории продукта.
+        add: [{"product_ids": [1, 2], "category_ids": [3]}] — добавить категории.
+        remove: [{"product_ids": [1, 2], "category_ids": [3]}] — убрать категории.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+
+    db: Session = SessionLocal()
+    try:
+        result = bulk_assign_categories(db, data.get('assign'), data.get('add'), data.get('remove'))
+        db.commit()
+        if result["updated_products"]:
+            on_catalog_changed()
+        return jsonify(result)
+    except ValueError as e:
+        db.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
+
+@product_grouping_api.route('/rules', methods=['GET', 'POST'])
+def handle_rules():
+    """Создает правило автокатегоризации или возвращает список правил."""
+    db: Session = SessionLocal()
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            kind, pattern = data.get('kind'), data.get('pattern')
+            try:
+                validate_rule(kind, pattern)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if db.get(ProductCategory, data.get('category_id')) is None:
+                return jsonify({"error": "Category not found"}), 404
+
+            rule = CategoryRule(category_id=data['category_id'], kind=kind, pattern=pattern.strip())
+            db.add(rule)
+            db.flush()
+            # Правило должно объединяться с уже сохраненными в одно выражение
+            try:
+                RuleMatcher(db.query(CategoryRule).all())
+            except ValueError as e:
+                db.rollback()
+                return jsonify({"error": str(e)}), 400
+            db.commit()
+            # Правила входят в выгрузку данных, кэш которой привязан к поколению
+            bump_generation()
+            return jsonify(_rule_to_dict(rule)), 201
+
+        rules = db.query(CategoryRule).order_by(CategoryRule.id).all()
+        return jsonify([_rule_to_dict(rule) for rule in rules])
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
+
+def _rule_to_dict(rule):
+    return {
+        "id": rule.id,
+        "category_id": rule.category_id,
+        "category": rule.category.name,
+        "kind": rule.kind,
+        "pattern": rule.pattern,
+    }
+
+@product_grouping_api.route('/rules/<int:rule_id>', methods=['DELETE'])
+def delete_rule(rule_id):
+    """Удаляет правило автокатегоризации."""
+    db: Session = SessionLocal()
+    try:
+        rule = db.get(CategoryRule, rule_id)
+        if not rule:
+            return jsonify({"error": "Rule not found"}), 404
+        db.delete(rule)
+        db.commit()
+        bump_generation()
+        return jsonify({"message": "Rule deleted"}), 200
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
+
+@product_grouping_api.route('/rules/apply', methods=['POST'])
+def apply_category_rules():
+    """
+    Применяет правила автокатегоризации ко всем продуктам
+    (или к product_ids из тела запроса).
+
+    Параметры запроса:
+        dry_run: 1 — только показать, какие категории будут добавлены.
+    """
+    data = request.get_json(silent=True) or {}
+    dry_run = request.args.get('dry_run') == '1'
+    db: Session = SessionLocal()
+    try:
+        result = apply_rules(db, product_ids=data.get('product_ids'), dry_run=dry_run)
+        if not dry_run:
+            db.commit()
+            if result["products"]:
+                on_catalog_changed()
+        result["dry_run"] = dry_run
+        return jsonify(result)
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
+
 @product_grouping_api.route('/products/sync', methods=['POST'])
 def sync_products():
     """Запускает синхронизацию продуктов из заказов."""
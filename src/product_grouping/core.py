@@ -1,9 +1,61 @@
 """
 Бизнес-логика для модуля группировки продуктов.
 """
-from sqlalchemy.orm import Session
+import os
+import threading
+from collections import OrderedDict, defaultdict
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session, selectinload
 from src.analytics.models import Order, SessionLocal
-from .models import Product
+from src.analytics.mirror import refresh_mirror
+from src.analytics.generation import bump_generation, get_generation
+from .models import CategoryRule, Product, ProductCategory, product_category_association
+from .rules import RuleMatcher
+from .hierarchy import ensure_category_closure
+
+# Таблицы каталога, которые меняются при работе с группировкой продуктов
+CATALOG_TABLES = ['products', 'product_category_association', 'product_categories', 'category_closure']
+
+# Размер страницы списка продуктов по умолчанию и максимальный
+PRODUCTS_PAGE_SIZE = int(os.getenv("PRODUCTS_PAGE_SIZE", "100"))
+PRODUCTS_PAGE_SIZE_MAX = 500
+
+# Число фильтров поиска, для которых хранится список подходящих продуктов
+SEARCH_CACHE_SIZE = 32
+
+# (поколение данных, фильтр) -> идентификаторы подходящих продуктов по порядку
+_search_cache = OrderedDict()
+_search_lock = threading.Lock()
+
+def on_catalog_changed():
+    """
+    Вызывается после любого изменения продуктов или категорий.
+    Обновляет таблицы каталога в аналитическом зеркале (если оно включено)
+    и увеличивает поколение данных, чтобы сбросить кэши дашборда.
+    """
+    try:
+        refresh_mirror(CATALOG_TABLES)
+    except Exception as e:
+        print(f"Ошибка обновления аналитического зеркала: {e}")
+    bump_generation()
+
+def repair_category_closure():
+    """
+    Восстанавливает таблицу замыкания дерева категорий, если она неполна
+    (см. hierarchy.ensure_category_closure). Вызывается из init_db.
+    """
+    db: Session = SessionLocal()
+    try:
+        if ensure_category_closure(db):
+            db.commit()
+            print("Таблица замыкания категорий пересобрана")
+            on_catalog_changed()
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка восстановления дерева категорий: {e}")
+    finally:
+        db.close()
 
 def sync_products_from_orders():
     """
@@ -26,12 +78,302 @@ def sync_products_from_orders():
         if new_product_names:
             new_products = [Product(name=name) for name in new_product_names]
             db.add_all(new_products)
+            db.flush()
+            # Новые продукты сразу получают категории по правилам. Ошибка
+            # в правилах не должна мешать синхронизации: откатываются только
+            # назначения категорий, продукты сохраняются
+            categorized = 0
+            try:
+                with db.begin_nested():
+                    categorized = apply_rules(db, product_ids=[p.id for p in new_products])["products"]
+            except Exception as e:
+                print(f"Ошибка применения правил автокатегоризации: {e}")
             db.commit()
-            return {"status": "success", "added": len(new_products)}
+            on_catalog_changed()
+            return {"status": "success", "added": len(new_products), "categorized": categorized}
         
-        return {"status": "success", "added": 0}
+        return {"status": "success", "added": 0, "categorized": 0}
     except Exception as e:
         db.rollback()
         return {"status": "error", "message": str(e)}
     finally:
         db.close()
+
+def get_products_page(db: Session, query=None, uncategorized=False, after=None, limit=PRODUCTS_PAGE_SIZE):
+    """
+    Возвращает страницу продуктов с категориями, упорядоченных по названию.
+
+    Пагинация по ключу: следующая страница начинается после названия
+    последнего продукта предыдущей (названия уникальны), поэтому запрос не
+    зависит от номера страницы. Категории загружаются одним запросом на
+    страницу (selectinload), а не отдельным запросом на каждый продукт.
+
+    Args:
+        db (Session): Сессия SQLAlchemy.
+        query (str): Фильтр по вхождению в название без учета регистра.
+        uncategorized (bool): Только продукты без категорий.
+        after (str): Курсор — название последнего продукта предыдущей страницы.
+        limit (int): Размер страницы.
+
+    Returns:
+        tuple: (список продуктов, курсор следующей страницы или None).
+    """
+    statement = select(Product.id, Product.name).order_by(Product.name)
+    if after is not None:
+        statement = statement.where(Product.name > after)
+    if uncategorized:
+        statement = statement.where(~Product.categories.any())
+
+    # LIKE и lower() в SQLite не учитывают регистр только для латиницы,
+    # поэтому фильтр по названию применяется к потоку названий здесь
+    text = (query or '').strip().casefold()
+    if not text:
+        statement = statement.limit(limit + 1)
+
+    page_ids = []
+    last_name = None
+    has_more = False
+    result = db.execute(statement.execution_options(yield_per=1000))
+    try:
+        for product_id, name in result:
+            if text and text not in name.casefold():
+                continue
+            if len(page_ids) == limit:
+                has_more = True
+                break
+            page_ids.append(product_id)
+            last_name = name
+    finally:
+        result.close()
+
+    products = db.scalars(
+        select(Product)
+        .options(selectinload(Product.categories))
+        .where(Product.id.in_(page_ids))
+        .order_by(Product.name)
+    ).all()
+    items = [
+        {
+            "id": p.id,
+            "name": p.name,
+            "categories": [c.name for c in p.categories]
+        } for p in products
+    ]
+    return items, (last_name if has_more else None)
+
+
+def _matching_product_ids(db: Session, text, uncategorized):
+    """
+    Возвращает идентификаторы продуктов, подходящих под фильтр, по названию.
+    Список хранится до изменения данных, поэтому прокрутка списка не
+    пересчитывает фильтр на каждый запрос окна.
+    """
+    key = (get_generation(), text, uncategorized)
+    with _search_lock:
+        if key in _search_cache:
+            _search_cache.move_to_end(key)
+            return _search_cache[key]
+
+    statement = select(Product.id, Product.name).order_by(Product.name)
+    if uncategorized:
+        statement = statement.where(~Product.categories.any())
+    product_ids = [
+        product_id for product_id, name in db.execute(statement)
+        if not text or text in name.casefold()
+    ]
+
+    with _search_lock:
+        _search_cache[key] = product_ids
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+    return product_ids
+
+
+def search_products(db: Session, query=None, uncategorized=False, offset=0, limit=PRODUCTS_PAGE_SIZE):
+    """
+    Возвращает окно списка продуктов (по названию) для виртуализированного
+    списка: общее число подходящих продуктов и продукты окна с категориями.
+
+    Args:
+        db (Session): Сессия SQLAlchemy.
+        query (str): Фильтр по вхождению в название без учета регистра.
+        uncategorized (bool): Только продукты без категорий.
+        offset (int): Позиция первого продукта окна.
+        limit (int): Размер окна.
+
+    Returns:
+        dict: {"total": ..., "offset": ..., "items": [...]}.
+    """
+    text = (query or '').strip().casefold()
+    product_ids = _matching_product_ids(db, text, uncategorized)
+    window = product_ids[offset:offset + limit]
+
+    products = db.scalars(
+        select(Product)
+        .options(selectinload(Product.categories))
+        .where(Product.id.in_(window))
+    ).all()
+    by_id = {p.id: p for p in products}
+    items = []
+    for product_id in window:
+        product = by_id.get(product_id)
+        if product is None:
+            continue  # Продукт удален после построения списка
+        categories = sorted(product.categories, key=lambda c: c.name)
+        items.append({
+            "id": product.id,
+            "name": product.name,
+            "categories": [c.name for c in categories],
+            "category_ids": [c.id for c in categories],
+        })
+    return {"total": len(product_ids), "offset": offset, "items": items}
+
+
+def _id_list(value, field):
+    """Проверяет, что value — список целых идентификаторов."""
+    if not isinstance(value, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in value):
+        raise ValueError(f"'{field}' must be a list of integer ids")
+    return value
+
+
+def _parse_bulk_operations(assign, add, remove):
+    """
+    Приводит операции массового назначения к виду (режим, продукты, категории).
+    """
+    operations = []
+    for item in assign or []:
+        if not isinstance(item, dict) or not isinstance(item.get('product_id'), int):
+            raise ValueError("'assign' items must have an integer 'product_id'")
+        operations.append(('assign', [item['product_id']], _id_list(item.get('category_ids', []), 'category_ids')))
+    for mode, items in (('add', add), ('remove', remove)):
+        for item in items or []:
+            if not isinstance(item, dict):
+                raise ValueError(f"'{mode}' items must be objects")
+            operations.append((mode, _id_list(item.get('product_ids'), 'product_ids'),
+                               _id_list(item.get('category_ids'), 'category_ids')))
+    return operations
+
+
+def bulk_assign_categories(db: Session, assign=None, add=None, remove=None):
+    """
+    Массово меняет категории продуктов в одной транзакции.
+
+    Операции применяются по порядку: сначала assign (замена набора категорий
+    продукта), затем add и remove. Текущие связи затронутых продуктов
+    читаются одним запросом, итоговые наборы вычисляются в памяти, а
+    product_category_association меняется одним DELETE и одной пакетной
+    вставкой только для продуктов, набор которых изменился.
+
+    Args:
+        db (Session): Сессия SQLAlchemy (фиксация — в вызывающем коде).
+        assign (list): [{"product_id": 1, "category_ids": [2, 3]}, ...].
+        add (list): [{"product_ids": [...], "category_ids": [...]}, ...].
+        remove (list): [{"product_ids": [...], "category_ids": [...]}, ...].
+
+    Returns:
+        dict: Число измененных продуктов, добавленных и удаленных связей.
+
+    Raises:
+        ValueError: Неверный формат операций или неизвестные идентификаторы.
+    """
+    operations = _parse_bulk_operations(assign, add, remove)
+    product_ids = {pid for _, pids, _ in operations for pid in pids}
+    category_ids = {cid for _, _, cids in operations for cid in cids}
+
+    known_products = set(db.scalars(select(Product.id).where(Product.id.in_(product_ids))))
+    known_categories = set(db.scalars(select(ProductCategory.id).where(ProductCategory.id.in_(category_ids))))
+    if product_ids - known_products:
+        raise ValueError(f"Unknown product ids: {sorted(product_ids - known_products)}")
+    if category_ids - known_categories:
+        raise ValueError(f"Unknown category ids: {sorted(category_ids - known_categories)}")
+
+    association = product_category_association
+    current = {pid: set() for pid in product_ids}
+    for pid, cid in db.execute(
+        select(association.c.product_id, association.c.category_id)
+        .where(association.c.product_id.in_(product_ids))
+    ):
+        current[pid].add(cid)
+
+    final = {pid: set(cids) for pid, cids in current.items()}
+    for mode, pids, cids in operations:
+        for pid in pids:
+            if mode == 'assign':
+                final[pid] = set(cids)
+            elif mode == 'add':
+                final[pid] |= set(cids)
+            else:
+                final[pid] -= set(cids)
+
+    changed = [pid for pid in product_ids if final[pid] != current[pid]]
+    if changed:
+        # Связи измененных продуктов пересоздаются целиком (заодно исчезают дубли)
+        db.execute(delete(association).where(association.c.product_id.in_(changed)))
+        rows = [{"product_id": pid, "category_id": cid} for pid in changed for cid in sorted(final[pid])]
+        if rows:
+            db.execute(insert(association), rows)
+
+    return {
+        "updated_products": len(changed),
+        "added": sum(len(final[pid] - current[pid]) for pid in changed),
+        "removed": sum(len(current[pid] - final[pid]) for pid in changed),
+    }
+
+
+def apply_rules(db: Session, product_ids=None, dry_run=False):
+    """
+    Применяет правила автокатегоризации к продуктам.
+
+    Правила только добавляют категории: назначенные вручную категории не
+    удаляются. Изменения записываются массовым назначением
+    (bulk_assign_categories), фиксация — в вызывающем коде.
+
+    Args:
+        db (Session): Сессия SQLAlchemy.
+        product_ids (list): Продукты для обработки (по умолчанию все).
+        dry_run (bool): Только показать, какие категории будут добавлены.
+
+    Returns:
+        dict: Число продуктов с новыми категориями и список
+            {"product_id", "name", "categories"} с добавляемыми категориями.
+    """
+    matcher = RuleMatcher(db.scalars(select(CategoryRule)).all())
+    statement = select(Product.id, Product.name).order_by(Product.name)
+    if product_ids is not None:
+        statement = statement.where(Product.id.in_(product_ids))
+
+    names, matches = {}, {}
+    for product_id, name in db.execute(statement):
+        category_ids = matcher.match(name)
+        if category_ids:
+            names[product_id] = name
+            matches[product_id] = category_ids
+
+    association = product_category_association
+    for product_id, category_id in db.execute(
+        select(association.c.product_id, association.c.category_id)
+        .where(association.c.product_id.in_(list(matches)))
+    ):
+        matches[product_id].discard(category_id)
+    additions = {pid: cids for pid, cids in matches.items() if cids}
+
+    if additions and not dry_run:
+        # Продукты с одинаковым набором новых категорий — одна операция
+        by_categories = defaultdict(list)
+        for product_id, category_ids in additions.items():
+            by_categories[tuple(sorted(category_ids))].append(product_id)
+        bulk_assign_categories(db, add=[
+            {"product_ids": pids, "category_ids": list(cids)} for cids, pids in by_categories.items()
+        ])
+
+    category_names = dict(db.execute(select(ProductCategory.id, ProductCategory.name)).all())
+    return {
+        "products": len(additions),
+        "assignments": [
+            {
+                "product_id": pid,
+                "name": names[pid],
+                "categories": sorted(category_names[cid] for cid in cids)
+            } for pid, cids in additions.items()
+        ],
+    }
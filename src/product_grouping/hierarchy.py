@@ -0,0 +1,273 @@
+"""
+Дерево категорий продуктов на основе таблицы замыкания.
+
+Кроме parent_id, для каждой категории в category_closure хранятся строки
+(предок, потомок, глубина) для всех ее предков, включая саму категорию
+с глубиной 0. Поэтому фильтр «категория и все ее потомки» — одно
+соединение по индексу без рекурсивных запросов, а свертка к уровню
+дерева — выбор предка с нужным уровнем (ProductCategory.level).
+
+Функции модуля поддерживают таблицу замыкания при создании, перемещении
+и удалении категорий; rebuild_category_closure пересобирает ее по
+parent_id целиком. Коммит выполняет вызывающий код.
+"""
+from sqlalchemy import and_, delete, func, insert, or_, select, true, update
+from sqlalchemy.orm import Session
+from .models import ProductCategory, category_closure, product_category_association
+
+
+def _as_list(category_ids):
+    return [category_ids] if isinstance(category_ids, int) else list(category_ids)
+
+
+def subtree_ids(category_ids):
+    """
+    Подзапрос идентификаторов категорий category_ids и всех их потомков.
+
+    Args:
+        category_ids: id категории или список id.
+    """
+    return select(category_closure.c.descendant_id)\
+        .where(category_closure.c.ancestor_id.in_(_as_list(category_ids)))
+
+
+def rollup_categories(level=None, category_ids=None, exclude_category_ids=None):
+    """
+    Подзапрос (product_id, category_id): категории продуктов, свернутые
+    к уровню дерева level (0 — корневые категории). Продукт из категории
+    глубже level попадает в ее предка на этом уровне, из категории выше —
+    в саму категорию; без level категории берутся как назначены. Продукт
+    учитывается в категории один раз, даже если назначен и в нее, и в ее
+    потомка.
+
+    Args:
+        level (int): Уровень свертки или None.
+        category_ids (list): Учитывать только назначения в этих категориях
+            и их потомках.
+        exclude_category_ids (list): Не учитывать назначения в этих
+            категориях и их потомках.
+    """
+    association = product_category_association
+    if level is None:
+        statement = select(association.c.product_id, association.c.category_id)
+    else:
+        ancestor = ProductCategory.__table__.alias('ancestor')
+        statement = select(association.c.product_id, category_closure.c.ancestor_id.label('category_id'))\
+            .join_from(association, category_closure, category_closure.c.descendant_id == association.c.category_id)\
+            .join(ancestor, ancestor.c.id == category_closure.c.ancestor_id)\
+            .where(or_(
+                ancestor.c.level == level,
+                and_(category_closure.c.depth == 0, ancestor.c.level < level)
+            ))
+
+    if category_ids:
+        statement = statement.where(association.c.category_id.in_(subtree_ids(category_ids)))
+    if exclude_category_ids:
+        statement = statement.where(association.c.category_id.notin_(subtree_ids(exclude_category_ids)))
+    return statement.distinct().subquery('category_rollup')
+
+
+def _get_parent(db: Session, parent_id):
+    if parent_id is None:
+        return None
+    if not isinstance(parent_id, int) or isinstance(parent_id, bool):
+        raise ValueError("'parent_id' must be an integer or null")
+    parent = db.get(ProductCategory, parent_id)
+    if parent is None:
+        raise ValueError(f"Parent category not found: {parent_id}")
+    return parent
+
+
+def create_category(db: Session, name, parent_id=None):
+    """
+    Создает категорию в корне дерева или внутри parent_id.
+
+    Raises:
+        ValueError: Родительская категория не найдена.
+    """
+    parent = _get_parent(db, parent_id)
+    category = ProductCategory(name=name, parent_id=parent_id, level=parent.level + 1 if parent else 0)
+    db.add(category)
+    db.flush()
+
+    rows = [{"ancestor_id": category.id, "descendant_id": category.id, "depth": 0}]
+    if parent is not None:
+        ancestors = db.execute(
+            select(category_closure.c.ancestor_id, category_closure.c.depth)
+            .where(category_closure.c.descendant_id == parent.id)
+        ).all()
+        rows += [
+            {"ancestor_id": ancestor_id, "descendant_id": category.id, "depth": depth + 1}
+            for ancestor_id, depth in ancestors
+        ]
+    db.execute(insert(category_closure), rows)
+    return category
+
+
+def move_category(db: Session, category: ProductCategory, parent_id):
+    """
+    Переносит категорию вместе с ее потомками внутрь parent_id
+    (None — в корень дерева).
+
+    Raises:
+        ValueError: Родитель не найден, либо это сама категория или ее потомок.
+    """
+    parent = _get_parent(db, parent_id)
+    if parent_id == category.parent_id:
+        return
+    if parent is not None:
+        inside = db.execute(
+            select(category_closure.c.depth).where(
+                category_closure.c.ancestor_id == category.id,
+                category_closure.c.descendant_id == parent.id,
+            )
+        ).first()
+        if inside is not None:
+            raise ValueError("Category cannot be moved into itself or its descendant")
+
+    subtree = select(category_closure.c.descendant_id).where(category_closure.c.ancestor_id == category.id)
+
+    # Связи поддерева с прежними предками
+    db.execute(
+        delete(category_closure).where(
+            category_closure.c.descendant_id.in_(subtree),
+            category_closure.c.ancestor_id.notin_(subtree),
+        )
+    )
+    if parent is not None:
+        # Каждый предок нового родителя становится предком каждого узла поддерева
+        above = category_closure.alias('above')
+        below = category_closure.alias('below')
+        db.execute(
+            insert(category_closure).from_select(
+                ['ancestor_id', 'descendant_id', 'depth'],
+                select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+                .select_from(above.join(below, true()))
+                .where(above.c.descendant_id == parent.id, below.c.ancestor_id == category.id)
+            )
+        )
+
+    shift = (parent.level + 1 if parent else 0) - category.level
+    if shift:
+        db.execute(
+            update(ProductCategory)
+            .where(ProductCategory.id.in_(subtree))
+            .values(level=ProductCategory.level + shift)
+            .execution_options(synchronize_session='fetch')
+        )
+    category.parent_id = parent_id
+
+
+def remove_category(db: Session, category: ProductCategory):
+    """
+    Удаляет категорию; ее дочерние категории переходят к ее родителю.
+    """
+    ancestors = select(category_closure.c.ancestor_id).where(
+        category_closure.c.descendant_id == category.id, category_closure.c.depth > 0
+    )
+    descendants = select(category_closure.c.descendant_id).where(
+        category_closure.c.ancestor_id == category.id, category_closure.c.depth > 0
+    )
+    # Пути от предков к потомкам проходили через удаляемую категорию
+    db.execute(
+        update(category_closure)
+        .where(category_closure.c.ancestor_id.in_(ancestors), category_closure.c.descendant_id.in_(descendants))
+        .values(depth=category_closure.c.depth - 1)
+    )
+    db.execute(
+        update(ProductCategory)
+        .where(ProductCategory.id.in_(descendants))
+        .values(level=ProductCategory.level - 1)
+        .execution_options(synchronize_session='fetch')
+    )
+    db.execute(
+        update(ProductCategory)
+        .where(ProductCategory.parent_id == category.id)
+        .values(parent_id=category.parent_id)
+        .execution_options(synchronize_session='fetch')
+    )
+    db.execute(
+        delete(category_closure).where(
+            or_(category_closure.c.ancestor_id == category.id, category_closure.c.descendant_id == category.id)
+        )
+    )
+    db.delete(category)
+
+
+def rebuild_category_closure(db: Session):
+    """
+    Пересобирает таблицу замыкания и уровни категорий по parent_id.
+    Ссылка на несуществующего родителя или цикл делают категорию корневой.
+
+    Returns:
+        int: Число строк таблицы замыкания.
+    """
+    parents = dict(db.execute(select(ProductCategory.id, ProductCategory.parent_id)).all())
+    paths = {}
+
+    def path(category_id):
+        # Категория и ее предки от ближайшего к корню
+        if category_id not in paths:
+            chain, node = [], category_id
+            while node is not None and node in parents and node not in chain and node not in paths:
+                chain.append(node)
+                node = parents[node]
+            tail = paths.get(node, [])
+            for i in reversed(range(len(chain))):
+                paths[chain[i]] = chain[i:] + tail
+        return paths[category_id]
+
+    rows = []
+    for category_id in parents:
+        for depth, ancestor_id in enumerate(path(category_id)):
+            rows.append({"ancestor_id": ancestor_id, "descendant_id": category_id, "depth": depth})
+
+    db.execute(delete(category_closure))
+    if rows:
+        db.execute(insert(category_closure), rows)
+    for category in db.query(ProductCategory):
+        ancestors = paths[category.id]
+        category.level = len(ancestors) - 1
+        category.parent_id = ancestors[1] if len(ancestors) > 1 else None
+    return len(rows)
+
+
+def ensure_category_closure(db: Session):
+    """
+    Пересобирает таблицу замыкания, если в ней нет строк для части
+    категорий (например, база создана через create_all, а категории
+    добавлены в обход функций этого модуля). Без этих строк фильтры
+    и свертка по категориям молча отбрасывают продукты.
+
+    Returns:
+        bool: Была ли таблица пересобрана.
+    """
+    missing = db.scalar(
+        select(func.count()).select_from(ProductCategory).where(
+            ProductCategory.id.notin_(
+                select(category_closure.c.descendant_id).where(category_closure.c.depth == 0)
+            )
+        )
+    )
+    if not missing:
+        return False
+    rebuild_category_closure(db)
+    return True
+
+
+def category_tree(db: Session):
+    """
+    Возвращает категории в порядке обхода дерева: родитель, затем его
+    дочерние категории по алфавиту.
+    """
+    categories = db.query(ProductCategory).order_by(ProductCategory.name).all()
+    children = {}
+    for category in categories:
+        children.setdefault(category.parent_id, []).append(category)
+
+    ordered, stack = [], list(reversed(children.get(None, [])))
+    while stack:
+        category = stack.pop()
+        ordered.append(category)
+        stack.extend(reversed(children.get(category.id, [])))
+    return ordered
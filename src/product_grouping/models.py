@@ -1,7 +1,7 @@
 """
 Модели базы данных для группировки продуктов.
 """
-from sqlalchemy import Column, Integer, String, Table, ForeignKey
+from sqlalchemy import Column, Integer, String, Table, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from src.analytics.models import Base  # Используем ту же базовую модель
 
@@ -12,6 +12,17 @@ product_category_association = Table(
     Column('category_id', Integer, ForeignKey('product_categories.id'))
 )
 
+# Таблица замыкания дерева категорий: строка на каждую пару
+# предок-потомок (включая саму категорию с depth=0), поэтому все потомки
+# категории выбираются одним соединением по индексу (см. hierarchy.py)
+category_closure = Table(
+    'category_closure', Base.metadata,
+    Column('ancestor_id', Integer, ForeignKey('product_categories.id'), primary_key=True),
+    Column('descendant_id', Integer, ForeignKey('product_categories.id'), primary_key=True),
+    Column('depth', Integer, nullable=False),
+    Index('ix_category_closure_descendant_id', 'descendant_id', 'ancestor_id'),
+)
+
 class Product(Base):
     """
     Модель для хранения уникальных продуктов.
@@ -34,6 +45,9 @@ class ProductCategory(Base):
     __tablename__ = 'product_categories'
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True, nullable=False)
+    # Родительская категория (None — корневая) и уровень в дереве (0 — корневая)
+    parent_id = Column(Integer, ForeignKey('product_categories.id'), index=True)
+    level = Column(Integer, nullable=False, default=0, server_default='0', index=True)
 
     # Связь "многие-ко-многим" с продуктами
     products = relationship(
@@ -41,3 +55,21 @@ class ProductCategory(Base):
         secondary=product_category_association,
         back_populates="categories"
     )
+
+    # Правила автокатегоризации удаляются вместе с категорией
+    rules = relationship("CategoryRule", back_populates="category", cascade="all, delete-orphan")
+
+class CategoryRule(Base):
+    """
+    Правило автокатегоризации: продукты, название которых подходит под
+    шаблон, получают категорию. Виды шаблонов: 'keyword' — слово или фраза
+    в любом месте названия, 'prefix' — начало названия, 'regex' —
+    регулярное выражение. Регистр не учитывается.
+    """
+    __tablename__ = 'category_rules'
+    id = Column(Integer, primary_key=True, index=True)
+    category_id = Column(Integer, ForeignKey('product_categories.id'), nullable=False, index=True)
+    kind = Column(String, nullable=False)
+    pattern = Column(String, nullable=False)
+
+    category = relationship("ProductCategory", back_populates="rules")
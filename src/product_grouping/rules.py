@@ -0,0 +1,80 @@
+"""
+Сопоставление названий продуктов с правилами автокатегоризации.
+
+Все правила компилируются в одно регулярное выражение: каждое правило —
+необязательная опережающая проверка с именованной группой, поэтому один
+вызов match() для названия отмечает все подходящие правила сразу, без
+цикла по правилам для каждого продукта.
+"""
+import re
+
+# Виды шаблонов правил
+RULE_KINDS = ('keyword', 'prefix', 'regex')
+
+# Обратные ссылки по номеру в объединенном выражении указывали бы на чужие группы
+_NUMBERED_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+# Именованные группы разных правил конфликтовали бы в объединенном выражении
+_NAMED_GROUP = re.compile(r'\(\?P<')
+
+
+def _fragment(rule_id, kind, pattern):
+    group = f"__rule_{rule_id}"
+    if kind == 'keyword':
+        return f"(?=.*?(?P<{group}>{re.escape(pattern)}))?"
+    if kind == 'prefix':
+        return f"(?=(?P<{group}>{re.escape(pattern)}))?"
+    return f"(?=.*?(?P<{group}>(?:{pattern})))?"
+
+
+def validate_rule(kind, pattern):
+    """
+    Проверяет вид и шаблон правила.
+
+    Raises:
+        ValueError: Неизвестный вид, пустой шаблон или ошибка в регулярном выражении.
+    """
+    if kind not in RULE_KINDS:
+        raise ValueError(f"Unknown rule kind: {kind}. Expected one of: {', '.join(RULE_KINDS)}")
+    if not isinstance(pattern, str) or not pattern.strip():
+        raise ValueError("Rule pattern must be a non-empty string")
+    if kind == 'regex':
+        if _NUMBERED_BACKREFERENCE.search(pattern):
+            raise ValueError("Backreferences are not supported in rule patterns")
+        if _NAMED_GROUP.search(pattern):
+            raise ValueError("Named groups are not supported in rule patterns, use (?:...) instead")
+        try:
+            re.compile(pattern)
+            re.compile(_fragment(0, kind, pattern), re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}")
+
+
+class RuleMatcher:
+    """
+    Объединенный сопоставитель правил.
+
+    Args:
+        rules (list): Правила — объекты с полями id, category_id, kind, pattern.
+
+    Raises:
+        ValueError: Правила не удается объединить в одно выражение.
+    """
+
+    def __init__(self, rules):
+        self._categories = {}
+        fragments = []
+        for rule in rules:
+            self._categories[f"__rule_{rule.id}"] = rule.category_id
+            fragments.append(_fragment(rule.id, rule.kind, rule.pattern))
+        try:
+            self._regex = re.compile('^' + ''.join(fragments), re.IGNORECASE | re.DOTALL) if fragments else None
+        except re.error as e:
+            raise ValueError(f"Rules cannot be combined: {e}")
+
+    def match(self, name):
+        """Возвращает множество идентификаторов категорий для названия продукта."""
+        if self._regex is None or not name:
+            return set()
+        groups = self._regex.match(name).groupdict()
+        return {self._categories[group] for group, value in groups.items() if value is not None}
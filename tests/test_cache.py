@@ -0,0 +1,41 @@
+import unittest
+import sys
+import os
+
+import pandas as pd
+
+# Добавляем корень проекта, чтобы импортировать пакет 'src'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.dashboard.cache import frame_fingerprint
+
+class FrameFingerprintTestCase(unittest.TestCase):
+    """Тесты отпечатка данных для кэша фигур."""
+
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'category_name': ['Курсы', 'Фестивали'],
+            'total_revenue': [1500.0, 320.5],
+        })
+
+    def test_equal_frames_have_equal_fingerprints(self):
+        """Тест: одинаковые данные из разных запросов дают один отпечаток."""
+        self.assertEqual(frame_fingerprint(self.df), frame_fingerprint(self.df.copy()))
+
+    def test_changes_change_fingerprint(self):
+        """Тест: изменение значения, порядка строк или имени столбца меняет отпечаток."""
+        changed_value = self.df.copy()
+        changed_value.loc[1, 'total_revenue'] = 320.6
+        reordered = self.df.iloc[::-1].reset_index(drop=True)
+        renamed = self.df.rename(columns={'total_revenue': 'revenue'})
+
+        fingerprints = {frame_fingerprint(df) for df in (self.df, changed_value, reordered, renamed)}
+        self.assertEqual(len(fingerprints), 4)
+
+    def test_unhashable_values(self):
+        """Тест: отпечаток строится и для столбцов со списками."""
+        df = pd.DataFrame({'products': [['A', 'B'], ['C']]})
+        self.assertEqual(frame_fingerprint(df), frame_fingerprint(df.copy()))
+
+if __name__ == '__main__':
+    unittest.main()
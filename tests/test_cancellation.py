@@ -0,0 +1,95 @@
+import unittest
+import sys
+import os
+import threading
+import time
+from unittest import mock
+
+from dash.exceptions import PreventUpdate
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корень проекта, чтобы импортировать пакет 'src'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.dashboard import cache
+from src.dashboard.cancellation import cancellable, interruptible, supersede
+
+# Рекурсивный запрос, который без прерывания выполняется очень долго
+COUNT_SQL = (
+    "WITH RECURSIVE numbers(x) AS (SELECT query_started() UNION ALL "
+    "SELECT x + 1 FROM numbers WHERE x < :limit) SELECT count(*) FROM numbers"
+)
+
+class CancellationTestCase(unittest.TestCase):
+    """Тесты прерывания запросов вытесненных вызовов callback'ов."""
+
+    def setUp(self):
+        patcher = mock.patch.object(cache, 'get_cache', return_value=cache._MemoryCache(100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.started = threading.Event()
+        self.engine = create_engine("sqlite://")
+
+        @event.listens_for(self.engine, 'connect')
+        def register_function(dbapi_connection, connection_record):
+            dbapi_connection.create_function('query_started', 0, self._query_started)
+
+        self.Session = sessionmaker(bind=self.engine)
+
+    def _query_started(self):
+        self.started.set()
+        return 1
+
+    def _count_callback(self):
+        @cancellable
+        def count_numbers(limit):
+            db = self.Session()
+            try:
+                with interruptible(db):
+                    return db.execute(text(COUNT_SQL), {'limit': limit}).scalar()
+            finally:
+                db.close()
+        return count_numbers
+
+    def _run_in_thread(self, limit, session_id):
+        outcome = {}
+
+        def run():
+            try:
+                outcome['result'] = self._count_callback()(limit, session_id)
+            except PreventUpdate:
+                outcome['prevented'] = True
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread, outcome
+
+    def test_superseded_call_interrupts_running_query(self):
+        """Тест: новый вызов в той же сессии прерывает выполняющийся запрос, callback не обновляет вывод."""
+        thread, outcome = self._run_in_thread(10 ** 10, 'session-1')
+        self.assertTrue(self.started.wait(5))
+        started_at = time.monotonic()
+        with supersede('session-1', 'count_numbers'):
+            pass
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive(), "запрос не прерван")
+        self.assertEqual(outcome, {'prevented': True})
+        self.assertLess(time.monotonic() - started_at, 2)
+
+    def test_not_superseded_call_completes(self):
+        """Тест: вызов, который никто не вытеснил, получает результат запроса."""
+        thread, outcome = self._run_in_thread(300000, 'session-1')
+        self.assertTrue(self.started.wait(5))
+        # Вызов того же callback'а в другой сессии не мешает запросу
+        with supersede('session-2', 'count_numbers'):
+            pass
+        thread.join(30)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(outcome, {'result': 300000})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import unittest
+import io
+import sys
+import os
+import tempfile
+import zipfile
+from datetime import date, datetime
+from unittest import mock
+
+import openpyxl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import create_engine, text
+
+# Добавляем корень проекта, чтобы импортировать пакет 'src'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.data_export import archive_cache, columnar, core
+
+class DataExportTestCase(unittest.TestCase):
+    """Тесты потоковой выгрузки таблиц."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'export.db')}")
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE TABLE orders (id VARCHAR PRIMARY KEY, content TEXT, creation_date DATETIME, updated_at DATETIME)"))
+            connection.execute(text("CREATE TABLE empty_table (id INTEGER PRIMARY KEY, name VARCHAR)"))
+            for i in range(25):
+                connection.execute(
+                    text("INSERT INTO orders VALUES (:id, :content, :date, :updated_at)"),
+                    {'id': str(i), 'content': f"Продукт {i}\x01", 'date': f"2024-01-{i + 1:02d} 10:00:00.000000",
+                     # Первые 20 заказов изменены импортом 1 февраля, остальные — 1 марта
+                     'updated_at': f"2024-0{2 if i < 20 else 3}-01 00:00:00.000000"}
+                )
+        for name, value in (('engine', self.engine), ('EXPORT_DIR', self.tmp_dir.name), ('EXPORT_WORKERS', 1)):
+            patcher = mock.patch.object(core, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _archive(self, fmt):
+        with mock.patch.object(core, 'EXPORT_CHUNK_ROWS', 10):
+            chunks = list(core.stream_export_archive(fmt, timestamp='ts'))
+        return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+    def _csv_rows(self, archive, member_name):
+        return archive.read(member_name).decode('utf-8-sig').splitlines()[1:]
+
+    def test_csv_archive(self):
+        """Тест: CSV-архив содержит все таблицы, все строки и заголовки."""
+        archive = self._archive('csv')
+        self.assertEqual(sorted(archive.namelist()), ['empty_table_ts.csv', 'orders_ts.csv'])
+        lines = archive.read('orders_ts.csv').decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], 'id,content,creation_date,updated_at')
+        self.assertEqual(len(lines), 26)
+        self.assertEqual(lines[1], '0,Продукт 0\x01,2024-01-01 10:00:00,2024-02-01 00:00:00')
+        self.assertEqual(archive.read('empty_table_ts.csv').decode('utf-8-sig').strip(), 'id,name')
+
+    def test_xlsx_sheets_split_at_row_limit(self):
+        """Тест: таблица больше лимита строк листа продолжается на следующих листах."""
+        with mock.patch.object(core, 'XLSX_MAX_ROWS', 10):
+            archive = self._archive('xlsx')
+        workbook = openpyxl.load_workbook(io.BytesIO(archive.read('orders_ts.xlsx')), read_only=True)
+        self.assertEqual(workbook.sheetnames, ['orders', 'orders_2', 'orders_3'])
+        rows = [list(sheet.values) for sheet in workbook.worksheets]
+        self.assertEqual([len(sheet_rows) for sheet_rows in rows], [11, 11, 6])
+        self.assertEqual(rows[1][0], ('id', 'content', 'creation_date', 'updated_at'))
+        # Даты сохраняются датами, управляющие символы удаляются
+        self.assertEqual(rows[0][1][1], 'Продукт 0')
+        self.assertEqual(rows[0][1][2].isoformat(), '2024-01-01T10:00:00')
+
+    def test_large_table_split_into_parts_in_process_pool(self):
+        """Тест: большая таблица строится частями в пуле процессов, строки не теряются."""
+        with mock.patch.object(core, 'EXPORT_SHARD_ROWS', 10), mock.patch.object(core, 'EXPORT_WORKERS', 2):
+            archive = self._archive('csv')
+        parts = ['orders_ts_part01.csv', 'orders_ts_part02.csv', 'orders_ts_part03.csv']
+        self.assertEqual(sorted(archive.namelist()), ['empty_table_ts.csv'] + parts)
+        rows = [row for part in parts for row in self._csv_rows(archive, part)]
+        self.assertEqual([row.split(',')[0] for row in rows], [str(i) for i in range(25)])
+
+    def test_interrupted_export_waits_for_workers(self):
+        """Тест: прерванная выгрузка дожидается воркеров и не оставляет временных файлов."""
+        shutdown = core.ProcessPoolExecutor.shutdown
+        with mock.patch.object(core, 'EXPORT_SHARD_ROWS', 5), mock.patch.object(core, 'EXPORT_WORKERS', 2), \
+                mock.patch.object(core.ProcessPoolExecutor, 'shutdown', autospec=True, side_effect=shutdown) as spy:
+            stream = core.stream_export_archive('csv', timestamp='ts')
+            next(stream)
+            stream.close()
+        spy.assert_called_once_with(mock.ANY, wait=True, cancel_futures=True)
+        self.assertEqual([f for f in os.listdir(self.tmp_dir.name) if f != 'export.db'], [])
+
+    def test_report_has_timing_per_table(self):
+        """Тест: отчет о выгрузке содержит строки и время по каждой таблице."""
+        with mock.patch.object(core, 'EXPORT_SHARD_ROWS', 10):
+            self._archive('csv')
+        report = core.get_last_export_report()
+        tables = {timing['table']: timing for timing in report['tables']}
+        self.assertEqual(set(tables), {'orders', 'empty_table'})
+        self.assertEqual((tables['orders']['rows'], tables['orders']['parts']), (25, 3))
+        self.assertGreaterEqual(tables['orders']['build_seconds'], 0)
+        # Временные файлы удалены
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)), ['export.db', 'last_export_report.json'])
+
+    def test_parquet_keeps_types_and_filters_by_period(self):
+        """Тест: Parquet сохраняет типы столбцов, период включает конечную дату."""
+        with mock.patch.object(core, 'EXPORT_CHUNK_ROWS', 10):
+            data = b''.join(columnar.stream_table('orders', 'parquet', start_date=date(2024, 1, 5), end_date=date(2024, 1, 14)))
+        table = pq.read_table(io.BytesIO(data))
+        self.assertEqual(table.schema.field('creation_date').type, pa.timestamp('us'))
+        self.assertEqual(table.column('id').to_pylist(), [str(i) for i in range(4, 14)])
+
+    def test_arrow_stream_of_empty_table(self):
+        """Тест: пустая таблица выгружается в Arrow IPC со схемой без строк."""
+        data = b''.join(columnar.stream_table('empty_table', 'arrow'))
+        table = pa.ipc.open_stream(data).read_all()
+        self.assertEqual(table.num_rows, 0)
+        self.assertEqual(table.schema.field('id').type, pa.int64())
+
+    def test_columnar_rejects_unknown_table_and_date_filter(self):
+        """Тест: неизвестная таблица и период для таблицы без даты отклоняются."""
+        with self.assertRaises(LookupError):
+            columnar.stream_table('missing')
+        with self.assertRaises(ValueError):
+            columnar.stream_table('empty_table', start_date=date(2024, 1, 1))
+
+    def test_changes_since_watermark(self):
+        """Тест: выгрузка изменений содержит только строки после since и не позже отметки."""
+        watermark = core.get_change_watermark()
+        self.assertEqual(watermark, datetime(2024, 3, 1))
+        self.assertEqual(core.get_change_tracked_tables(), ['orders'])
+
+        with mock.patch.object(core, 'EXPORT_CHUNK_ROWS', 10):
+            chunks = core.stream_export_archive('csv', timestamp='ts', changes=(datetime(2024, 2, 15), watermark))
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertEqual(archive.namelist(), ['orders_ts.csv'])
+        self.assertEqual([row.split(',')[0] for row in self._csv_rows(archive, 'orders_ts.csv')],
+                         [str(i) for i in range(20, 25)])
+
+        # С новой отметкой изменений нет
+        data = b''.join(columnar.stream_table('orders', 'parquet', changes=(watermark, watermark)))
+        self.assertEqual(pq.read_table(io.BytesIO(data)).num_rows, 0)
+        with self.assertRaises(ValueError):
+            columnar.stream_table('empty_table', changes=(None, watermark))
+
+    def test_archive_cached_after_complete_download(self):
+        """Тест: полностью отданный архив кэшируется для своего поколения данных."""
+        with mock.patch.object(archive_cache, 'get_generation', return_value=3):
+            data = b''.join(archive_cache.stream_and_cache(iter([b'ab', b'cd']), 'csv', 3))
+            self.assertEqual(data, b'abcd')
+            path = archive_cache.get_cached_archive('csv')
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'abcd')
+            self.assertIsNone(archive_cache.get_cached_archive('xlsx'))
+
+        # После изменения данных архив прежнего поколения не используется
+        with mock.patch.object(archive_cache, 'get_generation', return_value=4):
+            self.assertIsNone(archive_cache.get_cached_archive('csv'))
+
+    def test_interrupted_download_not_cached(self):
+        """Тест: прерванная загрузка не оставляет архива в кэше."""
+        with mock.patch.object(archive_cache, 'get_generation', return_value=1):
+            stream = archive_cache.stream_and_cache(iter([b'ab', b'cd']), 'csv', 1)
+            next(stream)
+            stream.close()
+            self.assertIsNone(archive_cache.get_cached_archive('csv'))
+            self.assertEqual(os.listdir(os.path.join(self.tmp_dir.name, 'archives')), [])
+
+    def test_prune_archives_by_generation_and_size(self):
+        """Тест: удаляются архивы прежних поколений и самые старые сверх лимита."""
+        os.makedirs(os.path.join(self.tmp_dir.name, 'archives'))
+        for mtime, (generation, fmt) in enumerate([(1, 'csv'), (2, 'csv'), (2, 'xlsx')]):
+            path = archive_cache.archive_path(generation, fmt)
+            with open(path, 'wb') as f:
+                f.write(b'x' * 10)
+            os.utime(path, (mtime, mtime))
+        archive_cache.prune_archives(max_bytes=15, generation=2)
+        self.assertEqual(os.listdir(os.path.join(self.tmp_dir.name, 'archives')), ['analytics_export_gen2_xlsx.zip'])
+
+    def test_unknown_format(self):
+        """Тест: неизвестный формат отклоняется."""
+        with self.assertRaises(ValueError):
+            list(core.stream_export_archive('xls'))
+
+if __name__ == '__main__':
+    unittest.main()
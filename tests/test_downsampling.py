@@ -0,0 +1,70 @@
+import unittest
+import sys
+import os
+
+# Добавляем корень проекта, чтобы импортировать пакет 'src'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+
+from src.dashboard.downsampling import bucket_by_period, downsample_line, lttb, parse_zoom
+
+class DownsamplingTestCase(unittest.TestCase):
+    """Тесты прореживания данных для графиков дашборда."""
+
+    def _daily(self, days):
+        dates = pd.date_range('2024-01-01', periods=days, freq='D')
+        return pd.DataFrame({
+            'date': dates.strftime('%Y-%m-%d'),
+            'daily_sales': np.ones(days),
+            'cumulative_sales': np.arange(1, days + 1, dtype=float),
+        })
+
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        """Тест: LTTB сохраняет первую, последнюю точки и выбросы."""
+        y = np.zeros(1000)
+        y[437] = 100
+        indices = lttb(np.arange(1000), y, 50)
+        self.assertEqual(len(indices), 50)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 999)
+        self.assertIn(437, indices)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_downsample_line_within_budget(self):
+        """Тест: короткий ряд не прореживается."""
+        df = self._daily(100)
+        result, label = downsample_line(df, 'date', 'daily_sales', max_points=500)
+        self.assertIs(result, df)
+        self.assertIsNone(label)
+
+        result, label = downsample_line(self._daily(1000), 'date', 'daily_sales', max_points=200)
+        self.assertEqual(len(result), 200)
+        self.assertEqual(label, "LTTB: 200 из 1000 точек")
+
+    def test_bucket_by_period(self):
+        """Тест агрегации по неделям и месяцам с сохранением накопительного итога."""
+        df = self._daily(364)
+        weekly, label = bucket_by_period(df, 'date', {'daily_sales': 'sum', 'cumulative_sales': 'last'}, max_points=100)
+        self.assertEqual(label, "по неделям")
+        self.assertEqual(weekly['daily_sales'].sum(), 364)
+        self.assertEqual(weekly['cumulative_sales'].iloc[-1], 364)
+
+        monthly, label = bucket_by_period(df, 'date', {'daily_sales': 'sum', 'cumulative_sales': 'last'}, max_points=20)
+        self.assertEqual(label, "по месяцам")
+        self.assertEqual(len(monthly), 12)
+        self.assertEqual(monthly['date'].iloc[0], '2024-01-01')
+
+    def test_parse_zoom(self):
+        """Тест разбора relayoutData графика."""
+        self.assertIsNone(parse_zoom(None))
+        self.assertIsNone(parse_zoom({'dragmode': 'pan'}))
+        self.assertEqual(parse_zoom({'xaxis.autorange': True}), 'reset')
+        self.assertEqual(
+            parse_zoom({'xaxis.range[0]': '2024-01-05 12:00:00', 'xaxis.range[1]': '2024-02-01'}),
+            ('2024-01-05', '2024-02-01'),
+        )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import gzip
+import sys
+import os
+import tempfile
+from unittest import mock
+
+from flask import Flask, jsonify
+
+# Добавляем корень проекта, чтобы импортировать пакет 'src'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.analytics import generation
+from src.http_cache import conditional_on_generation, init_http_cache
+
+class HttpCacheTestCase(unittest.TestCase):
+    """Тесты сжатия ответов и условных GET-запросов."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(generation, 'GENERATION_FILE', os.path.join(self.tmp_dir.name, 'generation'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.calls = []
+        app = Flask(__name__)
+        init_http_cache(app)
+
+        @app.route('/products')
+        @conditional_on_generation
+        def products():
+            self.calls.append(1)
+            return jsonify([{'name': f'Продукт {i}'} for i in range(100)])
+
+        @app.route('/small')
+        def small():
+            return jsonify({'status': 'ok'})
+
+        self.client = app.test_client()
+
+    def test_gzip_compression(self):
+        """Тест: большой JSON сжимается gzip, маленький отправляется как есть."""
+        response = self.client.get('/products', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertIn(b'\\u041f', gzip.decompress(response.data))
+
+        response = self.client.get('/small', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_no_compression_without_accept_encoding(self):
+        """Тест: клиент без поддержки сжатия получает несжатый ответ."""
+        response = self.client.get('/products', headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(len(response.get_json()), 100)
+
+    def test_not_modified_until_data_changes(self):
+        """Тест: повторный запрос с ETag получает 304 без вычисления, пока не изменились данные."""
+        first = self.client.get('/products')
+        etag = first.headers['ETag']
+        self.assertEqual(first.status_code, 200)
+
+        second = self.client.get('/products', headers={'If-None-Match': etag})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(len(self.calls), 1)
+
+        generation.bump_generation()
+        third = self.client.get('/products', headers={'If-None-Match': etag})
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third.headers['ETag'], etag)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_if_modified_since(self):
+        """Тест: Last-Modified по времени изменения данных и ответ 304 на If-Modified-Since."""
+        generation.bump_generation()
+        first = self.client.get('/products')
+        second = self.client.get('/products', headers={'If-Modified-Since': first.headers['Last-Modified']})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(len(self.calls), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корень проекта, чтобы импортировать пакет 'src'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.analytics import core as orders_core
+from src.analytics import generation, metadata
+from src.analytics.models import Base, Order, TableMetadata
+from src.contacts import core as contacts_core
+from src.contacts.models import Contact
+
+class ImportChangeTrackingTestCase(unittest.TestCase):
+    """Тесты отметки updated_at при повторном импорте."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+
+        # Общий родитель фиксирует порядок действий после импорта
+        self.calls = mock.Mock()
+        for name in ('refresh_mirror', 'bump_generation', 'get_generation', 'refresh_table_metadata'):
+            patcher = mock.patch.object(metadata, name)
+            self.calls.attach_mock(patcher.start(), name)
+            self.addCleanup(patcher.stop)
+        for module in (orders_core, contacts_core):
+            patcher = mock.patch.object(module, 'SessionLocal', self.Session)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _write_excel(self, column_mapping, rows):
+        # Числовые столбцы с пропусками pandas прочитает как float (5001.0)
+        df = pd.DataFrame({column: [row.get(field) for row in rows] for column, field in column_mapping.items()})
+        path = os.path.join(self.tmp_dir.name, f"import_{len(os.listdir(self.tmp_dir.name))}.xlsx")
+        df.to_excel(path, index=False)
+        return path
+
+    def _updated_at(self, model):
+        db = self.Session()
+        try:
+            return {row.id: row.updated_at for row in db.query(model).all()}
+        finally:
+            db.close()
+
+    def _assert_reimport_untouched(self, import_file, column_mapping, model, rows, changed_row):
+        path = self._write_excel(column_mapping, rows)
+        self.assertEqual(import_file(path)["status"], "success")
+        first = self._updated_at(model)
+        # Сводка table_metadata сохраняется до смены поколения данных
+        names = [call[0] for call in self.calls.mock_calls]
+        self.assertLess(names.index('refresh_table_metadata'), names.index('bump_generation'))
+        self.assertEqual(len(first), 2)
+
+        self.assertEqual(import_file(path)["status"], "success")
+        self.assertEqual(self._updated_at(model), first)
+
+        # Измененная строка получает новую отметку, остальные — нет
+        changed = self._write_excel(column_mapping, [rows[0], changed_row])
+        self.assertEqual(import_file(changed)["status"], "success")
+        third = self._updated_at(model)
+        changed_ids = [row_id for row_id in third if third[row_id] != first[row_id]]
+        self.assertEqual(len(changed_ids), 1)
+
+    def test_orders_reimport_keeps_updated_at(self):
+        """Тест: повторный импорт тех же заказов не меняет updated_at."""
+        rows = [
+            {'id': 1001, 'number': 5001, 'content': 'Курс', 'income': 1500, 'partner_id': 77,
+             'creation_date': '2024-01-05 10:00:00'},
+            {'id': 1002, 'number': None, 'content': 'Тренинг', 'income': 99.5, 'partner_id': None,
+             'creation_date': '2024-01-06 11:30:00'},
+        ]
+        changed_row = dict(rows[1], income=120.0)
+        self._assert_reimport_untouched(orders_core.import_orders_from_excel, orders_core.COLUMN_MAPPING,
+                                        Order, rows, changed_row)
+
+    def test_contacts_reimport_keeps_updated_at(self):
+        """Тест: повторный импорт тех же контактов не меняет updated_at."""
+        rows = [
+            {'id': 2001, 'full_name': 'Иван Иванов', 'phone': 79001234567, 'partner_id': 77, 'total_paid': 1500},
+            {'id': 2002, 'full_name': 'Анна', 'phone': None, 'partner_id': None, 'tg_id': 123456},
+        ]
+        changed_row = dict(rows[1], full_name='Анна Петрова')
+        self._assert_reimport_untouched(contacts_core.import_contacts_from_excel, contacts_core.COLUMN_MAPPING,
+                                        Contact, rows, changed_row)
+
+class TableMetadataTestCase(unittest.TestCase):
+    """Тесты чтения сводки по таблице."""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.Session = sessionmaker(bind=engine)
+        for target, name, value in (
+            (metadata, 'SessionLocal', self.Session),
+            (generation, 'GENERATION_FILE', os.path.join(tmp_dir.name, 'generation')),
+        ):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        db = self.Session()
+        db.add_all([
+            Order(id=1, creation_date=pd.Timestamp('2024-01-05').to_pydatetime()),
+            Order(id=2, creation_date=pd.Timestamp('2024-02-10').to_pydatetime()),
+        ])
+        db.commit()
+        db.close()
+
+    def test_missing_metadata_read_without_new_generation(self):
+        """Тест: отсутствующая сводка вычисляется при чтении без записи и смены поколения."""
+        result = metadata.get_table_metadata('orders')
+        self.assertEqual(result['row_count'], 2)
+        self.assertEqual(result['max_date'], pd.Timestamp('2024-02-10').to_pydatetime())
+        self.assertEqual(generation.get_generation(), 0)
+        db = self.Session()
+        try:
+            self.assertIsNone(db.get(TableMetadata, 'orders'))
+        finally:
+            db.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import sys
+import os
+
+# Добавляем корень проекта, чтобы импортировать пакет 'src'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import plotly.graph_objects as go
+from dash import no_update
+
+from src.dashboard.patching import figure_shape, is_patch, patch_figure
+
+class PatchingTestCase(unittest.TestCase):
+    """Тесты частичного обновления графиков дашборда."""
+
+    def _figure(self, dates, values, title):
+        fig = go.Figure()
+        fig.add_trace(go.Bar(x=dates, y=values, name='Дневной доход'))
+        fig.add_trace(go.Scatter(x=dates, y=values, name='Накопительный доход', yaxis='y2'))
+        fig.update_layout(title=title, yaxis2=dict(overlaying='y', side='right'))
+        return fig
+
+    def test_figure_shape(self):
+        """Тест формы фигуры: типы трасс и оси; у заглушки формы нет."""
+        fig = self._figure(['2024-01-01'], [1], "Доход")
+        self.assertEqual(figure_shape(fig), 'bar:x:y|scatter:x:y2')
+        self.assertIsNone(figure_shape({'layout': {'annotations': [{'text': "Нет данных"}]}}))
+
+    def test_full_figure_when_shape_differs(self):
+        """Тест: при другой форме отправляется полная фигура и новая форма."""
+        fig = self._figure(['2024-01-01'], [1], "Доход")
+        result, shape = patch_figure(fig, None)
+        self.assertIs(result, fig)
+        self.assertEqual(shape, 'bar:x:y|scatter:x:y2')
+
+        placeholder = {'layout': {}}
+        result, shape = patch_figure(placeholder, None)
+        self.assertIs(result, placeholder)
+        self.assertIsNone(shape)
+
+    def test_patch_when_shape_matches(self):
+        """Тест: при той же форме отправляются только данные трасс и заголовок."""
+        fig = self._figure(['2024-01-01', '2024-01-02'], [1, 2], "Новый заголовок")
+        result, shape = patch_figure(fig, 'bar:x:y|scatter:x:y2')
+        self.assertTrue(is_patch(result))
+        self.assertIs(shape, no_update)
+
+        operations = {
+            tuple(operation['location']): operation['params'].get('value')
+            for operation in result.to_plotly_json()['operations']
+        }
+        self.assertEqual(list(operations[('data', 0, 'x')]), ['2024-01-01', '2024-01-02'])
+        self.assertEqual(list(operations[('data', 1, 'y')]), [1, 2])
+        self.assertEqual(operations[('layout', 'title', 'text')], "Новый заголовок")
+        self.assertTrue(operations[('layout', 'xaxis', 'autorange')])
+        self.assertNotIn(('layout', 'yaxis2'), operations)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,379 @@
+import unittest
+import sys
+import os
+import tempfile
+
+from unittest import mock
+
+from flask import Flask
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корень проекта, чтобы импортировать пакет 'src'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.analytics import generation
+from src.analytics import models as analytics_models
+from src.analytics.models import Base, Order
+from src.product_grouping import api
+from src.product_grouping import core
+from src.product_grouping.core import (
+    apply_rules, bulk_assign_categories, get_products_page, search_products, sync_products_from_orders,
+)
+from src.product_grouping.hierarchy import (
+    category_tree, create_category, move_category, rebuild_category_closure, remove_category,
+    rollup_categories, subtree_ids,
+)
+from src.product_grouping.models import (
+    CategoryRule, Product, ProductCategory, category_closure, product_category_association,
+)
+from src.product_grouping.rules import RuleMatcher, validate_rule
+
+class ProductsPageTestCase(unittest.TestCase):
+    """Тесты постраничного списка продуктов."""
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.addCleanup(self.db.close)
+
+        categories = [ProductCategory(name=f"Категория {i}") for i in range(3)]
+        self.db.add_all(categories)
+        for i in range(30):
+            product = Product(name=f"{'Астрология' if i % 3 == 0 else 'Курс'} {i:02d}")
+            if i % 2 == 0:
+                product.categories = categories[:2]
+            self.db.add(product)
+        self.db.commit()
+        self.db.expire_all()
+
+        core._search_cache.clear()
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._count_statement)
+
+    def _count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _all_pages(self, **kwargs):
+        names, cursor = [], None
+        while True:
+            items, cursor = get_products_page(self.db, after=cursor, limit=7, **kwargs)
+            names.extend(item['name'] for item in items)
+            if cursor is None:
+                return names
+
+    def test_pages_cover_all_products_in_order(self):
+        """Тест: страницы по курсору выдают все продукты по порядку без повторов."""
+        names = self._all_pages()
+        self.assertEqual(len(names), 30)
+        self.assertEqual(names, sorted(names))
+
+    def test_categories_loaded_in_constant_queries(self):
+        """Тест: категории загружаются без отдельного запроса на каждый продукт."""
+        items, cursor = get_products_page(self.db, limit=20)
+        self.assertEqual(len(items), 20)
+        self.assertIsNotNone(cursor)
+        self.assertCountEqual(items[0]['categories'], ['Категория 0', 'Категория 1'])
+        self.assertEqual(len(self.statements), 3)
+
+    def test_filters(self):
+        """Тест: фильтр по названию без учета регистра и продукты без категорий."""
+        self.assertEqual(len(self._all_pages(query='аСТРО')), 10)
+        uncategorized = self._all_pages(uncategorized=True)
+        self.assertEqual(len(uncategorized), 15)
+        self.assertIn('Курс 01', uncategorized)
+        self.assertEqual(self._all_pages(query='курс 0', uncategorized=True), ['Курс 01', 'Курс 05', 'Курс 07'])
+
+    def _categories(self, product_id):
+        association = product_category_association
+        rows = self.db.execute(
+            association.select().where(association.c.product_id == product_id)
+        ).all()
+        return sorted(row.category_id for row in rows)
+
+    def test_bulk_assign_add_remove(self):
+        """Тест: замена, добавление и удаление категорий применяются по порядку."""
+        result = bulk_assign_categories(
+            self.db,
+            assign=[{"product_id": 1, "category_ids": [3]}, {"product_id": 2, "category_ids": []}],
+            add=[{"product_ids": [1, 2, 3], "category_ids": [2]}],
+            remove=[{"product_ids": [3], "category_ids": [1]}],
+        )
+        self.db.commit()
+        self.assertEqual(self._categories(1), [2, 3])
+        self.assertEqual(self._categories(2), [2])
+        self.assertEqual(self._categories(3), [2])
+        self.assertEqual(result, {"updated_products": 3, "added": 2, "removed": 2})
+
+    def test_bulk_assign_set_based(self):
+        """Тест: число запросов не зависит от числа продуктов, без изменений — без записи."""
+        product_ids = list(range(1, 31))
+        bulk_assign_categories(self.db, add=[{"product_ids": product_ids, "category_ids": [3]}])
+        # Проверка идентификаторов (2), чтение связей, DELETE, пакетная вставка
+        self.assertEqual(len(self.statements), 5)
+
+        self.statements.clear()
+        result = bulk_assign_categories(self.db, add=[{"product_ids": product_ids, "category_ids": [3]}])
+        self.assertEqual(result["updated_products"], 0)
+        self.assertEqual(len(self.statements), 3)
+
+    def test_bulk_assign_rejects_unknown_ids(self):
+        """Тест: неизвестные продукты и категории и неверный формат отклоняются."""
+        with self.assertRaises(ValueError):
+            bulk_assign_categories(self.db, add=[{"product_ids": [1, 999], "category_ids": [1]}])
+        with self.assertRaises(ValueError):
+            bulk_assign_categories(self.db, assign=[{"product_id": 1, "category_ids": [42]}])
+        with self.assertRaises(ValueError):
+            bulk_assign_categories(self.db, remove=[{"product_ids": "1", "category_ids": [1]}])
+
+    def test_apply_rules_dry_run_and_apply(self):
+        """Тест: предпросмотр ничего не меняет, применение добавляет только новые категории."""
+        self.db.add_all([
+            CategoryRule(category_id=3, kind='prefix', pattern='астро'),
+            CategoryRule(category_id=1, kind='keyword', pattern='РС 0'),
+        ])
+        self.db.commit()
+
+        preview = apply_rules(self.db, dry_run=True)
+        # 10 «Астрология» получают категорию 3, «Курс 01»…«Курс 08» без категории 1 — категорию 1
+        self.assertEqual(preview["products"], 13)
+        self.assertEqual(self._categories(1), [1, 2])
+
+        result = apply_rules(self.db)
+        self.db.commit()
+        self.assertEqual(result["assignments"], preview["assignments"])
+        self.assertEqual(self._categories(1), [1, 2, 3])
+        self.assertEqual(self._categories(2), [1])
+        self.assertEqual(apply_rules(self.db, dry_run=True)["products"], 0)
+
+    def test_sync_not_blocked_by_broken_rules(self):
+        """Тест: правила, которые не объединяются, не мешают синхронизации продуктов."""
+        # Правила сохранены в обход проверки (например, до ее появления)
+        self.db.add_all([
+            CategoryRule(category_id=1, kind='regex', pattern=r'(?P<y>\d{4})'),
+            CategoryRule(category_id=2, kind='regex', pattern=r'merch (?P<y>\d{4})'),
+            Order(id='1', content='Мерч 2025'),
+        ])
+        self.db.commit()
+
+        with self.assertRaises(ValueError):
+            apply_rules(self.db)
+        with mock.patch.object(core, 'SessionLocal', sessionmaker(bind=self.engine)), \
+                mock.patch.object(core, 'on_catalog_changed'):
+            result = sync_products_from_orders()
+        self.assertEqual(result, {"status": "success", "added": 1, "categorized": 0})
+        self.db.expire_all()
+        self.assertIsNotNone(self.db.query(Product).filter(Product.name == 'Мерч 2025').first())
+
+    def test_search_window(self):
+        """Тест: поиск возвращает общее число и только окно списка с категориями."""
+        result = search_products(self.db, query='курс', offset=5, limit=3)
+        self.assertEqual(result['total'], 20)
+        self.assertEqual([item['name'] for item in result['items']], ['Курс 08', 'Курс 10', 'Курс 11'])
+        self.assertEqual(result['items'][1]['category_ids'], [1, 2])
+        self.assertEqual(search_products(self.db, uncategorized=True, offset=14)['total'], 15)
+        self.assertEqual(len(search_products(self.db, uncategorized=True, offset=14)['items']), 1)
+
+    def test_search_list_cached_until_data_changes(self):
+        """Тест: список для фильтра строится один раз на поколение данных."""
+        with mock.patch.object(core, 'get_generation', return_value=1):
+            search_products(self.db, query='курс', limit=5)
+            self.statements.clear()
+            search_products(self.db, query='курс', offset=5, limit=5)
+            # Только загрузка окна: продукты и их категории
+            self.assertEqual(len(self.statements), 2)
+
+            self.db.add(Product(name='Курс 99'))
+            self.db.commit()
+            self.assertEqual(search_products(self.db, query='курс')['total'], 20)
+        with mock.patch.object(core, 'get_generation', return_value=2):
+            self.assertEqual(search_products(self.db, query='курс')['total'], 21)
+
+class RuleMatcherTestCase(unittest.TestCase):
+    """Тесты объединенного сопоставителя правил."""
+
+    def _rule(self, rule_id, category_id, kind, pattern):
+        return CategoryRule(id=rule_id, category_id=category_id, kind=kind, pattern=pattern)
+
+    def test_all_matching_rules_reported(self):
+        """Тест: одно название может подходить под несколько правил разных видов."""
+        matcher = RuleMatcher([
+            self._rule(1, 10, 'keyword', 'таро'),
+            self._rule(2, 20, 'prefix', 'Курс'),
+            self._rule(3, 30, 'regex', r'\d{4}$'),
+            self._rule(4, 40, 'prefix', 'Таро'),
+        ])
+        self.assertEqual(matcher.match('курс «ТАРО» 2024'), {10, 20, 30})
+        self.assertEqual(matcher.match('Таро (повтор)'), {10, 40})
+        self.assertEqual(matcher.match('Консультация'), set())
+        self.assertEqual(RuleMatcher([]).match('Курс'), set())
+
+    def test_validate_rule(self):
+        """Тест: неверные правила отклоняются."""
+        validate_rule('regex', r'(курс|тренинг)\s+\d+')
+        for kind, pattern in [('glob', 'курс*'), ('keyword', '  '), ('regex', '(курс'), ('regex', r'(а)\1'),
+                              ('regex', r'(?P<y>\d{4})')]:
+            with self.assertRaises(ValueError):
+                validate_rule(kind, pattern)
+
+    def test_shared_group_names_rejected(self):
+        """Тест: правила с одинаковыми именованными группами не проходят проверку и не объединяются."""
+        for pattern in (r'(?P<y>\d{4})', r'merch (?P<y>\d{4})'):
+            with self.assertRaises(ValueError):
+                validate_rule('regex', pattern)
+        with self.assertRaises(ValueError):
+            RuleMatcher([self._rule(1, 10, 'regex', r'(?P<y>\d{4})'), self._rule(2, 20, 'regex', r'merch (?P<y>\d{4})')])
+
+class RulesApiTestCase(unittest.TestCase):
+    """Тесты API правил автокатегоризации."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        db.add(ProductCategory(name='Мерч'))
+        db.commit()
+        db.close()
+
+        for target, name, value in (
+            (api, 'SessionLocal', Session),
+            (generation, 'GENERATION_FILE', os.path.join(self.tmp_dir.name, 'generation')),
+        ):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        app = Flask(__name__)
+        app.register_blueprint(api.product_grouping_api)
+        self.client = app.test_client()
+
+    def test_rules_changes_bump_generation(self):
+        """Тест: создание и удаление правила меняют поколение данных (кэш выгрузки)."""
+        response = self.client.post('/rules', json={'category_id': 1, 'kind': 'keyword', 'pattern': 'мерч'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(generation.get_generation(), 1)
+        self.assertEqual(self.client.delete(f"/rules/{response.get_json()['id']}").status_code, 200)
+        self.assertEqual(generation.get_generation(), 2)
+
+class CategoryHierarchyTestCase(unittest.TestCase):
+    """Тесты дерева категорий на таблице замыкания."""
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.addCleanup(self.db.close)
+
+        # Фестиваль > Фестиваль 2025 > Мерч 2025; Курсы
+        self.festival = create_category(self.db, 'Фестиваль')
+        self.festival_2025 = create_category(self.db, 'Фестиваль 2025', self.festival.id)
+        self.merch = create_category(self.db, 'Мерч 2025', self.festival_2025.id)
+        self.courses = create_category(self.db, 'Курсы')
+        self.db.commit()
+
+    def _closure(self):
+        rows = self.db.execute(category_closure.select()).all()
+        return sorted((row.ancestor_id, row.descendant_id, row.depth) for row in rows)
+
+    def _subtree(self, category_ids):
+        return sorted(self.db.execute(subtree_ids(category_ids)).scalars())
+
+    def test_create_builds_closure(self):
+        """Тест: новая категория получает строки для всех предков и уровень."""
+        festival, festival_2025, merch = self.festival.id, self.festival_2025.id, self.merch.id
+        self.assertEqual(self._subtree(festival), [festival, festival_2025, merch])
+        self.assertEqual(self._subtree([festival_2025, self.courses.id]), [festival_2025, merch, self.courses.id])
+        self.assertIn((festival, merch, 2), self._closure())
+        self.assertEqual(self.merch.level, 2)
+        self.assertEqual([c.name for c in category_tree(self.db)], ['Курсы', 'Фестиваль', 'Фестиваль 2025', 'Мерч 2025'])
+        with self.assertRaises(ValueError):
+            create_category(self.db, 'Сирота', 999)
+
+    def test_move_subtree(self):
+        """Тест: ветка переносится с потомками, перенос в свою ветку отклоняется."""
+        move_category(self.db, self.festival_2025, self.courses.id)
+        self.db.commit()
+        self.assertEqual(self._subtree(self.festival.id), [self.festival.id])
+        self.assertEqual(self._subtree(self.courses.id), sorted([self.courses.id, self.festival_2025.id, self.merch.id]))
+        self.assertEqual((self.festival_2025.level, self.merch.level), (1, 2))
+
+        move_category(self.db, self.festival_2025, None)
+        self.db.commit()
+        self.assertEqual((self.festival_2025.level, self.merch.level), (0, 1))
+        self.assertIsNone(self.festival_2025.parent_id)
+
+        for target in (self.festival_2025.id, self.merch.id):
+            with self.assertRaises(ValueError):
+                move_category(self.db, self.festival_2025, target)
+
+    def test_remove_reparents_children(self):
+        """Тест: дочерние категории удаленной переходят к ее родителю."""
+        remove_category(self.db, self.festival_2025)
+        self.db.commit()
+        self.assertEqual(self.merch.parent_id, self.festival.id)
+        self.assertEqual(self.merch.level, 1)
+        self.assertIn((self.festival.id, self.merch.id, 1), self._closure())
+        self.assertIsNone(self.db.get(ProductCategory, self.festival_2025.id))
+
+    def test_rebuild_matches_incremental(self):
+        """Тест: пересборка по parent_id дает ту же таблицу замыкания."""
+        move_category(self.db, self.festival_2025, self.courses.id)
+        self.db.commit()
+        incremental = self._closure()
+        rebuild_category_closure(self.db)
+        self.db.commit()
+        self.assertEqual(self._closure(), incremental)
+
+    def test_init_db_fills_empty_closure(self):
+        """Тест: init_db заполняет таблицу замыкания для существующих категорий."""
+        expected = self._closure()
+        self.db.execute(category_closure.delete())
+        self.db.commit()
+        with mock.patch.object(analytics_models, 'engine', self.engine), \
+                mock.patch.object(core, 'SessionLocal', sessionmaker(bind=self.engine)), \
+                mock.patch.object(core, 'on_catalog_changed') as changed:
+            analytics_models.init_db()
+            self.assertEqual(self._closure(), expected)
+            self.assertEqual(self._subtree(self.festival.id), [self.festival.id, self.festival_2025.id, self.merch.id])
+            changed.assert_called_once()
+
+            # Полная таблица не пересобирается
+            analytics_models.init_db()
+            changed.assert_called_once()
+
+    def test_rollup_counts_product_once(self):
+        """Тест: свертка к уровню учитывает продукт в предке один раз."""
+        self.db.add_all([
+            Product(name='Футболка', categories=[self.merch, self.festival]),
+            Product(name='Билет', categories=[self.festival_2025]),
+            Product(name='Курс таро', categories=[self.courses]),
+        ])
+        self.db.commit()
+
+        def rollup(**kwargs):
+            subquery = rollup_categories(**kwargs)
+            rows = self.db.execute(
+                select(Product.name, ProductCategory.name)
+                .join(subquery, subquery.c.product_id == Product.id)
+                .join(ProductCategory, ProductCategory.id == subquery.c.category_id)
+            ).all()
+            return sorted(rows)
+
+        self.assertEqual(rollup(level=0), [
+            ('Билет', 'Фестиваль'), ('Курс таро', 'Курсы'), ('Футболка', 'Фестиваль'),
+        ])
+        self.assertEqual(rollup(level=1), [
+            ('Билет', 'Фестиваль 2025'), ('Курс таро', 'Курсы'),
+            ('Футболка', 'Фестиваль'), ('Футболка', 'Фестиваль 2025'),
+        ])
+        self.assertEqual(rollup(level=0, category_ids=[self.festival_2025.id]), [
+            ('Билет', 'Фестиваль'), ('Футболка', 'Фестиваль'),
+        ])
+        self.assertEqual(rollup(exclude_category_ids=[self.festival.id]), [('Курс таро', 'Курсы')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import sys
+import os
+
+# Добавляем корень проекта, чтобы импортировать пакет 'src'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.dashboard.product_index import ProductIndex
+
+class ProductIndexTestCase(unittest.TestCase):
+    """Тесты поиска продуктов для выпадающих списков."""
+
+    def setUp(self):
+        self.index = ProductIndex([
+            ('Астрология для начинающих', 1),
+            ('Курс "Астрология-2"', 1),
+            ('Курс "Астрология-2"', 2),
+            ('Натальная карта', 2),
+            ('Фестиваль АстроФест', 3),
+            ('Консультация', None),
+        ])
+
+    def test_ranking(self):
+        """Тест: сначала начало названия, затем начало слова, затем подстрока."""
+        self.assertEqual(
+            self.index.search('астро'),
+            ['Астрология для начинающих', 'Курс "Астрология-2"', 'Фестиваль АстроФест']
+        )
+        self.assertEqual(self.index.search('фест'), ['Фестиваль АстроФест'])
+        self.assertEqual(self.index.search('ЛОГИЯ'), ['Астрология для начинающих', 'Курс "Астрология-2"'])
+
+    def test_category_filter(self):
+        """Тест: поиск только по продуктам выбранных категорий."""
+        self.assertEqual(self.index.search('астро', 2), ['Курс "Астрология-2"'])
+        self.assertEqual(self.index.search('', [2, 3]), ['Курс "Астрология-2"', 'Натальная карта', 'Фестиваль АстроФест'])
+
+    def test_limit_and_empty_query(self):
+        """Тест: пустой запрос возвращает первые продукты по алфавиту, не больше limit."""
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.index.search('', limit=2), ['Астрология для начинающих', 'Консультация'])
+        self.assertEqual(self.index.search('а', limit=1), ['Астрология для начинающих'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import unittest
+import sys
+import os
+import hashlib
+import multiprocessing
+import tempfile
+import threading
+import time
+
+# Добавляем корень проекта, чтобы импортировать пакет 'src'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.dashboard.singleflight import SingleFlight
+
+_MISSING = object()
+
+class _Cancelled(Exception):
+    """Вычисление прервано (как QueryCancelled в дашборде)."""
+
+class SingleFlightTestCase(unittest.TestCase):
+    """Тесты объединения одинаковых одновременных запросов."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.counters = {}
+        self.flight = SingleFlight(self.tmp_dir.name, incr=self._incr)
+        self.store = {}
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _incr(self, name):
+        self.counters[name] = self.counters.get(name, 0) + 1
+
+    def _run(self, key, compute):
+        return self.flight.do(key, compute, lambda: list(self.store.get(key, [])) or _MISSING, missing=_MISSING)
+
+    def test_concurrent_calls_share_one_computation(self):
+        """Тест: одновременные вызовы с одним ключом выполняют вычисление один раз."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            self.store['sales'] = [1, 2, 3]
+            return [1, 2, 3]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self._run('sales', compute))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [[1, 2, 3]] * 5)
+        self.assertEqual(self.counters, {'computed': 1, 'coalesced_in_process': 4})
+        # Каждый вызов получает собственный объект
+        self.assertEqual(len({id(result) for result in results}), 5)
+
+    def test_result_from_another_process(self):
+        """Тест: результат, сохраненный другим воркером, не вычисляется заново."""
+        self.store['sales'] = [4, 5]
+        self.assertEqual(self._run('sales', lambda: self.fail("не должно вычисляться")), [4, 5])
+        self.assertEqual(self.counters, {'coalesced_across_processes': 1})
+
+    def test_error_is_shared(self):
+        """Тест: ошибка вычисления передается всем ожидающим вызовам."""
+        def compute():
+            time.sleep(0.1)
+            raise ValueError("ошибка запроса")
+
+        errors = []
+
+        def run():
+            try:
+                self._run('sales', compute)
+            except ValueError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=run) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, ["ошибка запроса"] * 3)
+
+    def test_waiting_calls_retry_after_cancelled_leader(self):
+        """Тест: если вычисление ведущего вызова прервано, ожидавшие вызовы выполняют его сами."""
+        flight = SingleFlight(self.tmp_dir.name, retry_on=(_Cancelled,))
+        leader_started = threading.Event()
+
+        def cancelled():
+            leader_started.set()
+            time.sleep(0.1)
+            raise _Cancelled
+
+        def compute():
+            self.store['sales'] = [7]
+            return [7]
+
+        results, errors = [], []
+
+        def run_leader():
+            try:
+                flight.do('sales', cancelled, lambda: self.store.get('sales', _MISSING), missing=_MISSING)
+            except _Cancelled:
+                errors.append('cancelled')
+
+        leader = threading.Thread(target=run_leader)
+        leader.start()
+        leader_started.wait()
+        results.append(flight.do('sales', compute, lambda: self.store.get('sales', _MISSING), missing=_MISSING))
+        leader.join()
+
+        self.assertEqual(errors, ['cancelled'])
+        self.assertEqual(results, [[7]])
+
+    def test_nested_keys_do_not_deadlock(self):
+        """Тест: вычисление фигуры запрашивает вложенный ключ с тем же хэшем по модулю 256."""
+        def stripe(key):
+            return int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16) % 256
+
+        # Ключи попадали в один файл прежних 256 полос блокировок
+        inner_key = 'get_sales_by_day'
+        outer_key = next(f'figure:{i}' for i in range(100000) if stripe(f'figure:{i}') == stripe(inner_key))
+
+        def compute_inner():
+            self.store[inner_key] = [1]
+            return [1]
+
+        def compute_outer():
+            value = self._run(inner_key, compute_inner) + [2]
+            self.store[outer_key] = value
+            return value
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self._run(outer_key, compute_outer)), daemon=True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive(), "вложенный вызов заблокирован")
+        self.assertEqual(results, [[1, 2]])
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "нужен fork")
+    def test_same_key_locked_across_processes(self):
+        """Тест: воркер ждет вычисление того же ключа в другом процессе."""
+        result_path = os.path.join(self.tmp_dir.name, 'sales.txt')
+        ctx = multiprocessing.get_context('fork')
+        locked = ctx.Event()
+
+        def other_worker():
+            with SingleFlight(self.tmp_dir.name)._process_lock('sales'):
+                locked.set()
+                time.sleep(0.3)
+                with open(result_path, 'w') as f:
+                    f.write('8')
+
+        def lookup():
+            if not os.path.exists(result_path):
+                return _MISSING
+            with open(result_path) as f:
+                return [int(f.read())]
+
+        process = ctx.Process(target=other_worker)
+        process.start()
+        self.addCleanup(process.join)
+        locked.wait(5)
+        self.assertEqual(self.flight.do('sales', lambda: self.fail("не должно вычисляться"), lookup, _MISSING), [8])
+        self.assertEqual(self.counters, {'coalesced_across_processes': 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+
+# Добавляем корень проекта, чтобы импортировать пакет 'src'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, create_engine, select
+
+from src.dashboard.tables import build_table_statements, paginate, page_count, parse_filter_query
+
+class TablesTestCase(unittest.TestCase):
+    """Тесты серверной пагинации, сортировки и фильтрации таблиц дашборда."""
+
+    def setUp(self):
+        """Создает таблицу продаж в памяти."""
+        self.engine = create_engine("sqlite://")
+        metadata = MetaData()
+        self.sales = Table(
+            'sales', metadata,
+            Column('product', String),
+            Column('paid_orders', Integer),
+            Column('total_income', Float),
+        )
+        metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(self.sales.insert(), [
+                {'product': f"Продукт {i}", 'paid_orders': i, 'total_income': i * 100.0}
+                for i in range(1, 11)
+            ])
+
+    def _fetch(self, statement):
+        with self.engine.connect() as connection:
+            return connection.execute(statement).fetchall()
+
+    def test_parse_filter_query(self):
+        """Тест разбора строки фильтра DataTable."""
+        conditions = parse_filter_query('{product} contains "Прод" && {paid_orders} >= 3 && {total_income} < 5.5')
+        self.assertEqual(conditions, [
+            ('product', 'contains', 'Прод'),
+            ('paid_orders', 'ge', 3),
+            ('total_income', 'lt', 5.5),
+        ])
+        self.assertEqual(parse_filter_query(''), [])
+        self.assertEqual(parse_filter_query('{product} unknown 1'), [])
+
+    def test_filter_sort_and_page(self):
+        """Тест фильтрации, сортировки и выборки страницы в SQL."""
+        rows_statement, count_statement, totals_statement = build_table_statements(
+            select(self.sales),
+            sort_by=[{'column_id': 'total_income', 'direction': 'desc'}],
+            filter_query='{paid_orders} > 2',
+            totals=['paid_orders'],
+        )
+        self.assertEqual(self._fetch(count_statement)[0][0], 8)
+        self.assertEqual(self._fetch(totals_statement)[0][0], sum(range(3, 11)))
+
+        page = self._fetch(paginate(rows_statement, page_current=1, page_size=3))
+        self.assertEqual([row.product for row in page], ["Продукт 7", "Продукт 6", "Продукт 5"])
+
+    def test_unknown_columns_are_ignored(self):
+        """Тест игнорирования неизвестных столбцов в фильтре и сортировке."""
+        rows_statement, count_statement, _ = build_table_statements(
+            select(self.sales),
+            sort_by=[{'column_id': 'missing', 'direction': 'asc'}],
+            filter_query='{missing} = 1',
+        )
+        self.assertEqual(self._fetch(count_statement)[0][0], 10)
+        self.assertEqual(len(self._fetch(rows_statement)), 10)
+
+    def test_page_count(self):
+        """Тест подсчета количества страниц."""
+        self.assertEqual(page_count(0, 50), 1)
+        self.assertEqual(page_count(50, 50), 1)
+        self.assertEqual(page_count(51, 50), 2)
+
+if __name__ == '__main__':
+    unittest.main()